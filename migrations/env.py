@@ -5,6 +5,8 @@ from flask import current_app
 
 from alembic import context
 
+from ros.lib.history_partitions import include_in_autogenerate
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -65,7 +67,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_name=include_in_autogenerate
     )
 
     with context.begin_transaction():
@@ -97,6 +100,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=get_metadata(),
             process_revision_directives=process_revision_directives,
+            include_name=include_in_autogenerate,
             **current_app.extensions['migrate'].configure_args
         )
 
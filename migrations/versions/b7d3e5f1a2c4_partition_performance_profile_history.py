@@ -0,0 +1,88 @@
+"""partition performance profile history by report_date
+
+Revision ID: b7d3e5f1a2c4
+Revises: 52381cafc36f
+Create Date: 2026-10-18 09:40:12.318204
+
+"""
+from datetime import datetime, time, timedelta, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+from ros.lib.config import HISTORY_PARTITION_PREMAKE_DAYS
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d3e5f1a2c4'
+down_revision = '52381cafc36f'
+branch_labels = None
+depends_on = None
+
+TABLE = 'performance_profile_history'
+OLD_TABLE = f'{TABLE}_unpartitioned'
+DEFAULT_TABLE = f'{TABLE}_default'
+
+
+def _bound(day):
+    return datetime.combine(day, time.min, tzinfo=timezone.utc).isoformat()
+
+
+def _create_keys(table):
+    op.create_primary_key('pk_performance_profile_history', table, ['system_id', 'report_date'])
+    op.create_foreign_key(
+        'fk_performance_profile_history_systems',
+        table, 'systems',
+        ['system_id'], ['id'], ondelete='CASCADE')
+    op.create_index('ix_performance_profile_history_report_date', table, ['report_date'], unique=False)
+
+
+def _drop_keys(table):
+    op.drop_index('ix_performance_profile_history_report_date', table_name=table)
+    op.drop_constraint('fk_performance_profile_history_systems', table, type_='foreignkey')
+    op.drop_constraint('pk_performance_profile_history', table, type_='primary')
+
+
+def upgrade():
+    # The existing table becomes the DEFAULT partition as is, its rows are
+    # not copied and its keys are attached to the ones of the parent. The
+    # garbage collector moves the days of the retention period out of it
+    # into their own partitions, see ros.lib.history_partitions.
+    op.rename_table(TABLE, DEFAULT_TABLE)
+    op.execute(f'ALTER TABLE {DEFAULT_TABLE} RENAME CONSTRAINT pk_performance_profile_history TO {DEFAULT_TABLE}_pkey')
+    op.execute(f'ALTER INDEX ix_performance_profile_history_report_date RENAME TO {DEFAULT_TABLE}_report_date_idx')
+
+    op.execute(
+        f'CREATE TABLE {TABLE} (LIKE {DEFAULT_TABLE} INCLUDING DEFAULTS) '
+        'PARTITION BY RANGE (report_date)'
+    )
+    _create_keys(TABLE)
+
+    # Partitions of the days ahead with no record yet, the following ones
+    # are created by the garbage collector
+    today = datetime.now(timezone.utc).date()
+    latest = op.get_bind().execute(sa.text(f'SELECT max(report_date) FROM {DEFAULT_TABLE}')).scalar()
+    day = today + timedelta(days=1)
+    if latest is not None:
+        day = max(day, latest.astimezone(timezone.utc).date() + timedelta(days=1))
+    while day <= today + timedelta(days=HISTORY_PARTITION_PREMAKE_DAYS):
+        op.execute(
+            f"CREATE TABLE {TABLE}_p{day:%Y%m%d} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{_bound(day)}') TO ('{_bound(day + timedelta(days=1))}')"
+        )
+        day += timedelta(days=1)
+
+    # Only scans the table to check none of its rows belongs to those partitions
+    op.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_TABLE} DEFAULT')
+
+
+def downgrade():
+    op.rename_table(TABLE, OLD_TABLE)
+    _drop_keys(OLD_TABLE)
+
+    op.execute(f'CREATE TABLE {TABLE} (LIKE {OLD_TABLE} INCLUDING DEFAULTS)')
+    op.execute(f'INSERT INTO {TABLE} SELECT * FROM {OLD_TABLE}')
+    _create_keys(TABLE)
+
+    # Drops the partitions, detached ones are left alone
+    op.execute(f'DROP TABLE {OLD_TABLE} CASCADE')
@@ -0,0 +1,51 @@
+"""executive report aggregates per org
+
+Revision ID: c4e8a2d6f913
+Revises: b7d3e5f1a2c4
+Create Date: 2026-10-18 14:05:37.512846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a2d6f913'
+down_revision = 'b7d3e5f1a2c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Orgs are built by the garbage collector, the report is computed live until then
+    op.add_column('rh_accounts', sa.Column('executive_report_built_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_table('executive_report_aggregates',
+    sa.Column('tenant_id', sa.Integer(), nullable=False),
+    sa.Column('report_date', sa.Date(), nullable=False),
+    sa.Column('counters', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('instance_types', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.ForeignKeyConstraint(['tenant_id'], ['rh_accounts.id'],
+                            name='executive_report_aggregates_tenant_id_fkey', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('tenant_id', 'report_date', name='executive_report_aggregates_pkey')
+    )
+    op.create_table('executive_report_contributions',
+    sa.Column('system_id', sa.Integer(), nullable=False),
+    sa.Column('tenant_id', sa.Integer(), nullable=False),
+    sa.Column('report_date', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('counters', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('instance_types', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.ForeignKeyConstraint(['system_id'], ['systems.id'],
+                            name='executive_report_contributions_system_id_fkey', ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('system_id', name='executive_report_contributions_pkey')
+    )
+    op.create_index(op.f('ix_executive_report_contributions_report_date'),
+                    'executive_report_contributions', ['report_date'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_executive_report_contributions_report_date'),
+                  table_name='executive_report_contributions')
+    op.drop_table('executive_report_contributions')
+    op.drop_table('executive_report_aggregates')
+    op.drop_column('rh_accounts', 'executive_report_built_at')
@@ -0,0 +1,78 @@
+"""generated sort key columns of the systems API
+
+Revision ID: d8f1b3c5e7a9
+Revises: c4e8a2d6f913
+Create Date: 2026-10-18 16:22:48.903517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8f1b3c5e7a9'
+down_revision = 'c4e8a2d6f913'
+branch_labels = None
+depends_on = None
+
+
+def _json_number(column, key, sql_type='double precision'):
+    return (
+        f"CASE WHEN jsonb_typeof({column} -> '{key}') = 'number' "
+        f"THEN ({column} ->> '{key}')::numeric::{sql_type} END"
+    )
+
+
+PROFILE_COLUMNS = {
+    'cpu_utilization': ('cpu', sa.Float()),
+    'memory_utilization': ('memory', sa.Float()),
+    'max_io_utilization': ('max_io', sa.Float()),
+}
+PROFILE_INDEXES = {
+    'performance_profile_cpu_utilization_idx': ['cpu_utilization', 'system_id'],
+    'performance_profile_memory_utilization_idx': ['memory_utilization', 'system_id'],
+    'performance_profile_max_io_utilization_idx': ['max_io_utilization', 'system_id'],
+    'performance_profile_number_of_recommendations_idx': ['number_of_recommendations', 'system_id'],
+    'performance_profile_report_date_idx': ['report_date', 'system_id'],
+}
+SYSTEM_INDEXES = {
+    'systems_display_name_idx': ['tenant_id', 'display_name', 'id'],
+    'systems_state_idx': ['tenant_id', 'state', 'id'],
+    'systems_os_idx': ['tenant_id', 'os_name', 'os_major', 'os_minor', 'id'],
+    'systems_group_name_idx': ['tenant_id', 'group_name', 'id'],
+}
+
+
+def upgrade():
+    # Stored generated columns, the tables are rewritten once to fill them
+    for name, (key, column_type) in PROFILE_COLUMNS.items():
+        op.add_column('performance_profile', sa.Column(
+            name, column_type, sa.Computed(_json_number('performance_utilization', key), persisted=True)
+        ))
+    op.add_column('systems', sa.Column(
+        'os_name', sa.Text(), sa.Computed("operating_system ->> 'name'", persisted=True)
+    ))
+    op.add_column('systems', sa.Column(
+        'os_major', sa.Integer(), sa.Computed(_json_number('operating_system', 'major', 'integer'), persisted=True)
+    ))
+    op.add_column('systems', sa.Column(
+        'os_minor', sa.Integer(), sa.Computed(_json_number('operating_system', 'minor', 'integer'), persisted=True)
+    ))
+    op.add_column('systems', sa.Column(
+        'group_name', sa.Text(), sa.Computed("groups -> 0 ->> 'name'", persisted=True)
+    ))
+    for name, columns in PROFILE_INDEXES.items():
+        op.create_index(name, 'performance_profile', columns, unique=False)
+    for name, columns in SYSTEM_INDEXES.items():
+        op.create_index(name, 'systems', columns, unique=False)
+
+
+def downgrade():
+    for name in SYSTEM_INDEXES:
+        op.drop_index(name, table_name='systems')
+    for name in PROFILE_INDEXES:
+        op.drop_index(name, table_name='performance_profile')
+    for name in ('group_name', 'os_minor', 'os_major', 'os_name'):
+        op.drop_column('systems', name)
+    for name in reversed(list(PROFILE_COLUMNS)):
+        op.drop_column('performance_profile', name)
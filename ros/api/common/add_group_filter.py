@@ -27,6 +27,11 @@ def group_filtered_query(query):
     return query
 
 
+def is_group_restricted():
+    """True when the systems of the user are limited to some host groups."""
+    return not able_to_access_all_systems() and bool(get_host_groups())
+
+
 def get_host_groups():
     host_groups = []
     try:
@@ -1,9 +1,9 @@
-from ros.lib.aws_instance_types import INSTANCE_TYPES
+from ros.lib.catalog_snapshot import ec2_instance_types
 
 
 def instance_types_desc_dict():
     instance_and_descriptions = {}
-    for instance, info in INSTANCE_TYPES.items():
+    for instance, info in ec2_instance_types().items():
         processor = info['extra']['physicalProcessor']
         v_cpu = info['extra']['vcpu']
         memory = info['extra']['memory']
@@ -1,9 +1,14 @@
 """Module to construct response for paginated list."""
+import base64
+import json
+from datetime import datetime
 from urllib.parse import urlencode
 from flask import request
+from flask_restful import abort
 
 DEFAULT_RECORDS_PER_REP = 10
 DEFAULT_OFFSET = 0
+COUNT_METHODS = ('exact', 'estimate', 'none')
 
 
 def _cast_to_int(integer_string):
@@ -36,6 +41,43 @@ def offset_value():
     return DEFAULT_OFFSET
 
 
+def count_method():
+    """Get count method, how the total number of items is computed."""
+    method = (request.args.get('count') or 'exact').strip().lower()
+    if method not in COUNT_METHODS:
+        abort(400, message=f"Incorrect count method. Possible values - {', '.join(COUNT_METHODS)}")
+    return method
+
+
+def encode_cursor(order, sort_values):
+    """Encode the order and the sort key values of the last item of a page."""
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in sort_values]
+    cursor = json.dumps({"order": order, "after": values})
+    return base64.urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii')
+
+
+def cursor_value(order):
+    """
+    Get cursor value, the sort key values of the item after which the page
+    starts. An empty list when the cursor is empty, the first page, None
+    when the cursor parameter is not given. The cursor must have been
+    built for the same order.
+    """
+    cursor_param = request.args.get('cursor')
+    if cursor_param is None:
+        return None
+    if not cursor_param:
+        return []
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(cursor_param.encode('ascii')))
+        if cursor['order'] == order and isinstance(cursor['after'], list) and cursor['after']:
+            return cursor['after']
+    except (ValueError, UnicodeError, TypeError, KeyError):
+        pass
+    abort(400, message="Invalid cursor")
+    return None
+
+
 def _create_link(path, limit, offset, args_dict):
     params = dict(args_dict)
     params["limit"] = limit
@@ -56,18 +98,21 @@ def _create_previous_link(path, limit, offset, _count, args_dict):
 
 def _create_next_link(path, limit, offset, count, args_dict):
     next_offset = limit + offset
-    if next_offset >= count:
+    if count is None or next_offset >= count:
         return None
     return _create_link(path, limit, next_offset, args_dict)
 
 
 def _create_last_link(path, limit, _offset, count, args_dict):
+    if count is None:
+        return None
     final_offset = count - limit if (count - limit) >= 0 else 0
     return _create_link(path, limit, final_offset, args_dict)
 
 
 def build_paginated_system_list_response(
         limit, offset, json_list, count, args_dict={}):
+    """Response of a page of the offset pagination, count is None when not counted."""
     output = {
         "meta": {
             "count": count,
@@ -90,4 +135,33 @@ def build_paginated_system_list_response(
         },
         "data": json_list,
     }
+    if count is None and json_list and len(json_list) >= limit:
+        output["links"]["next"] = _create_link(request.path, limit, offset + limit, args_dict)
     return output
+
+
+def build_cursor_paginated_response(limit, json_list, count, next_cursor):
+    """Response of a page of the keyset, cursor, pagination."""
+    args_dict = {
+        key: values for key, values in request.args.lists()
+        if key not in ('limit', 'offset', 'cursor')
+    }
+    args_dict['limit'] = limit
+
+    def create_link(cursor):
+        return "{}?{}".format(request.path, urlencode(dict(args_dict, cursor=cursor), doseq=True))
+
+    return {
+        "meta": {
+            "count": count,
+            "limit": limit,
+            "offset": None,
+        },
+        "links": {
+            "first": create_link(''),
+            "last": None,
+            "next": create_link(next_cursor) if next_cursor else None,
+            "previous": None,
+        },
+        "data": json_list,
+    }
@@ -0,0 +1,70 @@
+"""
+Cache of the API responses of an org, invalidated by the writers.
+
+Entries are keyed by the endpoint, the org, the host groups the user is
+limited to and the request arguments, and by the generation of the org, a
+counter in Redis the processors bump once they committed changes to the
+systems of the org. A bump leaves the previous entries unreachable until
+they expire, after RESPONSE_CACHE_TIMEOUT seconds.
+"""
+import functools
+import hashlib
+import json
+
+from flask import request
+
+from ros.api.common.add_group_filter import able_to_access_all_systems, get_host_groups
+from ros.extensions import cache
+from ros.lib.cache_utils import org_generation
+from ros.lib.config import RESPONSE_CACHE_TIMEOUT, get_logger
+from ros.lib.utils import org_id_from_identity_header
+from ros.processor.metrics import response_cache_hits, response_cache_misses
+
+LOG = get_logger(__name__)
+
+
+def response_cache_key(endpoint, view_args):
+    org_id = org_id_from_identity_header(request)
+    scope = json.dumps({
+        "all_systems": able_to_access_all_systems(),
+        "host_groups": sorted(get_host_groups(), key=str),
+        "args": sorted(request.args.items(multi=True)),
+        "view_args": view_args,
+    }, sort_keys=True, default=str)
+    digest = hashlib.sha256(scope.encode()).hexdigest()
+    return f"response_{endpoint}_{org_id}_{org_generation(org_id)}_{digest}"
+
+
+def cached_response(endpoint):
+    """
+    Serve the responses of a Resource method from the cache, put it above
+    marshal_with so the marshalled responses are cached. Responses that are
+    not dicts, and errors, are not cached. The API keeps working, uncached,
+    when Redis does not answer.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if not RESPONSE_CACHE_TIMEOUT:
+                return method(*args, **kwargs)
+
+            try:
+                key = response_cache_key(endpoint, kwargs)
+                response = cache.get(key)
+            except Exception as error:  # pylint: disable=broad-except
+                LOG.error(f"RESPONSE CACHE - Failed to read the {endpoint} response cache: {error}")
+                key = response = None
+            if response is not None:
+                response_cache_hits.labels(endpoint).inc()
+                return response
+
+            response_cache_misses.labels(endpoint).inc()
+            response = method(*args, **kwargs)
+            if key is not None and isinstance(response, dict):
+                try:
+                    cache.set(key, response, timeout=RESPONSE_CACHE_TIMEOUT)
+                except Exception as error:  # pylint: disable=broad-except
+                    LOG.error(f"RESPONSE CACHE - Failed to cache the {endpoint} response: {error}")
+            return response
+        return wrapper
+    return decorator
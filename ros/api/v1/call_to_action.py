@@ -4,16 +4,13 @@ from ros.lib.utils import (
     org_id_from_identity_header, systems_ids_for_existing_profiles)
 from ros.lib.models import (
     PerformanceProfile)
-from ros.extensions import cache
+from ros.api.common.response_cache import cached_response
 
 
 class CallToActionApi(Resource):
+    @cached_response('call_to_action')
     def get(self):
         org_id = org_id_from_identity_header(request)
-        cache_key = "call_to_action_"+org_id
-        if res := cache.get(cache_key):
-            return res
-
         query = systems_ids_for_existing_profiles(org_id).filter(PerformanceProfile.number_of_recommendations > 0)
         total_system_count = query.count()
 
@@ -33,7 +30,6 @@ class CallToActionApi(Resource):
             result = {
                 "configTryLearn": configTryLearn_Object
             }
-            cache.set(cache_key, result)
             return result
 
         if total_system_count > 1:
@@ -58,5 +54,4 @@ class CallToActionApi(Resource):
             },
             "configTryLearn": configTryLearn_Object
         }
-        cache.set(cache_key, result)
         return result
@@ -1,13 +1,16 @@
 import logging
+from collections import namedtuple
 from flask import request
-from sqlalchemy.types import Float
-from ros.lib.constants import SubStates, SystemStatesWithKeys, SystemsTableColumn
+from ros.lib.constants import SystemStatesWithKeys, SystemsTableColumn
 
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import asc, nullslast, nullsfirst
+from sqlalchemy import and_, asc, bindparam, desc, false, or_, nullslast, nullsfirst
 from flask_restful import Resource, abort, fields, marshal_with
-from ros.api.common.add_group_filter import group_filtered_query
+from ros.api.common.add_group_filter import group_filtered_query, is_group_restricted
+from ros.api.common.response_cache import cached_response
 from ros.api.common.utils import sorting_order
+from ros.lib import executive_report
+from ros.lib.config import DAYS_UNTIL_STALE
 
 from ros.lib.models import (
     db,
@@ -24,21 +27,29 @@ from ros.lib.utils import (
     systems_ids_for_existing_profiles,
     sort_io_dict,
     system_ids_by_org_id,
-    count_per_state,
     calculate_percentage,
     org_id_from_identity_header,
-    highlights_instance_types, get_psi_count,
+    highlights_instance_types,
+    estimated_count,
 )
 from ros.api.common.pagination import (
     limit_value,
     offset_value,
-    build_paginated_system_list_response
+    count_method,
+    cursor_value,
+    encode_cursor,
+    build_paginated_system_list_response,
+    build_cursor_paginated_response,
 )
 
 LOG = logging.getLogger(__name__)
 
+# nulls_first None keeps the PostgreSQL default, first in descending order
+SortKey = namedtuple('SortKey', ['expression', 'descending', 'nulls_first'])
+
 
 class IsROSConfiguredApi(Resource):
+    @cached_response('is_configured')
     def get(self):
         org_id = org_id_from_identity_header(request)
         query = group_filtered_query(systems_ids_for_existing_profiles(org_id))
@@ -90,9 +101,10 @@ class HostsApi(Resource):
         'groups': fields.List(fields.Nested(groups_fields))
     }
     meta_fields = {
-        'count': fields.Integer,
+        # None when not counted, or with a cursor
+        'count': fields.Integer(default=None),
         'limit': fields.Integer,
-        'offset': fields.Integer,
+        'offset': fields.Integer(default=None),
     }
     links_fields = {
         'first': fields.String,
@@ -106,6 +118,7 @@ class HostsApi(Resource):
         'data': fields.List(fields.Nested(hosts_fields))
     }
 
+    @cached_response('systems')
     @marshal_with(output_fields)
     def get(self):
         limit = limit_value()
@@ -123,20 +136,46 @@ class HostsApi(Resource):
 
         sys_query = group_filtered_query(system_ids_by_org_id(org_id))
         system_query = sys_query.filter(*self.build_system_filters())
-        sort_expression = self.build_sort_expression(order_how, order_by)
+        sort_keys = self.build_sort_keys(order_how, order_by)
         query = (
             db.session.query(PerformanceProfile, System, RhAccount)
             .join(System, System.id == PerformanceProfile.system_id)
             .join(RhAccount, RhAccount.id == System.tenant_id)
             .filter(PerformanceProfile.system_id.in_(system_query))
-            .order_by(*sort_expression)
+            .order_by(*self.sort_clauses(sort_keys))
         )
-        count = query.count()
-        # NOTE: Override limit value to get all the systems when it is -1
-        if limit == -1:
-            limit = count
-        query = query.limit(limit).offset(offset)
-        query_results = query.all()
+        count = self.count(query, count_method())
+
+        order = f"{order_by}:{order_how}"
+        cursor = cursor_value(order)
+        next_cursor = None
+        if cursor is not None:
+            if limit == -1:
+                abort(400, message="limit=-1 can't be used with a cursor")
+            if cursor:
+                if len(cursor) != len(sort_keys):
+                    abort(400, message="Invalid cursor")
+                query = query.filter(self.keyset_filter(sort_keys, cursor))
+            query = query.add_columns(
+                *[key.expression.label(f'sort_key_{index}') for index, key in enumerate(sort_keys)]
+            )
+            # One more row tells whether there is a next page
+            query_results = query.limit(limit + 1).all()
+            if len(query_results) > limit:
+                query_results = query_results[:limit]
+                last_row = query_results[-1]
+                next_cursor = encode_cursor(
+                    order, [getattr(last_row, f'sort_key_{index}') for index in range(len(sort_keys))]
+                )
+        else:
+            # NOTE: Override limit value to get all the systems when it is -1
+            if limit != -1:
+                query = query.limit(limit)
+            query_results = query.offset(offset).all()
+            if limit == -1:
+                # All the systems are loaded, they are counted anyway
+                count = limit = len(query_results) if count is None else count
+
         hosts = []
         for row in query_results:
             try:
@@ -155,12 +194,24 @@ class HostsApi(Resource):
                 LOG.error(
                     f"An error occured while fetching the host. {repr(err)}"
                 )
-                count -= 1
+                if count is not None:
+                    count -= 1
 
+        if cursor is not None:
+            return build_cursor_paginated_response(limit, hosts, count, next_cursor)
         return build_paginated_system_list_response(
             limit, offset, hosts, count
         )
 
+    @staticmethod
+    def count(query, method):
+        """Total number of systems, None when not counted."""
+        if method == 'none':
+            return None
+        if method == 'estimate':
+            return estimated_count(query)
+        return query.count()
+
     @staticmethod
     def build_system_filters():
         """Build system filters."""
@@ -194,50 +245,81 @@ class HostsApi(Resource):
             filters.append(System.operating_system.in_(modified_operating_systems))
         if request.args.getlist('group_name'):
             group_names = request.args.getlist('group_name')
-            filters.append(System.groups[0]['name'].astext.in_(group_names))
+            filters.append(System.group_name.in_(group_names))
         return filters
 
     def build_sort_expression(self, order_how, order_method):
         """Build sort expression."""
-        sort_order = sorting_order(order_how)
-
-        if order_method == 'display_name':
-            return (sort_order(System.display_name),
-                    asc(PerformanceProfile.system_id),)
-
-        score_methods = ['cpu', 'memory', 'max_io']
-        if order_method in score_methods:
-            return (
-                sort_order(PerformanceProfile.performance_utilization[
-                    order_method].astext.cast(Float)),
-                asc(PerformanceProfile.system_id),)
+        return self.sort_clauses(self.build_sort_keys(order_how, order_method))
 
-        if order_method == 'number_of_suggestions':
-            return (sort_order(PerformanceProfile.number_of_recommendations),
-                    asc(PerformanceProfile.system_id),)
-
-        if order_method == 'state':
-            return (sort_order(System.state),
-                    asc(PerformanceProfile.system_id),)
+    @staticmethod
+    def sort_clauses(sort_keys):
+        clauses = []
+        for key in sort_keys:
+            clause = desc(key.expression) if key.descending else asc(key.expression)
+            if key.nulls_first is not None:
+                clause = nullsfirst(clause) if key.nulls_first else nullslast(clause)
+            clauses.append(clause)
+        return tuple(clauses)
+
+    def build_sort_keys(self, order_how, order_method):
+        """Build sort keys, the last one, system_id, makes the order unique."""
+        sort_order = sorting_order(order_how)
+        descending = sort_order is desc
+        tie_breaker = SortKey(PerformanceProfile.system_id, False, None)
+
+        sort_expressions = {
+            'display_name': System.display_name,
+            'number_of_suggestions': PerformanceProfile.number_of_recommendations,
+            'state': System.state,
+            'report_date': PerformanceProfile.report_date,
+            'group_name': System.group_name,
+            'cpu': PerformanceProfile.cpu_utilization,
+            'memory': PerformanceProfile.memory_utilization,
+            'max_io': PerformanceProfile.max_io_utilization,
+        }
+        if order_method in sort_expressions:
+            return [SortKey(sort_expressions[order_method], descending, None), tie_breaker]
 
         if order_method == 'os':
-            nulls_method = nullsfirst if order_how == 'asc' else nullslast
-            return (
-                nulls_method(sort_order(System.operating_system['name'])),
-                sort_order(System.operating_system['major']),
-                sort_order(System.operating_system['minor'])
-            )
-        if order_method == 'report_date':
-            return (sort_order(PerformanceProfile.report_date),
-                    asc(PerformanceProfile.system_id))
-
-        if order_method == 'group_name':
-            return (sort_order(System.groups[0]['name']),
-                    asc(PerformanceProfile.system_id),)
+            return [
+                SortKey(System.os_name, descending, not descending),
+                SortKey(System.os_major, descending, None),
+                SortKey(System.os_minor, descending, None),
+                tie_breaker
+            ]
 
         abort(403, message="Unexpected sort method {}".format(order_method))
         return None
 
+    @staticmethod
+    def keyset_filter(sort_keys, values):
+        """Filter the rows sorted after the row of the given sort key values."""
+        def nulls_first(key):
+            return key.descending if key.nulls_first is None else key.nulls_first
+
+        def bound(key, value):
+            # JSONB sort keys compare with JSON values
+            return bindparam(None, value, type_=key.expression.type)
+
+        def equal(key, value):
+            return key.expression.is_(None) if value is None else key.expression == bound(key, value)
+
+        def after(key, value):
+            if value is None:
+                return key.expression.is_not(None) if nulls_first(key) else None
+            value = bound(key, value)
+            beyond = key.expression < value if key.descending else key.expression > value
+            return beyond if nulls_first(key) else or_(beyond, key.expression.is_(None))
+
+        conditions = []
+        for index, (key, value) in enumerate(zip(sort_keys, values)):
+            condition = after(key, value)
+            if condition is not None:
+                previous = [equal(*pair) for pair in zip(sort_keys[:index], values[:index])]
+                conditions.append(and_(*previous, condition))
+        return or_(*conditions) if conditions else false()
+
 
 class HostDetailsApi(Resource):
     performance_utilization_fields = {
@@ -336,8 +418,12 @@ class HostHistoryApi(Resource):
         org_id = org_id_from_identity_header(request)
         system_query = group_filtered_query(system_ids_by_org_id(org_id).filter(System.inventory_id == host_id))
 
+        # Outdated records are removed a partition, a day, at a time,
+        # bounding report_date also prunes the partitions to scan
+        retention_start = datetime.now(timezone.utc) - timedelta(days=DAYS_UNTIL_STALE)
         query = PerformanceProfileHistory.query.filter(
-            PerformanceProfileHistory.system_id.in_(system_query)
+            PerformanceProfileHistory.system_id.in_(system_query),
+            PerformanceProfileHistory.report_date >= retention_start
         ).order_by(PerformanceProfileHistory.report_date.desc())
 
         count = query.count()
@@ -399,176 +485,83 @@ class ExecutiveReportAPI(Resource):
         "meta": fields.Nested(meta)
     }
 
+    states = {
+        "optimized": "Optimized",
+        "under_pressure": "Under pressure",
+        "undersized": "Undersized",
+        "oversized": "Oversized",
+        "idling": "Idling",
+        "waiting_for_data": "Waiting for data",
+    }
+
+    @cached_response('executive_report')
     @marshal_with(report_fields)
     def get(self):
         org_id = org_id_from_identity_header(request)
-        systems_with_performance_record_queryset = db.session.query(
-            System.id,
-            System.state,
-            System.instance_type,
-            System.cpu_states,
-            System.io_states,
-            System.memory_states,
-            System.region,
-            System.groups,
-            PerformanceProfile.system_id,
-            PerformanceProfile.report_date,
-            PerformanceProfile.rule_hit_details,
-            PerformanceProfile.psi_enabled,
-            PerformanceProfile.operating_system
-        ).select_from(System).join(PerformanceProfile).filter(
-            System.id == PerformanceProfile.system_id,
-            System.id.in_(system_ids_by_org_id(org_id))
-        )
-
-        sys_query = group_filtered_query(systems_with_performance_record_queryset)
-        systems_with_performance_record_subquery = sys_query.subquery()
-
-        # System counts
-        total_systems = systems_with_performance_record_queryset.count()
-        optimized_systems = count_per_state(systems_with_performance_record_queryset, {'state': "Optimized"})
-        under_pressure_systems = count_per_state(systems_with_performance_record_queryset, {'state': "Under pressure"})
-        undersized_systems = count_per_state(systems_with_performance_record_queryset, {'state': "Undersized"})
-        oversized_systems = count_per_state(systems_with_performance_record_queryset, {'state': "Oversized"})
-        waiting_for_data_systems = count_per_state(
-            systems_with_performance_record_queryset,
-            {'state': "Waiting for data"}
-        )
-        idling_systems = count_per_state(systems_with_performance_record_queryset, {'state': "Idling"})
+        current_utc_datetime = datetime.now(timezone.utc)
+        stale_date = (current_utc_datetime - timedelta(days=7)).date()
+        tenant_id = db.session.scalar(db.select(RhAccount.id).filter_by(org_id=org_id))
+        group_restricted = is_group_restricted()
+
+        systems = executive_report.system_records().filter(System.tenant_id == tenant_id)
+        history = executive_report.history_records().filter(System.tenant_id == tenant_id)
+        if tenant_id is None:
+            totals = []
+        elif executive_report.is_built(db.session, tenant_id):
+            # Aggregates maintained by the writers, one row per day reported
+            totals = executive_report.stored_totals(db.session, tenant_id)
+        else:
+            totals = executive_report.query_totals(
+                db.session, systems, None if group_restricted else history
+            )
+        summary = executive_report.summarize(totals, stale_date, current_utc_datetime.date())
 
-        non_optimized_queryset = systems_with_performance_record_queryset.filter(
-            System.state.in_(
-                ['Oversized', 'Undersized', 'Idling', 'Under pressure']
+        if tenant_id is not None and group_restricted:
+            # Only the historical highlights are limited to the groups of the user
+            historical = executive_report.summarize(
+                executive_report.query_totals(db.session, history=group_filtered_query(history)),
+                stale_date, current_utc_datetime.date()
             )
-        )
-        non_optimized_count = 0
-        total_keys = ['cpu', 'memory', 'io']
-        state_keys = ['undersized', 'under_pressure', 'oversized']
-        totals = dict.fromkeys(total_keys, 0)
-        cpu_states_dict = dict.fromkeys(state_keys, 0)
-        memory_states_dict = dict.fromkeys(state_keys, 0)
-        io_states_dict = dict.fromkeys(state_keys, 0)
-
-        for record in non_optimized_queryset:
-            non_optimized_count += 1
-            if record.cpu_states:
-                totals['cpu'] = totals['cpu'] + len(record.cpu_states)
-                if SubStates.CPU_UNDERSIZED.value in record.cpu_states:
-                    cpu_states_dict['undersized'] += 1
-                if SubStates.CPU_UNDER_PRESSURE.value in record.cpu_states:
-                    cpu_states_dict['under_pressure'] += 1
-                if SubStates.CPU_OVERSIZED.value in record.cpu_states:
-                    cpu_states_dict['oversized'] += 1
-            if record.memory_states:
-                totals['memory'] = totals['memory'] + len(record.memory_states)
-                if SubStates.MEMORY_UNDERSIZED.value in record.memory_states:
-                    memory_states_dict['undersized'] += 1
-                if SubStates.MEMORY_UNDER_PRESSURE.value in record.memory_states:
-                    memory_states_dict['under_pressure'] += 1
-                if SubStates.MEMORY_OVERSIZED.value in record.memory_states:
-                    memory_states_dict['oversized'] += 1
-            if record.io_states:
-                totals['io'] = totals['io'] + len(record.io_states)
-                if SubStates.IO_UNDER_PRESSURE.value in record.io_states:
-                    io_states_dict['under_pressure'] += 1
-                # FIXME - enable this logic after getting IO states from advisor engine
-                # if SubStates.IO_UNDERSIZED.value in system.io_states:
-                #     io_states_dict['undersized'] += 1
-                # if SubStates.IO_OVERSIZED.value in system.io_states:
-                #     io_states_dict['oversized'] += 1
-
-        io_states_dict['oversized'] = -1
-        io_states_dict['undersized'] = -1
-        total_conditions = totals['cpu'] + totals['memory'] + totals['io']
+            summary['instance_types']['historical'] = historical['instance_types']['historical']
 
-        current_utc_datetime = datetime.now(timezone.utc)
-        stale_date = (current_utc_datetime - timedelta(days=7)).date()
+        return self.build_report(summary)
+
+    def build_report(self, summary):
+        counters = summary['counters']
+        total_systems = counters.get('systems', 0)
+        total_conditions = sum(counters.get(resource, 0) for resource in ('cpu', 'memory', 'io'))
+
+        def count_and_percentage(count, total):
+            return {"count": count, "percentage": calculate_percentage(count, total)}
 
-        current_performance_profiles = [
-            record
-            for record in systems_with_performance_record_queryset
-            if current_utc_datetime.date() >= record.report_date.date() > stale_date
-        ]
-
-        historical_performance_profiles = db.session.query(
-            PerformanceProfileHistory.system_id,
-            PerformanceProfileHistory.rule_hit_details,
-            systems_with_performance_record_subquery.c.region
-        ).join(
-            systems_with_performance_record_subquery,
-            systems_with_performance_record_subquery.c.system_id == PerformanceProfileHistory.system_id
-        )  # Systems older than 7 days/stale systems are considered here
-
-        stale_count = systems_with_performance_record_queryset.filter(
-            PerformanceProfile.report_date <= stale_date
-        ).count()
-
-        non_psi_count = get_psi_count(systems_with_performance_record_queryset, False)
-        psi_enabled_count = get_psi_count(systems_with_performance_record_queryset, True)
-
-        response = {
+        conditions = {}
+        for resource in ('io', 'memory', 'cpu'):
+            conditions[resource] = {
+                **count_and_percentage(counters.get(resource, 0), total_conditions),
+                "undersized": counters.get(f'{resource}:undersized', 0),
+                "oversized": counters.get(f'{resource}:oversized', 0),
+                "under_pressure": counters.get(f'{resource}:under_pressure', 0)
+            }
+        # FIXME - count these after getting IO states from advisor engine
+        conditions['io']['undersized'] = -1
+        conditions['io']['oversized'] = -1
+
+        return {
             "systems_per_state": {
-                "optimized": {
-                    "count": optimized_systems,
-                    "percentage": calculate_percentage(optimized_systems, total_systems)
-                },
-                "under_pressure": {
-                    "count": under_pressure_systems,
-                    "percentage": calculate_percentage(under_pressure_systems, total_systems)
-                },
-                "undersized": {
-                    "count": undersized_systems,
-                    "percentage": calculate_percentage(undersized_systems, total_systems)
-                },
-                "oversized": {
-                    "count": oversized_systems,
-                    "percentage": calculate_percentage(oversized_systems, total_systems)
-                },
-                "idling": {
-                    "count": idling_systems,
-                    "percentage": calculate_percentage(idling_systems, total_systems)
-                },
-                "waiting_for_data": {
-                    "count": waiting_for_data_systems,
-                    "percentage": calculate_percentage(waiting_for_data_systems, total_systems)
-                }
-            },
-            "conditions": {
-                "io": {
-                    "count": totals['io'],
-                    "percentage": calculate_percentage(totals['io'], total_conditions),
-                    "undersized": io_states_dict['undersized'],
-                    "oversized": io_states_dict['oversized'],
-                    "under_pressure": io_states_dict['under_pressure']
-                },
-                "memory": {
-                    "count": totals['memory'],
-                    "percentage": calculate_percentage(totals['memory'], total_conditions),
-                    "undersized": memory_states_dict['undersized'],
-                    "oversized": memory_states_dict['oversized'],
-                    "under_pressure": memory_states_dict['under_pressure']
-                },
-                "cpu": {
-                    "count": totals['cpu'],
-                    "percentage": calculate_percentage(totals['cpu'], total_conditions),
-                    "undersized": cpu_states_dict['undersized'],
-                    "oversized": cpu_states_dict['oversized'],
-                    "under_pressure": cpu_states_dict['under_pressure']
-                }
+                key: count_and_percentage(counters.get(f'state:{state}', 0), total_systems)
+                for key, state in self.states.items()
             },
+            "conditions": conditions,
             "instance_types_highlights": {
-                "current": highlights_instance_types(current_performance_profiles, 'current'),
-                "suggested": highlights_instance_types(current_performance_profiles, 'suggested'),
-                "historical": highlights_instance_types(historical_performance_profiles, 'historical')
+                section: highlights_instance_types(summary['instance_types'][section])
+                for section in ('current', 'suggested', 'historical')
             },
             "meta": {
                 "total_count": total_systems,
-                "non_optimized_count": non_optimized_count,
+                "non_optimized_count": counters.get('non_optimized', 0),
                 "conditions_count": total_conditions,
-                "stale_count": stale_count,
-                "non_psi_count": non_psi_count,
-                "psi_enabled_count": psi_enabled_count
+                "stale_count": summary['stale_count'],
+                "non_psi_count": counters.get('non_psi', 0),
+                "psi_enabled_count": counters.get('psi_enabled', 0)
             }
         }
-
-        return response
@@ -3,6 +3,7 @@ from flask import request
 from sqlalchemy import func
 from flask_restful import Resource, fields, marshal_with, abort
 from ros.api.common.add_group_filter import group_filtered_query
+from ros.api.common.response_cache import cached_response
 from ros.lib.utils import (
     system_ids_by_org_id,
     org_id_from_identity_header, sort_io_dict,
@@ -61,6 +62,7 @@ class SuggestedInstanceTypes(Resource):
         'data': fields.List(fields.Nested(data))
     }
 
+    @cached_response('suggested_instance_types')
     @marshal_with(output)
     def get(self):
         limit = limit_value()
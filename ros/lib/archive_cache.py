@@ -0,0 +1,244 @@
+"""
+On-disk cache of the extracted insights archives.
+
+The extracted trees are keyed by the sha256 of the request_id of the upload,
+or of the archive URL, so the same payload is downloaded and extracted once
+however many times it is processed. The cache lives in ARCHIVE_CACHE_DIR and
+is shared by the threads and processes using that directory, and kept across
+restarts:
+
+- <key>/ holds the extracted tree and meta.json, its size and the one of the
+  archive. It is built in a .tmp-<key>-* directory and renamed in place, so
+  an entry is either complete or missing.
+- <key>.lock is flock-ed shared while the tree is in use, and exclusively to
+  fill or to evict the entry, only one user downloads a given archive.
+- The modification time of <key>/ is the last time it was used.
+
+The cache is bounded by the disk size of the trees, the least recently used
+ones not in use are removed first. Nothing is kept in memory, the entries
+are read from the directory.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from ros.lib.archive_download import download_archive
+from ros.lib.archive_extract import Extraction, extract_archive
+from ros.lib.config import ARCHIVE_CACHE_DIR, ARCHIVE_CACHE_SIZE
+from ros.processor.metrics import archive_cache_bytes_saved, archive_cache_hits, archive_cache_misses
+
+META_FILE = 'meta.json'
+STAGING_PREFIX = '.tmp-'
+EVICTED_PREFIX = '.evicted-'
+
+
+def _tree_size(path):
+    return sum(
+        os.path.getsize(os.path.join(dirpath, filename))
+        for dirpath, _, filenames in os.walk(path)
+        for filename in filenames
+    )
+
+
+class ArchiveCache:
+    """
+    Size bounded, least recently used cache of extracted archives in
+    directory. A max_size of 0 keeps a tree only while it is in use.
+    """
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+        self._remove_leftovers()
+        self._evict()
+
+    @staticmethod
+    def key(url, request_id=None):
+        return hashlib.sha256((request_id or url).encode()).hexdigest()
+
+    @contextmanager
+    def extracted(self, url, request_id=None, download=download_archive):
+        """
+        Yield the Extraction of the archive at url, download(url) yields the
+        path of the downloaded archive on a miss. The tree must not be
+        modified, it is shared with the other users of the cache.
+        """
+        key = self.key(url, request_id)
+        lock = self._lock(key, fcntl.LOCK_SH)
+        try:
+            entry = self._entry(key)
+            if entry is None:
+                os.close(lock)
+                lock = self._lock(key, fcntl.LOCK_EX)
+                entry = self._entry(key)
+                if entry is None:
+                    archive_cache_misses.inc()
+                    try:
+                        entry = self._fill(key, url, download)
+                    except BaseException:
+                        self._unlink_lock(key)
+                        raise
+                else:
+                    self._hit(key, entry)
+                # Downgrading is atomic, the entry can not be evicted in between
+                fcntl.flock(lock, fcntl.LOCK_SH)
+            else:
+                self._hit(key, entry)
+            yield entry[0]
+        finally:
+            os.close(lock)
+            self._evict()
+
+    def __len__(self):
+        return len(self._entries())
+
+    @property
+    def size(self):
+        return sum(size for _mtime, _key, size in self._entries())
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _lock(self, key, operation):
+        """
+        Return a file descriptor of the lock of key, locked with operation,
+        or None when it is non blocking and the lock is held.
+        """
+        path = self._path(f"{key}.lock")
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, operation)
+            except BlockingIOError:
+                os.close(fd)
+                return None
+            # The lock file may have been removed while waiting for it
+            try:
+                if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def _unlink_lock(self, key):
+        # Only while holding the lock exclusively
+        try:
+            os.unlink(self._path(f"{key}.lock"))
+        except FileNotFoundError:
+            pass
+
+    def _entry(self, key):
+        """Return the Extraction and the metadata of key, None when not cached."""
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, META_FILE)) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        tree = os.path.join(path, 'tree')
+        root = meta['root'] and os.path.join(tree, meta['root'])
+        return Extraction(tree, root), meta
+
+    def _hit(self, key, entry):
+        archive_cache_hits.inc()
+        archive_cache_bytes_saved.inc(entry[1]['archive_size'])
+        try:
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _fill(self, key, url, download):
+        staging = tempfile.mkdtemp(prefix=f"{STAGING_PREFIX}{key}-", dir=self.directory)
+        try:
+            tree = os.path.join(staging, 'tree')
+            with download(url) as archive_path:
+                archive_size = os.path.getsize(archive_path)
+                with extract_archive(archive_path, extract_dir=staging) as extraction:
+                    os.rename(extraction.tmp_dir, tree)
+                    root = extraction.root and os.path.relpath(extraction.root, extraction.tmp_dir)
+            meta = {'root': root, 'size': _tree_size(tree), 'archive_size': archive_size}
+            with open(os.path.join(staging, META_FILE), 'w') as meta_file:
+                json.dump(meta, meta_file)
+            os.rename(staging, self._path(key))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return self._entry(key)
+
+    def _entries(self):
+        """Return the (mtime, key, size) of the cached entries."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.startswith('.') or name.endswith('.lock'):
+                continue
+            entry = self._entry(name)
+            try:
+                mtime = os.stat(self._path(name)).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if entry is not None:
+                entries.append((mtime, name, entry[1]['size']))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        size = sum(entry_size for _mtime, _key, entry_size in entries)
+        for _mtime, key, entry_size in entries:
+            if size <= self.max_size:
+                break
+            lock = self._lock(key, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            if lock is None:
+                # In use
+                continue
+            try:
+                evicted = self._path(f"{EVICTED_PREFIX}{key}-{threading.get_ident()}-{os.getpid()}")
+                try:
+                    os.rename(self._path(key), evicted)
+                except FileNotFoundError:
+                    evicted = None
+                self._unlink_lock(key)
+            finally:
+                os.close(lock)
+            if evicted:
+                size -= entry_size
+                shutil.rmtree(evicted, ignore_errors=True)
+
+    def _remove_leftovers(self):
+        """Remove what the processes stopped while using the cache left behind."""
+        for name in os.listdir(self.directory):
+            path = self._path(name)
+            if name.startswith(EVICTED_PREFIX):
+                shutil.rmtree(path, ignore_errors=True)
+            elif name.startswith(STAGING_PREFIX) or name.endswith('.lock'):
+                key = name[len(STAGING_PREFIX):].split('-')[0] if name.startswith(STAGING_PREFIX) else name[:-5]
+                lock = self._lock(key, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                if lock is None:
+                    # Being filled or used
+                    continue
+                try:
+                    if name.startswith(STAGING_PREFIX):
+                        shutil.rmtree(path, ignore_errors=True)
+                    if not os.path.isdir(self._path(key)):
+                        self._unlink_lock(key)
+                finally:
+                    os.close(lock)
+
+
+_archive_cache = None
+_archive_cache_lock = threading.Lock()
+
+
+def archive_cache():
+    """Return the process wide cache of extracted archives."""
+    global _archive_cache
+    if _archive_cache is None:
+        with _archive_cache_lock:
+            if _archive_cache is None:
+                directory = ARCHIVE_CACHE_DIR or os.path.join(tempfile.gettempdir(), "ros-archive-cache")
+                _archive_cache = ArchiveCache(directory, ARCHIVE_CACHE_SIZE)
+    return _archive_cache
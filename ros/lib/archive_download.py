@@ -0,0 +1,68 @@
+"""
+Streaming download of the insights archives.
+
+The archives are written to a temporary file chunk by chunk, so an archive
+is never held in memory as a whole, and are rejected once they grow over
+ARCHIVE_MAX_SIZE. The connections are kept alive in the pool of the archive
+client of ros.lib.http_client, shared by the processor threads.
+"""
+import time
+from contextlib import contextmanager
+from http import HTTPStatus
+from tempfile import NamedTemporaryFile
+
+import requests
+
+from ros.lib.config import (
+    ARCHIVE_DOWNLOAD_CHUNK_SIZE,
+    ARCHIVE_DOWNLOAD_TIMEOUT,
+    ARCHIVE_MAX_SIZE,
+)
+from ros.lib.http_client import http_session
+from ros.processor.metrics import archive_download_bytes, archive_download_seconds
+
+
+class DownloadError(Exception):
+    """The archive could not be downloaded."""
+
+
+class ArchiveTooLarge(DownloadError):
+    """The archive is bigger than ARCHIVE_MAX_SIZE."""
+
+
+def _check_size(size, max_size):
+    if max_size and size > max_size:
+        raise ArchiveTooLarge(f"Archive size {size} bytes exceeds the limit of {max_size} bytes")
+
+
+def _stream_to_file(url, archive, timeout, max_size):
+    try:
+        with http_session('archive').get(url, stream=True, timeout=timeout) as response:
+            if response.status_code != HTTPStatus.OK:
+                raise DownloadError(f"{response.status_code} {response.reason}")
+            _check_size(int(response.headers.get('Content-Length') or 0), max_size)
+
+            size = 0
+            for chunk in response.iter_content(chunk_size=ARCHIVE_DOWNLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                _check_size(size, max_size)
+                archive.write(chunk)
+            archive.flush()
+            return size
+    except requests.RequestException as error:
+        raise DownloadError(str(error)) from error
+
+
+@contextmanager
+def download_archive(url, timeout=ARCHIVE_DOWNLOAD_TIMEOUT, max_size=ARCHIVE_MAX_SIZE):
+    """
+    Download the archive at url to a temporary file and yield its path.
+    The file is removed on exit. Raises DownloadError when the archive can
+    not be downloaded.
+    """
+    start = time.perf_counter()
+    with NamedTemporaryFile() as archive:
+        size = _stream_to_file(url, archive, timeout, max_size)
+        archive_download_seconds.observe(time.perf_counter() - start)
+        archive_download_bytes.observe(size)
+        yield archive.name
@@ -0,0 +1,138 @@
+"""
+Selective extraction of the insights archives.
+
+Only the files read by the ROS rules (run_rules and performance_profile) are
+written out. The tarball is streamed once and the archive root, the
+directory holding insights_archive.txt, is located during that same pass.
+Archives that are not tarballs are extracted in full by insights.extract.
+"""
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+from collections import namedtuple
+from contextlib import contextmanager
+from fnmatch import translate
+
+from insights import extract
+
+from ros.lib.config import SELECTIVE_EXTRACTION
+
+ARCHIVE_ROOT_FILE = "insights_archive.txt"
+
+# Specs the ROS rules depend on, their hydration metadata is kept for core3
+# archives. Keep in sync with the parsers used by ros.rules.rules_engine and
+# ros.processor.process_archive.
+SPECS = (
+    "aws_instance_id_doc",
+    "azure_instance_type",
+    "cloud_init_query",
+    "cmdline",
+    "dmidecode",
+    "installed_rpms",
+    "insights_client_conf",
+    "lscpu",
+    "machine_id",
+    "pmlog_summary",
+    "redhat_release",
+    "rhsm_conf",
+    "subscription_manager_facts",
+    "uname",
+    "yum_repolist",
+)
+
+# Files of those specs, relative to the archive root. Core3 archives keep
+# them under data/, legacy archives directly under the root.
+SPEC_FILES = (
+    "etc/insights-client/insights-client.conf",
+    "etc/insights-client/machine-id",
+    "etc/redhat-release",
+    "etc/rhsm/rhsm.conf",
+    "proc/cmdline",
+    "insights_commands/cloud-init_query*",
+    "insights_commands/curl_*169.254.169.254*",
+    "insights_commands/dmidecode",
+    "insights_commands/lscpu",
+    "insights_commands/pmlogsummary_*",
+    "insights_commands/python_-m_insights.tools.cat_*",
+    "insights_commands/rpm_-qa*",
+    "insights_commands/subscription-manager_facts*",
+    "insights_commands/uname_-a",
+    "insights_commands/yum_*repolist*",
+    "var/log/pcp/pmlogger/*",
+)
+
+# Archive level files, outside of data/
+ARCHIVE_FILES = (
+    ARCHIVE_ROOT_FILE,
+    "branch_info",
+    "egg_release",
+    "version_info",
+    "blacklist_report",
+) + tuple(f"meta_data/insights.specs.Specs.{spec}.json" for spec in SPECS)
+
+
+def _compile(spec_files, archive_files):
+    patterns = [f"(?:data/)?{translate(path)}" for path in spec_files]
+    patterns += [translate(path) for path in archive_files]
+    return re.compile(rf"(?:^|/)(?:{'|'.join(patterns)})")
+
+
+NEEDED_FILES = _compile(SPEC_FILES, ARCHIVE_FILES)
+
+Extraction = namedtuple('Extraction', ['tmp_dir', 'root'])
+
+
+def is_needed(name):
+    """Return True when the archive member name is read by the ROS rules."""
+    return "/dev/" not in f"/{name}" and NEEDED_FILES.search(name) is not None
+
+
+def find_root_directory(directory, target_file=ARCHIVE_ROOT_FILE):
+    """
+    Recursively search for the target file in the given directory - to get root directory of an archive.
+    """
+    for dirpath, _, filenames in os.walk(directory):
+        if target_file in filenames:
+            return dirpath
+
+    return None
+
+
+def _extract_needed(archive_path, tmp_dir):
+    root = None
+    with tarfile.open(archive_path, mode='r|*') as archive:
+        for member in archive:
+            if not member.isfile() or not is_needed(member.name):
+                continue
+            archive.extract(member, tmp_dir, filter='data')
+            if os.path.basename(member.name) == ARCHIVE_ROOT_FILE and root is None:
+                root = os.path.normpath(os.path.join(tmp_dir, os.path.dirname(member.name)))
+    return root
+
+
+@contextmanager
+def extract_archive(archive_path, selective=SELECTIVE_EXTRACTION, extract_dir=None):
+    """
+    Extract the archive to a temporary directory, created in extract_dir
+    when given, and yield an Extraction with that directory and the archive
+    root, None when the archive has no insights_archive.txt. The directory
+    is removed on exit.
+    """
+    if selective:
+        tmp_dir = tempfile.mkdtemp(prefix="insights-", dir=extract_dir)
+        try:
+            try:
+                root = _extract_needed(archive_path, tmp_dir)
+            except tarfile.ReadError:
+                # Not a tarball, e.g. a zip archive
+                pass
+            else:
+                yield Extraction(tmp_dir, root)
+                return
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    with extract(archive_path, extract_dir=extract_dir) as extraction:
+        yield Extraction(extraction.tmp_dir, find_root_directory(extraction.tmp_dir))
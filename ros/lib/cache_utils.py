@@ -1,6 +1,7 @@
 from ros.extensions import cache
 from ros.lib.config import (
     CACHE_KEYWORD_FOR_DELETED_SYSTEM,
+    CACHE_KEYWORD_FOR_ORG_GENERATION,
     CACHE_TIMEOUT_FOR_DELETED_SYSTEM,
     get_logger
 )
@@ -53,3 +54,20 @@ def clear_deleted_system_cache(org_id, host_id):
         logging.debug(f"Cleared deletion cache for system {host_id} (org: {org_id})")
     except Exception as e:
         logging.error(f"Failed to clear deletion cache for system {host_id}: {e}")
+
+
+def org_generation(org_id):
+    """Generation of the cached API responses of an org, bumped by the writers."""
+    return cache.get(f"{CACHE_KEYWORD_FOR_ORG_GENERATION}{org_id}") or 0
+
+
+def bump_org_generation(org_id):
+    """Make the cached API responses of an org stale, after changes to its systems were committed."""
+    if not org_id:
+        return
+    try:
+        # INCR in Redis, atomic across the processors
+        cache.cache.inc(f"{CACHE_KEYWORD_FOR_ORG_GENERATION}{org_id}")
+        logging.debug(f"Bumped the generation of the cached responses of org {org_id}")
+    except Exception as e:
+        logging.error(f"Failed to bump the generation of the cached responses of org {org_id}: {e}")
@@ -0,0 +1,232 @@
+"""
+Binary, memory-mappable snapshot of the static EC2 data.
+
+Importing ros.lib.aws_instance_types and parsing ec2_instance_pricing.json is
+paid again by every API worker and processor, and every one of them keeps its
+own copy. The snapshot holds the instance type attributes the service reads
+and the ec2_linux price table as columnar arrays plus a string table. It is
+built once, e.g. at image build time:
+
+    python -m ros.lib.catalog_snapshot [path]
+
+and then mapped read-only, so all processes share it through the page cache.
+A missing snapshot, or one built from different source files, is ignored and
+the sources are loaded instead.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+
+from ros.lib.config import CATALOG_SNAPSHOT_PATH, get_logger
+
+LOG = get_logger(__name__)
+
+MAGIC = b'ROSCAT01'
+PREAMBLE = struct.Struct('<8sI')
+ALIGNMENT = 8
+
+INSTANCE_TYPES_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'aws_instance_types.py')
+
+
+def _pricing_file():
+    # Imported here, ros.rules imports ros.lib at module level
+    from ros.rules.helpers.price_catalog import PRICING_FILE
+    return PRICING_FILE
+
+
+def file_version(file_path):
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class StringTable:
+    """Interns strings to ids while a snapshot is built."""
+    def __init__(self):
+        self.ids = {}
+
+    def __call__(self, value):
+        return self.ids.setdefault(value, len(self.ids))
+
+    def tobytes(self):
+        return '\0'.join(self.ids).encode('utf-8')
+
+
+def build_snapshot(file_path=CATALOG_SNAPSHOT_PATH):
+    """Write the snapshot of the current source files to file_path."""
+    from ros.lib.aws_instance_types import INSTANCE_TYPES
+    from ros.rules.helpers import Ec2LinuxPrices
+
+    strings = StringTable()
+    instance_types = sorted(INSTANCE_TYPES.items())
+    prices = Ec2LinuxPrices()
+    price_types = sorted(prices)
+    regions = sorted({region for by_region in prices.values() for region in by_region})
+
+    price_table = array('d', [float('nan')]) * (len(price_types) * len(regions))
+    region_ids = {region: i for i, region in enumerate(regions)}
+    for row, name in enumerate(price_types):
+        for region, price in prices[name].items():
+            if price is not None:
+                price_table[row * len(regions) + region_ids[region]] = price
+
+    sections = {
+        'instance_name': array('I', [strings(name) for name, _ in instance_types]),
+        'instance_ram': array('q', [info['ram'] for _, info in instance_types]),
+        'instance_vcpu': array('I', [strings(info['extra']['vcpu']) for _, info in instance_types]),
+        'instance_memory': array('I', [strings(info['extra']['memory']) for _, info in instance_types]),
+        'instance_processor': array(
+            'I', [strings(info['extra']['physicalProcessor']) for _, info in instance_types]),
+        'price_type': array('I', [strings(name) for name in price_types]),
+        'price_region': array('I', [strings(region) for region in regions]),
+        'prices': price_table,
+    }
+    sections['strings'] = array('B', strings.tobytes())
+
+    offset = 0
+    layout = {}
+    for name, values in sections.items():
+        layout[name] = [offset, len(values), values.typecode]
+        offset = _align(offset + len(values) * values.itemsize)
+
+    header = json.dumps({
+        'byteorder': sys.byteorder,
+        'sources': {
+            'instance_types': file_version(INSTANCE_TYPES_FILE),
+            'pricing': file_version(_pricing_file()),
+        },
+        'sections': layout,
+    }).encode('utf-8')
+    data_start = _align(PREAMBLE.size + len(header))
+
+    tmp_path = f'{file_path}.tmp'
+    with open(tmp_path, 'wb') as fp:
+        fp.write(PREAMBLE.pack(MAGIC, len(header)))
+        fp.write(header)
+        for name, values in sections.items():
+            fp.seek(data_start + layout[name][0])
+            values.tofile(fp)
+    # Replace atomically, processes may have the old snapshot mapped
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+class CatalogSnapshot:
+    """
+    Read-only view of a snapshot file.
+    Arrays are memoryviews over the shared mapping, only the string table is
+    decoded into the process.
+    """
+    def __init__(self, file_path=CATALOG_SNAPSHOT_PATH):
+        with open(file_path, 'rb') as fp:
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        buffer = memoryview(self._mmap)
+        magic, header_len = PREAMBLE.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{file_path} is not a catalog snapshot")
+        header = json.loads(bytes(buffer[PREAMBLE.size:PREAMBLE.size + header_len]))
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(f"{file_path} was built on a {header['byteorder']} endian host")
+
+        self.sources = header['sources']
+        data_start = _align(PREAMBLE.size + header_len)
+        self._sections = {}
+        for name, (offset, count, typecode) in header['sections'].items():
+            start = data_start + offset
+            end = start + count * array(typecode).itemsize
+            self._sections[name] = buffer[start:end].cast(typecode)
+
+        self.strings = bytes(self._sections['strings']).decode('utf-8').split('\0')
+
+    def section(self, name):
+        return self._sections[name]
+
+    def is_current(self, source, file_path):
+        """True when the snapshot was built from the current file_path."""
+        try:
+            return self.sources[source] == file_version(file_path)
+        except OSError:
+            return False
+
+
+class InstanceTypes(Mapping):
+    """
+    INSTANCE_TYPES compatible mapping over a snapshot.
+    Only the attributes used by the service are kept: ram and
+    extra.vcpu/memory/physicalProcessor.
+    """
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        strings = snapshot.strings
+        self._rows = {strings[name]: row for row, name in enumerate(snapshot.section('instance_name'))}
+        self._ram = snapshot.section('instance_ram')
+        self._vcpu = snapshot.section('instance_vcpu')
+        self._memory = snapshot.section('instance_memory')
+        self._processor = snapshot.section('instance_processor')
+
+    def __getitem__(self, instance_type):
+        row = self._rows[instance_type]
+        strings = self._snapshot.strings
+        return {
+            'ram': self._ram[row],
+            'extra': {
+                'vcpu': strings[self._vcpu[row]],
+                'memory': strings[self._memory[row]],
+                'physicalProcessor': strings[self._processor[row]],
+            },
+        }
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+
+_snapshot = None
+_snapshot_loaded = False
+_instance_types = None
+
+
+def catalog_snapshot():
+    """Return the process wide snapshot or None if it is not available."""
+    global _snapshot, _snapshot_loaded
+    if not _snapshot_loaded:
+        _snapshot_loaded = True
+        try:
+            _snapshot = CatalogSnapshot(CATALOG_SNAPSHOT_PATH)
+        except FileNotFoundError:
+            LOG.info(f"Catalog snapshot {CATALOG_SNAPSHOT_PATH} not found, loading the source files")
+        except (OSError, ValueError, KeyError) as err:
+            LOG.warning(f"Unable to load the catalog snapshot {CATALOG_SNAPSHOT_PATH}: {err}")
+    return _snapshot
+
+
+def ec2_instance_types():
+    """
+    Return the EC2 instance types catalog, read from the snapshot when it
+    matches ros/lib/aws_instance_types.py.
+    """
+    global _instance_types
+    if _instance_types is None:
+        snapshot = catalog_snapshot()
+        if snapshot is not None and snapshot.is_current('instance_types', INSTANCE_TYPES_FILE):
+            _instance_types = InstanceTypes(snapshot)
+        else:
+            if snapshot is not None:
+                LOG.warning("Catalog snapshot is stale, loading ros/lib/aws_instance_types.py")
+            from ros.lib.aws_instance_types import INSTANCE_TYPES
+            _instance_types = INSTANCE_TYPES
+    return _instance_types
+
+
+if __name__ == "__main__":
+    LOG.info(f"Catalog snapshot written to {build_snapshot(*sys.argv[1:])}")
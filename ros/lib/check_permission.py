@@ -6,6 +6,7 @@ from ros.lib.config import get_logger
 from flask import request
 from ros.lib.rbac_interface import query_rbac
 from ros.lib.kessel.kessel_interface import query_kessel
+from ros.lib.permission_cache import get_verdict, permission_cache_key
 
 AUTH_HEADER_NAME = "X-RH-IDENTITY"
 LOG = get_logger(__name__)
@@ -33,38 +34,61 @@ def check_permission(**kwargs):
         )
 
     if ENABLE_RBAC:
-        rbac_response = query_rbac(kwargs["application"], auth_key, kwargs["logger"])
-        perms = [perm["permission"] for perm in rbac_response.get("data")]
-        if perms:
-            for p in perms:
-                if p in kwargs["permissions"]:
-                    # Allow access and
-                    # Try to set group details on request if any
-                    try:
-                        set_host_groups(rbac_response)
-                    except Exception as err:
-                        LOG.info(f"Failed to fetch group details {err}")
-                    return
-        # if wrong permissions
+        backend = 'rbac'
+
+        def compute():
+            rbac_response = query_rbac(kwargs["application"], auth_key, kwargs["logger"])
+            return rbac_verdict(rbac_response, kwargs["permissions"]), True
+    else:
+        backend = 'kessel'
+
+        def compute():
+            kessel_response = query_kessel(auth_key)
+            # The denial of a failed Kessel query is not cached
+            return kessel_verdict(kessel_response), not kessel_response.get("error")
+
+    key = permission_cache_key(backend, auth_key, kwargs["application"], kwargs["permissions"])
+    verdict = get_verdict(key, backend, compute)
+    if not verdict["allowed"]:
         abort(
             HTTPStatus.FORBIDDEN,
             message='User does not have correct permissions to access the service'
         )
 
-    if ENABLE_KESSEL and not ENABLE_RBAC:
-        kessel_response = query_kessel(auth_key)
-        if kessel_response["host_groups"]:
-            host_groups = kessel_response["host_groups"]
-            setattr(request, host_group_attr, host_groups)
-            LOG.info(f"Kessel Enabled - User has host groups {host_groups}")
-        else:
-            abort(
-                HTTPStatus.FORBIDDEN,
-                message='User does not have correct permissions to access the service'
-            )
+    if verdict["host_groups"]:
+        setattr(request, host_group_attr, set(verdict["host_groups"]))
+    if verdict["all_systems"] is not None:
+        setattr(request, access_all_systems, verdict["all_systems"])
 
-        # Set admin to false - Kessel will return exactly the workspaces we have access to
-        setattr(request, access_all_systems, False)
+
+def rbac_verdict(rbac_response, permissions):
+    """
+    Verdict of the roles returned by RBAC, allowed with one of permissions.
+    Host groups are None when they could not be parsed.
+    """
+    perms = [perm["permission"] for perm in rbac_response.get("data")]
+    if not any(p in permissions for p in perms):
+        return {"allowed": False, "host_groups": None, "all_systems": None}
+
+    host_groups = all_systems = None
+    try:
+        # Try to get group details if any
+        groups = parse_host_groups(rbac_response)
+        if groups is not None:
+            host_groups, all_systems = list(groups[0]), groups[1]
+    except Exception as err:
+        LOG.info(f"Failed to fetch group details {err}")
+    return {"allowed": True, "host_groups": host_groups, "all_systems": all_systems}
+
+
+def kessel_verdict(kessel_response):
+    """Verdict of the workspaces returned by Kessel, they are all the user can access."""
+    host_groups = kessel_response["host_groups"]
+    if not host_groups:
+        return {"allowed": False, "host_groups": None, "all_systems": None}
+    LOG.info(f"Kessel Enabled - User has host groups {host_groups}")
+    # Set admin to false - Kessel will return exactly the workspaces we have access to
+    return {"allowed": True, "host_groups": list(host_groups), "all_systems": False}
 
 
 def _is_mgmt_url(path):
@@ -74,7 +98,7 @@ def _is_mgmt_url(path):
     return path.startswith("/mgmt/")
 
 
-def set_host_groups(rbac_response):
+def parse_host_groups(rbac_response):
     """
     We now also have to store the host group information we get from inventory.
     This comes in the resource definition within the RBAC response:
@@ -99,14 +123,17 @@ def set_host_groups(rbac_response):
     definitions that has an attribute filter key of 'group.id', and
     we get the list of inventory groups from its value. We currently ignore
     the operation value.
+
+    Returns the host groups and whether the user can access all the systems,
+    None when the response holds no roles.
     """
 
     if rbac_response is None:
-        return  # we can't store any host groups on None
+        return None  # we can't find any host groups on None
 
     if 'data' not in rbac_response:
         LOG.warning("Warning: The response from RBAC does not contain 'data' list to fetch group details")
-        return
+        return None
 
     role_list = rbac_response['data']
     host_groups = set()
@@ -154,10 +181,6 @@ def set_host_groups(rbac_response):
             # The host_groups may have duplicate group_ids
             host_groups.update(value)
 
-    # If we found any host groups at the end of that, store them
     if host_groups:
-        setattr(request, host_group_attr, host_groups)
         LOG.info(f"User has host groups {host_groups}")
-
-    # Set admin even if we don't find it true
-    setattr(request, access_all_systems, able_to_access_all_systems)
+    return host_groups, able_to_access_all_systems
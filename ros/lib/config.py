@@ -153,15 +153,86 @@ GARBAGE_COLLECTION_INTERVAL = int(
 )
 # Number of days after which data is considered to be outdated.
 DAYS_UNTIL_STALE = int(os.getenv("DAYS_UNTIL_STALE", '45'))
+# Number of rows the garbage collector deletes per transaction, 0 deletes them all at once
+GC_DELETE_CHUNK_SIZE = int(os.getenv("GC_DELETE_CHUNK_SIZE", "5000"))
+# Time in milliseconds the garbage collector waits between two chunks
+GC_DELETE_CHUNK_SLEEP_MS = int(os.getenv("GC_DELETE_CHUNK_SLEEP_MS", "100"))
+# WAL bytes per second the garbage collector deletions may generate, 0 for no limit
+GC_DELETE_MAX_WAL_BYTES_PER_SECOND = int(os.getenv("GC_DELETE_MAX_WAL_BYTES_PER_SECOND", "0"))
 CW_LOGGING_FORMAT = '%(asctime)s - %(levelname)s  - %(funcName)s - %(message)s'
 ROS_PROCESSOR_PORT = int(os.getenv("ROS_PROCESSOR_PORT", "8000"))
 ROS_SUGGESTIONS_ENGINE_PORT = int(os.getenv("ROS_SUGGESTIONS_ENGINE_PORT", "8003"))
+# Timeout in seconds to connect to and to wait for data from the archive storage
+ARCHIVE_DOWNLOAD_TIMEOUT = int(os.getenv("ARCHIVE_DOWNLOAD_TIMEOUT", "10"))
+# Archives bigger than this size in bytes are not downloaded, 0 disables the limit
+ARCHIVE_MAX_SIZE = int(os.getenv("ARCHIVE_MAX_SIZE", str(100 * 1024 * 1024)))
+ARCHIVE_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+ARCHIVE_DOWNLOAD_POOL_SIZE = int(os.getenv("ARCHIVE_DOWNLOAD_POOL_SIZE", "10"))
+# Connections kept alive to RBAC per process, and the timeout in seconds of its requests
+RBAC_POOL_SIZE = int(os.getenv("RBAC_POOL_SIZE", "10"))
+RBAC_TIMEOUT = int(os.getenv("RBAC_TIMEOUT", "10"))
+# Retries of the HTTP requests failing to connect or answered 502, 503 or 504, with
+# a backoff doubling from HTTP_CLIENT_RETRY_BACKOFF seconds
+HTTP_CLIENT_RETRIES = int(os.getenv("HTTP_CLIENT_RETRIES", "3"))
+HTTP_CLIENT_RETRY_BACKOFF = float(os.getenv("HTTP_CLIENT_RETRY_BACKOFF", "0.5"))
+# Only extract the archive files read by the ROS rules
+SELECTIVE_EXTRACTION = str_to_bool(os.getenv("SELECTIVE_EXTRACTION", "True"))
+# Number of messages the report processor writes in one transaction, 1 disables batching
+REPORT_PROCESSOR_BATCH_SIZE = int(os.getenv("REPORT_PROCESSOR_BATCH_SIZE", "1"))
+# Time in milliseconds the report processor waits to fill a batch
+REPORT_PROCESSOR_BATCH_TIMEOUT_MS = int(os.getenv("REPORT_PROCESSOR_BATCH_TIMEOUT_MS", "500"))
+# Number of inventory events applied in one transaction, 1 disables batching
+INVENTORY_EVENTS_BATCH_SIZE = int(os.getenv("INVENTORY_EVENTS_BATCH_SIZE", "1"))
+# Time in milliseconds the inventory events processor waits to fill a batch
+INVENTORY_EVENTS_BATCH_TIMEOUT_MS = int(os.getenv("INVENTORY_EVENTS_BATCH_TIMEOUT_MS", "500"))
+# Number of days ahead daily performance_profile_history partitions are created
+HISTORY_PARTITION_PREMAKE_DAYS = int(os.getenv("HISTORY_PARTITION_PREMAKE_DAYS", "7"))
+# What happens to expired performance_profile_history partitions, drop or detach
+HISTORY_PARTITION_RETENTION = os.getenv("HISTORY_PARTITION_RETENTION", "drop")
+# Number of performance_profile_history rows written with COPY instead of INSERT, 0 disables COPY
+HISTORY_COPY_MIN_ROWS = int(os.getenv("HISTORY_COPY_MIN_ROWS", "50"))
+# Number of performance_profile_history rows written by one COPY
+HISTORY_COPY_BATCH_SIZE = int(os.getenv("HISTORY_COPY_BATCH_SIZE", "5000"))
+# Disk size in bytes of the extracted archives kept for reuse, 0 disables the cache
+ARCHIVE_CACHE_SIZE = int(os.getenv("ARCHIVE_CACHE_SIZE", str(256 * 1024 * 1024)))
+# Directory of the extracted archives cache, shared by the processes using it and kept
+# across restarts, ros-archive-cache in the system temporary directory by default
+ARCHIVE_CACHE_DIR = os.getenv("ARCHIVE_CACHE_DIR", None)
+# Number of archives the suggestions engine processes concurrently
+SUGGESTIONS_ENGINE_WORKERS = int(os.getenv("SUGGESTIONS_ENGINE_WORKERS", "4"))
+# Number of consumed messages not yet processed, before the engine stops polling
+SUGGESTIONS_ENGINE_MAX_IN_FLIGHT = int(
+    os.getenv("SUGGESTIONS_ENGINE_MAX_IN_FLIGHT", str(2 * SUGGESTIONS_ENGINE_WORKERS))
+)
+# Time in milliseconds the suggestions engine holds an event with an archive, only
+# the newest event of a host within it is processed, 0 disables the de-duplication
+SUGGESTIONS_ENGINE_DEDUP_WINDOW_MS = int(os.getenv("SUGGESTIONS_ENGINE_DEDUP_WINDOW_MS", "0"))
 ROS_API_PORT = int(os.getenv("ROS_API_PORT", "8000"))
 # Timeout in seconds to set against keys of deleted systems in a cache
 CACHE_TIMEOUT_FOR_DELETED_SYSTEM = int(
     os.getenv("CACHE_TIMEOUT_FOR_DELETED_SYSTEM", "86400"))
 CACHE_KEYWORD_FOR_DELETED_SYSTEM = '_del_'
+CACHE_KEYWORD_FOR_ORG_GENERATION = 'response_generation_'
+# Timeout in seconds of the cached API responses, 0 disables the response cache
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", "300"))
+# Timeouts in seconds of the cached permission verdicts, granted and denied, 0 disables caching them
+PERMISSION_CACHE_TIMEOUT = int(os.getenv("PERMISSION_CACHE_TIMEOUT", "60"))
+PERMISSION_CACHE_NEGATIVE_TIMEOUT = int(os.getenv("PERMISSION_CACHE_NEGATIVE_TIMEOUT", "10"))
+# Number of permission verdicts kept in memory by each API process, in front of Redis
+PERMISSION_CACHE_SIZE = int(os.getenv("PERMISSION_CACHE_SIZE", "1024"))
 POLL_TIMEOUT_SECS = 1.0
+# Time in milliseconds the producers wait to batch messages, the size in bytes of a batch,
+# their compression, none, gzip, snappy, lz4 or zstd, and the seconds they wait on close
+# to deliver the queued messages
+KAFKA_PRODUCER_LINGER_MS = int(os.getenv("KAFKA_PRODUCER_LINGER_MS", "20"))
+KAFKA_PRODUCER_BATCH_SIZE = int(os.getenv("KAFKA_PRODUCER_BATCH_SIZE", "1000000"))
+KAFKA_PRODUCER_COMPRESSION = os.getenv("KAFKA_PRODUCER_COMPRESSION", "none")
+KAFKA_PRODUCER_FLUSH_TIMEOUT = int(os.getenv("KAFKA_PRODUCER_FLUSH_TIMEOUT", "10"))
+# Number of priced candidate lists kept in memory by the rules engine
+SOLUTION_CACHE_SIZE = int(os.getenv("SOLUTION_CACHE_SIZE", "4096"))
+# Binary snapshot of the EC2 instance types and prices, built by `python -m ros.lib.catalog_snapshot`
+CATALOG_SNAPSHOT_PATH = os.getenv(
+    "CATALOG_SNAPSHOT_PATH", os.path.join(os.path.dirname(os.path.realpath(__file__)), "catalog.snapshot"))
 UNLEASH_ROS_V2_FLAG = 'ros.v2'
 
 
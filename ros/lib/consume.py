@@ -2,12 +2,15 @@ from confluent_kafka import Consumer
 from ros.lib.config import kafka_auth_config
 
 
-def init_consumer(kafka_topic, GROUP_ID):
+def init_consumer(kafka_topic, GROUP_ID, on_revoke=None):
     connection_object = {
         'group.id': GROUP_ID,
         'enable.auto.commit': False
     }
     consumer = Consumer(kafka_auth_config(connection_object))
     # Subscribe to topic
-    consumer.subscribe([kafka_topic])
+    if on_revoke is None:
+        consumer.subscribe([kafka_topic])
+    else:
+        consumer.subscribe([kafka_topic], on_revoke=on_revoke)
     return consumer
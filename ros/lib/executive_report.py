@@ -0,0 +1,511 @@
+"""
+Per-org aggregates of the executive report.
+
+executive_report_aggregates holds, per org and UTC day of report_date, the
+counters of the systems whose performance profile was reported that day and
+the tallies, per instance type and region, of the current, suggested and
+historical highlights. executive_report_contributions keeps what each
+system adds to them, so that a new profile or a deletion only applies the
+difference. Both are maintained by the writers of profiles, history and
+systems once an org is built, the garbage collector builds the others.
+"""
+from collections import defaultdict, namedtuple
+from datetime import datetime, timezone
+
+from sqlalchemy import Integer, String, func, literal, select, tuple_, union_all
+from sqlalchemy.dialects.postgresql import insert
+
+from ros.lib.constants import SubStates, SystemStatesWithKeys
+from ros.lib.models import (
+    db,
+    ExecutiveReportAggregate,
+    ExecutiveReportContribution,
+    PerformanceProfile,
+    PerformanceProfileHistory,
+    RhAccount,
+    System,
+)
+
+LOCK_NAMESPACE = 'executive_report_aggregates'
+
+NON_OPTIMIZED_STATES = ('Oversized', 'Undersized', 'Idling', 'Under pressure')
+SUBSTATES = {
+    'cpu': {
+        'undersized': SubStates.CPU_UNDERSIZED.value,
+        'under_pressure': SubStates.CPU_UNDER_PRESSURE.value,
+        'oversized': SubStates.CPU_OVERSIZED.value,
+    },
+    'memory': {
+        'undersized': SubStates.MEMORY_UNDERSIZED.value,
+        'under_pressure': SubStates.MEMORY_UNDER_PRESSURE.value,
+        'oversized': SubStates.MEMORY_OVERSIZED.value,
+    },
+    # FIXME - count undersized and oversized after getting IO states from advisor engine
+    'io': {
+        'under_pressure': SubStates.IO_UNDER_PRESSURE.value,
+    },
+}
+
+HistoryRecord = namedtuple('HistoryRecord', ['report_date', 'rule_hit_details', 'tenant_id', 'region'])
+
+
+def system_records():
+    """Systems with a performance profile and the columns their tally is made of."""
+    return select(
+        System.id,
+        System.tenant_id,
+        System.state,
+        System.instance_type,
+        System.cpu_states,
+        System.io_states,
+        System.memory_states,
+        System.region,
+        PerformanceProfile.report_date,
+        PerformanceProfile.rule_hit_details,
+        PerformanceProfile.psi_enabled,
+        PerformanceProfile.operating_system,
+    ).select_from(System).join(PerformanceProfile, PerformanceProfile.system_id == System.id)
+
+
+def history_records():
+    """History of the systems with a performance profile, with the columns of its tally."""
+    return select(
+        PerformanceProfileHistory.report_date,
+        PerformanceProfileHistory.rule_hit_details,
+        System.tenant_id,
+        System.region,
+    ).select_from(PerformanceProfileHistory).join(
+        System, System.id == PerformanceProfileHistory.system_id
+    ).join(PerformanceProfile, PerformanceProfile.system_id == System.id)
+
+
+def is_current_section(section):
+    """
+        Returns true when section is current
+        otherwise false for rest sections.
+    """
+    return section == 'current'
+
+
+def find_instance_type(section, record):
+    """Get instance type by current, suggested & historical section."""
+    instance_type = None
+    try:
+        if is_current_section(section):
+            instance_type = record.rule_hit_details[0]['details']['instance_type']
+        else:
+            instance_type = record.rule_hit_details[0]['details']['candidates'][0][0]
+    except (IndexError, KeyError, TypeError):
+        instance_type = None
+
+    if is_current_section(section):
+        return (instance_type if instance_type else record.instance_type)
+
+    return instance_type
+
+
+def _psi_key(record):
+    """PSI counter of the system, RHEL 7 systems do not count."""
+    try:
+        major = int(record.operating_system['major'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if major == 7 or record.psi_enabled is None:
+        return None
+    return 'psi_enabled' if record.psi_enabled else 'non_psi'
+
+
+def _region_key(region):
+    return region if region is not None else ''
+
+
+def _instance_types_tally(sections, record):
+    instance_types = {}
+    for section in sections:
+        instance_type = find_instance_type(section, record)
+        if instance_type is not None:
+            instance_types[section] = {instance_type: {_region_key(record.region): 1}}
+    return instance_types
+
+
+def system_tally(record):
+    """What a system with its performance profile adds to the report."""
+    counters = defaultdict(int, {'systems': 1, f'state:{record.state}': 1})
+    if record.state in NON_OPTIMIZED_STATES:
+        counters['non_optimized'] += 1
+        for resource, states in (
+                ('cpu', record.cpu_states), ('memory', record.memory_states), ('io', record.io_states)
+        ):
+            if not states:
+                continue
+            counters[resource] += len(states)
+            for name, substate in SUBSTATES[resource].items():
+                if substate in states:
+                    counters[f'{resource}:{name}'] += 1
+    psi_key = _psi_key(record)
+    if psi_key:
+        counters[psi_key] += 1
+
+    return {
+        'counters': dict(counters),
+        'instance_types': _instance_types_tally(('current', 'suggested'), record),
+    }
+
+
+def history_tally(record):
+    """What a history record adds to the report."""
+    return {'counters': {}, 'instance_types': _instance_types_tally(('historical',), record)}
+
+
+def _add(total, delta, sign=1):
+    """Add the nested counts of delta to total, in place, dropping the ones at zero."""
+    for key, value in delta.items():
+        if isinstance(value, dict):
+            nested = _add(total.get(key) or {}, value, sign)
+            if nested:
+                total[key] = nested
+            else:
+                total.pop(key, None)
+        else:
+            count = total.get(key, 0) + sign * value
+            if count:
+                total[key] = count
+            else:
+                total.pop(key, None)
+    return total
+
+
+def _positive(tally):
+    """Copy of tally without the counts a lost update may have left at or below zero."""
+    positive = {}
+    for key, value in tally.items():
+        if isinstance(value, dict):
+            value = _positive(value)
+            if value:
+                positive[key] = value
+        elif value > 0:
+            positive[key] = value
+    return positive
+
+
+def _day(report_date):
+    return (report_date or datetime.now(timezone.utc)).astimezone(timezone.utc).date()
+
+
+def _stored_tally(row):
+    return {'counters': row.counters or {}, 'instance_types': row.instance_types or {}}
+
+
+def _lock_built(session, tenant_ids):
+    """
+    Serialize the writers of the aggregates of the orgs until the end of the
+    transaction and return the ones that are built.
+    """
+    tenant_ids = sorted({tenant_id for tenant_id in tenant_ids if tenant_id is not None})
+    for tenant_id in tenant_ids:
+        session.execute(select(func.pg_advisory_xact_lock(func.hashtext(LOCK_NAMESPACE), tenant_id)))
+    if not tenant_ids:
+        return set()
+    return set(session.scalars(
+        select(RhAccount.id).where(RhAccount.id.in_(tenant_ids), RhAccount.executive_report_built_at.isnot(None))
+    ))
+
+
+def _replace_contributions(session, records, deltas):
+    """Replace the contributions of the systems of records, adding the difference to deltas."""
+    table = ExecutiveReportContribution.__table__
+    previous = session.execute(
+        db.delete(table).where(table.c.system_id.in_([record.id for record in records])).returning(table)
+    ).all()
+    for row in previous:
+        _add(deltas[(row.tenant_id, _day(row.report_date))], _stored_tally(row), -1)
+
+    contributions = []
+    for record in records:
+        tally = system_tally(record)
+        _add(deltas[(record.tenant_id, _day(record.report_date))], tally)
+        contributions.append({
+            'system_id': record.id,
+            'tenant_id': record.tenant_id,
+            'report_date': record.report_date,
+            **tally
+        })
+    if contributions:
+        session.execute(insert(table), contributions)
+
+
+def _apply(session, deltas):
+    """Add deltas, by org and day, to the stored aggregates."""
+    table = ExecutiveReportAggregate.__table__
+    keys = [key for key, delta in deltas.items() if delta]
+    if not keys:
+        return
+    stored = {
+        (row.tenant_id, row.report_date): _stored_tally(row)
+        for row in session.execute(
+            select(table).where(tuple_(table.c.tenant_id, table.c.report_date).in_(keys)).with_for_update()
+        )
+    }
+
+    upserts, emptied = [], []
+    for key in keys:
+        totals = _positive(_add(_add({}, stored.get(key, {})), deltas[key]))
+        if totals:
+            upserts.append({
+                'tenant_id': key[0],
+                'report_date': key[1],
+                'counters': totals.get('counters', {}),
+                'instance_types': totals.get('instance_types', {}),
+            })
+        elif key in stored:
+            emptied.append(key)
+
+    if upserts:
+        upsert = insert(table)
+        session.execute(upsert.on_conflict_do_update(
+            index_elements=[table.c.tenant_id, table.c.report_date],
+            set_={'counters': upsert.excluded.counters, 'instance_types': upsert.excluded.instance_types}
+        ), upserts)
+    if emptied:
+        session.execute(db.delete(table).where(tuple_(table.c.tenant_id, table.c.report_date).in_(emptied)))
+
+
+def record_profiles(session, profiles):
+    """
+    Update the aggregates with performance profiles just written, fields
+    holding their system_id, after the systems themselves were written.
+    Every profile goes to the historical tallies.
+    """
+    system_ids = {fields['system_id'] for fields in profiles}
+    tenant_ids = session.scalars(select(System.tenant_id).where(System.id.in_(system_ids)).distinct())
+    built = _lock_built(session, tenant_ids)
+    if not built:
+        return
+    records = session.execute(
+        system_records().where(System.id.in_(system_ids), System.tenant_id.in_(built))
+    ).all()
+
+    deltas = defaultdict(dict)
+    _replace_contributions(session, records, deltas)
+    systems = {record.id: record for record in records}
+    for fields in profiles:
+        record = systems.get(fields['system_id'])
+        if record is None:
+            continue
+        history = HistoryRecord(fields.get('report_date'), fields.get('rule_hit_details'), record.tenant_id,
+                                record.region)
+        _add(deltas[(record.tenant_id, _day(history.report_date))], history_tally(history))
+    _apply(session, deltas)
+
+
+def remove_systems(session, system_ids):
+    """Remove from the aggregates the systems about to be deleted, system_ids may be a select."""
+    tenant_ids = session.scalars(select(System.tenant_id).where(System.id.in_(system_ids)).distinct())
+    if not _lock_built(session, tenant_ids):
+        return
+    table = ExecutiveReportContribution.__table__
+    removed = session.execute(
+        db.delete(table).where(table.c.system_id.in_(system_ids)).returning(table)
+    ).all()
+    if not removed:
+        return
+
+    deltas = defaultdict(dict)
+    for row in removed:
+        _add(deltas[(row.tenant_id, _day(row.report_date))], _stored_tally(row), -1)
+    history = session.execute(
+        history_records().where(System.id.in_([row.system_id for row in removed]))
+    )
+    for record in history:
+        _add(deltas[(record.tenant_id, _day(record.report_date))], history_tally(record), -1)
+    _apply(session, deltas)
+
+
+def remove_profiles(session, system_ids):
+    """
+    Remove from the aggregates the performance profiles of system_ids, just
+    deleted by the garbage collector in the same transaction.
+    """
+    table = ExecutiveReportContribution.__table__
+    tenant_ids = session.scalars(select(table.c.tenant_id).where(table.c.system_id.in_(system_ids)).distinct())
+    if not _lock_built(session, tenant_ids):
+        return 0
+    removed = session.execute(
+        db.delete(table).where(table.c.system_id.in_(system_ids)).returning(table)
+    ).all()
+
+    deltas = defaultdict(dict)
+    for row in removed:
+        _add(deltas[(row.tenant_id, _day(row.report_date))], _stored_tally(row), -1)
+    _apply(session, deltas)
+    return len(removed)
+
+
+def expire_history_before(session, day):
+    """
+    Clear the historical tallies of the days before day, the history of
+    which is deleted, and return the orgs whose aggregates changed.
+    """
+    table = ExecutiveReportAggregate.__table__
+    expired = set(session.scalars(
+        db.update(table)
+        .where(table.c.report_date < day, table.c.instance_types.has_key('historical'))
+        .values(instance_types=table.c.instance_types.op('-')(literal('historical', String)))
+        .returning(table.c.tenant_id)
+    ))
+    session.execute(
+        db.delete(table).where(
+            table.c.report_date < day,
+            table.c.counters == {},
+            table.c.instance_types == {},
+        )
+    )
+    return expired
+
+
+def rebuild(session, tenant_id):
+    """Compute the aggregates of an org from scratch and mark it built."""
+    _lock_built(session, [tenant_id])
+    for model in (ExecutiveReportAggregate, ExecutiveReportContribution):
+        session.execute(db.delete(model.__table__).where(model.__table__.c.tenant_id == tenant_id))
+
+    deltas = defaultdict(dict)
+    records = session.execute(system_records().where(System.tenant_id == tenant_id)).all()
+    _replace_contributions(session, records, deltas)
+    history = session.execute(
+        history_records().where(System.tenant_id == tenant_id).execution_options(yield_per=10000)
+    )
+    for record in history:
+        _add(deltas[(tenant_id, _day(record.report_date))], history_tally(record))
+    _apply(session, deltas)
+
+    session.execute(
+        db.update(RhAccount).where(RhAccount.id == tenant_id)
+        .values(executive_report_built_at=datetime.now(timezone.utc))
+    )
+
+
+def build_pending(session, on_built=None):
+    """
+    Build the aggregates of the orgs not built yet, one transaction each,
+    return their number. on_built(tenant_id) is called once each is committed.
+    """
+    tenant_ids = session.scalars(
+        select(RhAccount.id).where(RhAccount.executive_report_built_at.is_(None)).order_by(RhAccount.id)
+    ).all()
+    for tenant_id in tenant_ids:
+        rebuild(session, tenant_id)
+        session.commit()
+        if on_built:
+            on_built(tenant_id)
+    return len(tenant_ids)
+
+
+def is_built(session, tenant_id):
+    return session.scalar(select(RhAccount.executive_report_built_at).where(RhAccount.id == tenant_id)) is not None
+
+
+def stored_totals(session, tenant_id):
+    """The aggregates of an org, as (day, tally) pairs."""
+    table = ExecutiveReportAggregate.__table__
+    return [
+        (row.report_date, _stored_tally(row))
+        for row in session.execute(select(table).where(table.c.tenant_id == tenant_id))
+    ]
+
+
+def _report_day(column):
+    return func.date(func.timezone('UTC', column))
+
+
+def _counters_query(systems):
+    """Counters of the systems, by day, in a single scan."""
+    source = systems.subquery()
+    non_optimized = source.c.state.in_(NON_OPTIMIZED_STATES)
+    columns = [func.count().label('systems')]
+    columns += [
+        func.count().filter(source.c.state == state.value).label(f'state:{state.value}')
+        for state in SystemStatesWithKeys
+    ]
+    columns.append(func.count().filter(non_optimized).label('non_optimized'))
+    for resource, states in (
+            ('cpu', source.c.cpu_states), ('memory', source.c.memory_states), ('io', source.c.io_states)
+    ):
+        columns.append(func.sum(func.cardinality(states)).filter(non_optimized).label(resource))
+        columns += [
+            func.count().filter(non_optimized, states.any(substate)).label(f'{resource}:{name}')
+            for name, substate in SUBSTATES[resource].items()
+        ]
+    counted_psi = source.c.operating_system['major'].astext.cast(Integer) != 7
+    columns += [
+        func.count().filter(counted_psi, source.c.psi_enabled.is_(True)).label('psi_enabled'),
+        func.count().filter(counted_psi, source.c.psi_enabled.is_(False)).label('non_psi'),
+    ]
+    day = _report_day(source.c.report_date)
+    return select(day.label('day'), *columns).group_by(day)
+
+
+def _instance_types_query(section, records):
+    """Tally of the instance types of a highlights section, by day and region."""
+    source = records.subquery()
+    details = source.c.rule_hit_details[0]['details']
+    if is_current_section(section):
+        instance_type = func.coalesce(func.nullif(details['instance_type'].astext, ''), source.c.instance_type)
+    else:
+        instance_type = details['candidates'][0][0].astext
+    day = _report_day(source.c.report_date)
+    region = func.coalesce(source.c.region, '')
+    return select(
+        day.label('day'),
+        literal(section, String).label('section'),
+        instance_type.label('instance_type'),
+        region.label('region'),
+        func.count().label('count'),
+    ).where(instance_type.isnot(None)).group_by(day, instance_type, region)
+
+
+def query_totals(session, systems=None, history=None):
+    """
+    The aggregates computed by the database from selects of system_records
+    and history_records, as (day, tally) pairs, in one query for the
+    counters and one for the instance types.
+    """
+    totals = defaultdict(dict)
+    if systems is not None:
+        for row in session.execute(_counters_query(systems)).mappings():
+            counters = {key: int(value) for key, value in row.items() if key != 'day' and value}
+            _add(totals[row['day']], {'counters': counters})
+
+    sections = []
+    if systems is not None:
+        sections += [_instance_types_query(section, systems) for section in ('current', 'suggested')]
+    if history is not None:
+        sections.append(_instance_types_query('historical', history))
+    if sections:
+        for row in session.execute(union_all(*sections)):
+            _add(totals[row.day], {'instance_types': {row.section: {row.instance_type: {row.region: row.count}}}})
+    return list(totals.items())
+
+
+def summarize(totals, stale_date, today):
+    """
+    Sum the aggregates of an org: the counters of all of its systems, the
+    stale ones reported before stale_date, and the instance type tallies of
+    the highlights, current and suggested ones for the systems reported
+    after stale_date.
+    """
+    summary = {
+        'counters': {},
+        'stale_count': 0,
+        'instance_types': {'current': {}, 'suggested': {}, 'historical': {}},
+    }
+    for day, tally in totals:
+        counters = tally.get('counters', {})
+        instance_types = tally.get('instance_types', {})
+        _add(summary['counters'], counters)
+        if day < stale_date:
+            summary['stale_count'] += counters.get('systems', 0)
+        sections = ('current', 'suggested', 'historical') if stale_date < day <= today else ('historical',)
+        for section in sections:
+            _add(summary['instance_types'][section], instance_types.get(section, {}))
+    return summary
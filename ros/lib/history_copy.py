@@ -0,0 +1,116 @@
+"""
+Bulk ingestion of performance_profile_history rows through PostgreSQL COPY.
+
+Rows are serialized in the COPY text format into an in-memory buffer and
+streamed to the server in batches, one COPY per batch, on the connection of
+the given session so they are part of its transaction. With skip_duplicates
+the batch is copied into a temporary table first and moved over with
+INSERT ... ON CONFLICT DO NOTHING, for replays of reports already stored.
+"""
+import io
+import json
+from datetime import datetime
+
+from ros.lib.config import HISTORY_COPY_BATCH_SIZE
+from ros.lib.models import PerformanceProfileHistory
+
+TABLE = PerformanceProfileHistory.__table__
+COLUMNS = tuple(column.name for column in TABLE.columns)
+STAGING_TABLE = "performance_profile_history_staging"
+
+_ESCAPES = str.maketrans({
+    "\\": "\\\\",
+    "\t": "\\t",
+    "\n": "\\n",
+    "\r": "\\r",
+})
+
+
+def _format(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    elif isinstance(value, datetime):
+        value = value.isoformat()
+    return str(value).translate(_ESCAPES)
+
+
+def format_row(fields, columns=COLUMNS):
+    """Return the COPY text format line of a row, missing columns are NULL."""
+    return "\t".join(_format(fields.get(column)) for column in columns) + "\n"
+
+
+def _copy(cursor, table, columns, buffer):
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def copy_performance_profile_history(session, rows, skip_duplicates=False):
+    """
+    Write the history rows, dicts of PerformanceProfileHistory fields, with
+    a single COPY. report_date is required, the column default is not
+    applied by COPY.
+    """
+    writer = HistoryCopyWriter(session, batch_size=None, skip_duplicates=skip_duplicates)
+    for fields in rows:
+        writer.add(fields)
+    return writer.flush()
+
+
+class HistoryCopyWriter:
+    """
+    Buffer history rows and COPY them every batch_size rows, None to only
+    write on flush. Use it as a context manager, or call flush, to write
+    the remaining rows. The transaction is left to the caller.
+    """
+    def __init__(self, session, batch_size=HISTORY_COPY_BATCH_SIZE, skip_duplicates=False):
+        self.session = session
+        self.batch_size = batch_size
+        self.skip_duplicates = skip_duplicates
+        self.written = 0
+        self._buffer = io.StringIO()
+        self._pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def add(self, fields):
+        self._buffer.write(format_row(fields))
+        self._pending += 1
+        if self.batch_size and self._pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """COPY the buffered rows and return the number of rows written so far."""
+        if not self._pending:
+            return self.written
+
+        cursor = self.session.connection().connection.cursor()
+        try:
+            if self.skip_duplicates:
+                cursor.execute(
+                    f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE}"
+                    f" (LIKE {TABLE.name} INCLUDING DEFAULTS) ON COMMIT DROP"
+                )
+                _copy(cursor, STAGING_TABLE, COLUMNS, self._buffer)
+                cursor.execute(
+                    f"INSERT INTO {TABLE.name} SELECT * FROM {STAGING_TABLE} ON CONFLICT DO NOTHING"
+                )
+                self.written += cursor.rowcount
+                cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+            else:
+                _copy(cursor, TABLE.name, COLUMNS, self._buffer)
+                self.written += self._pending
+        finally:
+            cursor.close()
+
+        self._buffer = io.StringIO()
+        self._pending = 0
+        return self.written
@@ -0,0 +1,109 @@
+"""
+Daily range partitions of performance_profile_history by report_date.
+
+Partitions are named performance_profile_history_pYYYYMMDD and hold the
+reports of one UTC day. Rows outside of them, late or back-filled reports,
+go to the DEFAULT partition. Creating a partition moves the rows of its day
+out of the DEFAULT partition first, so it can be attached at any time.
+Retention drops, or detaches, whole partitions instead of deleting rows.
+"""
+import re
+from datetime import datetime, time, timedelta, timezone
+
+from sqlalchemy import text
+
+from ros.lib.config import HISTORY_PARTITION_PREMAKE_DAYS, HISTORY_PARTITION_RETENTION
+
+TABLE = "performance_profile_history"
+DEFAULT_PARTITION = f"{TABLE}_default"
+PREFIX = f"{TABLE}_p"
+PARTITION_NAME = re.compile(rf"^({DEFAULT_PARTITION}|{PREFIX}\d{{8}})$")
+
+RETENTION_DROP = "drop"
+RETENTION_DETACH = "detach"
+
+
+def partition_name(day):
+    return f"{PREFIX}{day:%Y%m%d}"
+
+
+def _bound(day):
+    return datetime.combine(day, time.min, tzinfo=timezone.utc).isoformat()
+
+
+def is_partition(name):
+    return bool(name and PARTITION_NAME.match(name))
+
+
+def include_in_autogenerate(name, type_, parent_names):
+    """
+    include_name hook of the migrations, the partitions and their indexes are
+    created and removed at runtime, not by the models.
+    """
+    if type_ == "table":
+        return not is_partition(name)
+    if type_ == "index":
+        return not is_partition(parent_names.get("table_name"))
+    return True
+
+
+def partitions(connection):
+    """Return the days of the partitions of the history table, in order."""
+    names = connection.execute(text(
+        "SELECT child.relname FROM pg_inherits"
+        " JOIN pg_class parent ON parent.oid = pg_inherits.inhparent"
+        " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+        " WHERE parent.relname = :table AND child.relname LIKE :prefix"
+    ), {"table": TABLE, "prefix": f"{PREFIX}%"}).scalars()
+    return sorted(datetime.strptime(name[len(PREFIX):], "%Y%m%d").date() for name in names)
+
+
+def create_partition(connection, day):
+    """Create and attach the partition of day, moving its rows out of the DEFAULT partition."""
+    name = partition_name(day)
+    start, end = _bound(day), _bound(day + timedelta(days=1))
+    connection.execute(text(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    connection.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION}"
+        f" WHERE report_date >= :start AND report_date < :end RETURNING *)"
+        f" INSERT INTO {name} SELECT * FROM moved"
+    ), {"start": start, "end": end})
+    connection.execute(text(
+        f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"
+    ))
+
+
+def create_future_partitions(connection, today=None, days=HISTORY_PARTITION_PREMAKE_DAYS):
+    """Create the missing partitions from today to days ahead, return their days."""
+    today = today or datetime.now(timezone.utc).date()
+    existing = set(partitions(connection))
+    created = []
+    for offset in range(days + 1):
+        day = today + timedelta(days=offset)
+        if day not in existing:
+            create_partition(connection, day)
+            created.append(day)
+    return created
+
+
+def remove_partitions_before(connection, cutoff, retention=HISTORY_PARTITION_RETENTION):
+    """
+    Drop, or detach with the detach retention, the partitions holding only
+    reports older than cutoff, and return their days. Rows of the partition
+    cutoff falls in are kept until the whole day has expired.
+    """
+    cutoff_day = cutoff.date() if isinstance(cutoff, datetime) else cutoff
+    removed = [day for day in partitions(connection) if day + timedelta(days=1) <= cutoff_day]
+    for day in removed:
+        name = partition_name(day)
+        connection.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+        if retention != RETENTION_DETACH:
+            connection.execute(text(f"DROP TABLE {name}"))
+    return removed
+
+
+def is_partitioned(connection):
+    return connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table"
+        " JOIN pg_class ON pg_class.oid = pg_partitioned_table.partrelid WHERE relname = :table)"
+    ), {"table": TABLE}).scalar()
@@ -0,0 +1,100 @@
+"""
+Pooled HTTP clients of the services ROS calls.
+
+Each client, the archive store or RBAC, has one session per process,
+created on first use so forked API workers and processor threads get
+their own. Connections are kept alive in a pool per host, requests that
+fail to connect or get a 502, 503 or 504 are retried with exponential
+backoff, idempotent methods only, and requests without a timeout get the
+one of their client. The connections opened and the request latency are
+exported per client, the share of requests not opening a connection is
+the reuse rate of the pool.
+"""
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from ros.lib.config import (
+    ARCHIVE_DOWNLOAD_POOL_SIZE,
+    ARCHIVE_DOWNLOAD_TIMEOUT,
+    HTTP_CLIENT_RETRIES,
+    HTTP_CLIENT_RETRY_BACKOFF,
+    RBAC_POOL_SIZE,
+    RBAC_TIMEOUT,
+)
+from ros.processor.metrics import http_client_connections_opened, http_client_request_seconds
+
+# Pool size and default timeout in seconds of the clients
+CLIENTS = {
+    'archive': (ARCHIVE_DOWNLOAD_POOL_SIZE, ARCHIVE_DOWNLOAD_TIMEOUT),
+    'rbac': (RBAC_POOL_SIZE, RBAC_TIMEOUT),
+}
+RETRY_STATUSES = (502, 503, 504)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _counting_pool(pool_class, client):
+    class CountingConnectionPool(pool_class):
+        def _new_conn(self):
+            http_client_connections_opened.labels(client).inc()
+            return super()._new_conn()
+
+    return CountingConnectionPool
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter timing the requests of a client and counting the connections it opens."""
+
+    def __init__(self, client, timeout, **kwargs):
+        self.client = client
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool(HTTPConnectionPool, self.client),
+            'https': _counting_pool(HTTPSConnectionPool, self.client),
+        }
+
+    def send(self, request, timeout=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().send(request, timeout=self.timeout if timeout is None else timeout, **kwargs)
+        finally:
+            http_client_request_seconds.labels(self.client).observe(time.perf_counter() - start)
+
+
+def _create_session(client):
+    pool_size, timeout = CLIENTS[client]
+    retries = Retry(
+        total=HTTP_CLIENT_RETRIES,
+        backoff_factor=HTTP_CLIENT_RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        # The response of the last attempt is returned, callers check its status
+        raise_on_status=False,
+    )
+    adapter = PooledAdapter(
+        client, timeout, pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def http_session(client):
+    """Return the process wide session of client, a key of CLIENTS."""
+    session = _sessions.get(client)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(client)
+            if session is None:
+                session = _sessions[client] = _create_session(client)
+    return session
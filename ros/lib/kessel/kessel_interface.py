@@ -39,7 +39,6 @@ def query_kessel(auth_key):
 
     # Initialize KesselClient with org_id for workspace-based authentication
     client = KesselClient(KESSEL_URL, org_id=org_id)
-    workspaces = []
 
     try:
         workspaces = [
@@ -51,6 +50,7 @@ def query_kessel(auth_key):
         ]
     except Exception as err:
         LOG.info(f"Failed to fetch the workspaces {err}")
+        return {"ros_can_read": UserAllowed.FALSE, "host_groups": set(), "error": True}
 
     return {
         "ros_can_read": len(workspaces) > 0,
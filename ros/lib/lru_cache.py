@@ -0,0 +1,49 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe, least recently used in-process cache.
+    hits and misses are optional prometheus counters.
+    """
+    def __init__(self, maxsize, hits=None, misses=None):
+        self.maxsize = maxsize
+        self.hits = hits
+        self.misses = misses
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                found = False
+            else:
+                found = True
+                self._data.move_to_end(key)
+        counter = self.hits if found else self.misses
+        if counter is not None:
+            counter.inc()
+        return value if found else default
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
@@ -4,6 +4,15 @@ import datetime
 import enum
 
 
+def json_number(column, key, sql_type='double precision'):
+    """Stored generated value of the number under key of a JSONB column, NULL for any other value."""
+    return db.Computed(
+        f"CASE WHEN jsonb_typeof({column} -> '{key}') = 'number' "
+        f"THEN ({column} ->> '{key}')::numeric::{sql_type} END",
+        persisted=True
+    )
+
+
 class PerformanceProfile(db.Model):
     performance_record = db.Column(JSONB)
     performance_utilization = db.Column(JSONB)
@@ -20,6 +29,10 @@ class PerformanceProfile(db.Model):
     psi_enabled = db.Column(db.Boolean)
     top_candidate = db.Column(db.String(25), nullable=True)
     top_candidate_price = db.Column(db.Float)
+    # Sort keys of the systems API, kept up to date by PostgreSQL
+    cpu_utilization = db.Column(db.Float, json_number('performance_utilization', 'cpu'))
+    memory_utilization = db.Column(db.Float, json_number('performance_utilization', 'memory'))
+    max_io_utilization = db.Column(db.Float, json_number('performance_utilization', 'max_io'))
     __table_args__ = (
         db.PrimaryKeyConstraint('system_id', name='performance_profile_pkey'),
         db.ForeignKeyConstraint(
@@ -28,7 +41,12 @@ class PerformanceProfile(db.Model):
             ondelete='CASCADE'),
         db.Index('non_optimized_system_profiles', number_of_recommendations, unique=False,
                  postgresql_where=(number_of_recommendations > 0)),
-        db.Index('top_candidate_idx', top_candidate)
+        db.Index('top_candidate_idx', top_candidate),
+        db.Index('performance_profile_cpu_utilization_idx', cpu_utilization, system_id),
+        db.Index('performance_profile_memory_utilization_idx', memory_utilization, system_id),
+        db.Index('performance_profile_max_io_utilization_idx', max_io_utilization, system_id),
+        db.Index('performance_profile_number_of_recommendations_idx', number_of_recommendations, system_id),
+        db.Index('performance_profile_report_date_idx', report_date, system_id),
     )
 
     @property
@@ -60,7 +78,19 @@ class PerformanceProfileHistory(db.Model):
             ['system_id'], ['systems.id'],
             name='fk_performance_profile_history_systems',
             ondelete='CASCADE'),
+        # Daily partitions are managed by ros.lib.history_partitions
+        {'postgresql_partition_by': 'RANGE (report_date)'},
+    )
+
+
+db.event.listen(
+    PerformanceProfileHistory.__table__,
+    'after_create',
+    db.DDL(
+        'CREATE TABLE performance_profile_history_default '
+        'PARTITION OF performance_profile_history DEFAULT'
     )
+)
 
 
 class System(db.Model):
@@ -76,15 +106,24 @@ class System(db.Model):
     stale_timestamp = db.Column(db.DateTime(timezone=True))
     region = db.Column(db.String(25))
     operating_system = db.Column(JSONB, index=True)
+    cpu_states = db.Column(db.ARRAY(db.String))
+    io_states = db.Column(db.ARRAY(db.String))
+    memory_states = db.Column(db.ARRAY(db.String))
+    groups = db.Column(JSONB)
+    # Sort keys of the systems API, kept up to date by PostgreSQL
+    os_name = db.Column(db.Text, db.Computed("operating_system ->> 'name'", persisted=True))
+    os_major = db.Column(db.Integer, json_number('operating_system', 'major', 'integer'))
+    os_minor = db.Column(db.Integer, json_number('operating_system', 'minor', 'integer'))
+    group_name = db.Column(db.Text, db.Computed("groups -> 0 ->> 'name'", persisted=True))
     __table_args__ = (
         db.UniqueConstraint('inventory_id'),
         db.ForeignKeyConstraint(['tenant_id'], ['rh_accounts.id'], name='systems_tenant_id_fkey'),
         db.Index('inventory_id_hash_index', inventory_id, postgresql_using='hash'),
+        db.Index('systems_display_name_idx', tenant_id, display_name, id),
+        db.Index('systems_state_idx', tenant_id, state, id),
+        db.Index('systems_os_idx', tenant_id, os_name, os_major, os_minor, id),
+        db.Index('systems_group_name_idx', tenant_id, group_name, id),
     )
-    cpu_states = db.Column(db.ARRAY(db.String))
-    io_states = db.Column(db.ARRAY(db.String))
-    memory_states = db.Column(db.ARRAY(db.String))
-    groups = db.Column(JSONB)
 
     @property
     def deserialize_host_os_data(self):
@@ -133,12 +172,45 @@ class RhAccount(db.Model):
     account = db.Column(db.Text, nullable=True)
     org_id = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    # Set once the executive report aggregates of the org are maintained
+    executive_report_built_at = db.Column(db.DateTime(timezone=True), nullable=True)
     __table_args__ = (
         db.UniqueConstraint('org_id'),
         db.CheckConstraint('NOT(org_id IS NULL)'),
     )
 
 
+class ExecutiveReportAggregate(db.Model):
+    __tablename__ = 'executive_report_aggregates'
+    tenant_id = db.Column(db.Integer)
+    report_date = db.Column(db.Date)
+    counters = db.Column(JSONB, nullable=False, default=dict)
+    instance_types = db.Column(JSONB, nullable=False, default=dict)
+    __table_args__ = (
+        db.PrimaryKeyConstraint('tenant_id', 'report_date', name='executive_report_aggregates_pkey'),
+        db.ForeignKeyConstraint(
+            ['tenant_id'], ['rh_accounts.id'],
+            name='executive_report_aggregates_tenant_id_fkey',
+            ondelete='CASCADE'),
+    )
+
+
+class ExecutiveReportContribution(db.Model):
+    __tablename__ = 'executive_report_contributions'
+    system_id = db.Column(db.Integer)
+    tenant_id = db.Column(db.Integer, nullable=False)
+    report_date = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
+    counters = db.Column(JSONB, nullable=False, default=dict)
+    instance_types = db.Column(JSONB, nullable=False, default=dict)
+    __table_args__ = (
+        db.PrimaryKeyConstraint('system_id', name='executive_report_contributions_pkey'),
+        db.ForeignKeyConstraint(
+            ['system_id'], ['systems.id'],
+            name='executive_report_contributions_system_id_fkey',
+            ondelete='CASCADE'),
+    )
+
+
 class Rule(db.Model):
     __tablename__ = 'rules'
     id = db.Column(db.Integer, primary_key=True)
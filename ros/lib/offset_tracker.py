@@ -0,0 +1,66 @@
+import threading
+from collections import deque
+
+from confluent_kafka import TopicPartition
+
+
+class OffsetTracker:
+    """
+    Offsets of the messages consumed but not yet committed.
+
+    Messages may finish in any order, the offsets to commit only move past
+    a message once it and every earlier message of its partition are done.
+    """
+    def __init__(self):
+        self._pending = {}
+        self._done = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(message):
+        return message.topic(), message.partition()
+
+    def add(self, message):
+        """Track a message in the order it was consumed."""
+        with self._lock:
+            self._pending.setdefault(self._key(message), deque()).append(message.offset())
+
+    def done(self, message):
+        with self._lock:
+            self._done.add((*self._key(message), message.offset()))
+
+    def committable(self):
+        """
+        Return the TopicPartition offsets that can be committed, they stay
+        tracked until committed is called with them.
+        """
+        offsets = []
+        with self._lock:
+            for (topic, partition), pending in self._pending.items():
+                last = None
+                for offset in pending:
+                    if (topic, partition, offset) not in self._done:
+                        break
+                    last = offset
+                if last is not None:
+                    offsets.append(TopicPartition(topic, partition, last + 1))
+        return offsets
+
+    def committed(self, offsets):
+        """Stop tracking the messages before the TopicPartition offsets committed."""
+        with self._lock:
+            for tp in offsets:
+                pending = self._pending.get((tp.topic, tp.partition))
+                while pending and pending[0] < tp.offset:
+                    self._done.discard((tp.topic, tp.partition, pending.popleft()))
+
+    def forget(self, partitions):
+        """Stop tracking the messages of the TopicPartitions, once they are revoked."""
+        with self._lock:
+            for tp in partitions:
+                for offset in self._pending.pop((tp.topic, tp.partition), ()):
+                    self._done.discard((tp.topic, tp.partition, offset))
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(pending) for pending in self._pending.values())
@@ -0,0 +1,90 @@
+"""
+Cache of the permission verdicts of check_permission.
+
+A verdict tells whether an identity may use the service, the host groups
+it is limited to and whether it can access all the systems. Verdicts are
+kept in two tiers, a least recently used cache in each API process in
+front of Redis, shared by the API pods. Entries are keyed by a hash of the
+identity header, the backend, the application and the permissions checked,
+the identity header itself is not stored. Denials are cached for
+PERMISSION_CACHE_NEGATIVE_TIMEOUT seconds, failures to get a verdict are
+not cached. A change of the roles of a user applies once the verdicts
+cached before it expired.
+"""
+import hashlib
+import json
+import time
+
+from ros.extensions import cache
+from ros.lib.config import (
+    PERMISSION_CACHE_NEGATIVE_TIMEOUT,
+    PERMISSION_CACHE_SIZE,
+    PERMISSION_CACHE_TIMEOUT,
+    get_logger,
+)
+from ros.lib.lru_cache import LRUCache
+from ros.processor.metrics import permission_cache_hits, permission_cache_misses, permission_check_seconds
+
+LOG = get_logger(__name__)
+
+# Entries hold the verdict and the time it expires at, the same in both tiers
+local_verdicts = LRUCache(PERMISSION_CACHE_SIZE)
+
+
+def permission_cache_key(backend, auth_key, application, permissions):
+    scope = json.dumps([backend, auth_key, application, sorted(permissions)])
+    return f"permission_{hashlib.sha256(scope.encode()).hexdigest()}"
+
+
+def _cached_entry(key):
+    entry = local_verdicts.get(key)
+    if entry is not None and entry["expires"] > time.time():
+        permission_cache_hits.labels("memory").inc()
+        return entry
+
+    try:
+        entry = cache.get(key)
+    except Exception as error:  # pylint: disable=broad-except
+        LOG.error(f"PERMISSION CACHE - Failed to read a cached permission verdict: {error}")
+        return None
+    if entry is not None and entry["expires"] > time.time():
+        local_verdicts.put(key, entry)
+        permission_cache_hits.labels("redis").inc()
+        return entry
+    return None
+
+
+def _cache_entry(key, verdict):
+    timeout = PERMISSION_CACHE_TIMEOUT if verdict["allowed"] else PERMISSION_CACHE_NEGATIVE_TIMEOUT
+    if timeout <= 0:
+        return
+    entry = {"verdict": verdict, "expires": time.time() + timeout}
+    local_verdicts.put(key, entry)
+    try:
+        cache.set(key, entry, timeout=timeout)
+    except Exception as error:  # pylint: disable=broad-except
+        LOG.error(f"PERMISSION CACHE - Failed to cache a permission verdict: {error}")
+
+
+def get_verdict(key, backend, compute):
+    """
+    Return the verdict cached under key, or the one compute returns, with
+    whether it can be cached, after querying backend, RBAC or Kessel.
+    """
+    enabled = PERMISSION_CACHE_TIMEOUT > 0 or PERMISSION_CACHE_NEGATIVE_TIMEOUT > 0
+    if enabled:
+        entry = _cached_entry(key)
+        if entry is not None:
+            return entry["verdict"]
+        permission_cache_misses.inc()
+
+    started = time.monotonic()
+    verdict, cacheable = compute()
+    permission_check_seconds.labels(backend).observe(time.monotonic() - started)
+    if enabled and cacheable:
+        _cache_entry(key, verdict)
+    return verdict
+
+
+def clear_local_verdicts():
+    local_verdicts.clear()
@@ -1,14 +1,90 @@
+import atexit
+import threading
+
 from confluent_kafka import Producer
-from ros.lib.config import kafka_auth_config, get_logger
+from ros.lib.config import (
+    KAFKA_PRODUCER_BATCH_SIZE,
+    KAFKA_PRODUCER_COMPRESSION,
+    KAFKA_PRODUCER_FLUSH_TIMEOUT,
+    KAFKA_PRODUCER_LINGER_MS,
+    kafka_auth_config,
+    get_logger,
+)
 from confluent_kafka import KafkaError
+from ros.processor.metrics import (
+    kafka_producer_delivery_failures,
+    kafka_producer_delivery_seconds,
+    kafka_producer_queue_depth,
+)
 
 
 logger = get_logger(__name__)
 
+# Seconds the background thread waits for delivery reports per poll
+POLL_INTERVAL = 0.1
+
+
+class EventProducer:
+    """
+    Kafka producer batching the messages it sends.
+
+    Messages wait up to KAFKA_PRODUCER_LINGER_MS in the librdkafka queue to
+    be sent in batches, compressed with KAFKA_PRODUCER_COMPRESSION. Their
+    delivery reports are served by a background thread, callers only
+    produce. The queue is flushed on close, and at exit when the process
+    did not close it.
+    """
+    def __init__(self):
+        self._producer = Producer(kafka_auth_config({
+            'linger.ms': KAFKA_PRODUCER_LINGER_MS,
+            'batch.size': KAFKA_PRODUCER_BATCH_SIZE,
+            'compression.type': KAFKA_PRODUCER_COMPRESSION,
+        }))
+        self._closed = threading.Event()
+        self._poll_thread = threading.Thread(target=self._poll, name='kafka-producer-poll', daemon=True)
+        self._poll_thread.start()
+        atexit.register(self.close)
+
+    def _poll(self):
+        while not self._closed.is_set():
+            self._producer.poll(POLL_INTERVAL)
+            kafka_producer_queue_depth.set(len(self._producer))
+
+    def produce(self, topic, value, key=None, on_delivery=None):
+        """Queue a message, on_delivery(err, msg) is called once it is delivered or failed."""
+        def delivered(err, msg):
+            if err:
+                kafka_producer_delivery_failures.labels(topic).inc()
+            elif msg.latency() is not None:
+                kafka_producer_delivery_seconds.labels(topic).observe(msg.latency())
+            if on_delivery is not None:
+                on_delivery(err, msg)
+
+        try:
+            self._producer.produce(topic, value, key=key, on_delivery=delivered)
+        except BufferError:
+            # The queue is full, wait for deliveries to make room once
+            logger.warning(f"Producer queue is full with {len(self._producer)} messages, waiting to produce to {topic}")
+            self._producer.flush(KAFKA_PRODUCER_FLUSH_TIMEOUT)
+            self._producer.produce(topic, value, key=key, on_delivery=delivered)
+
+    def close(self):
+        """Stop the background thread and deliver the queued messages."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._poll_thread.join()
+        remaining = self._producer.flush(KAFKA_PRODUCER_FLUSH_TIMEOUT)
+        kafka_producer_queue_depth.set(remaining)
+        if remaining:
+            logger.error(f"{remaining} message(s) not delivered before the producer was closed")
+
+    def __len__(self):
+        return len(self._producer)
+
 
 def init_producer():
-    producer = Producer(kafka_auth_config())
-    return producer
+    return EventProducer()
 
 
 def delivery_report(err, msg, host_id, request_id, kafka_topic):
@@ -6,6 +6,7 @@ from .config import RBAC_SVC_URL, TLS_CA_PATH
 import requests
 
 from ros.lib.config import get_logger
+from ros.lib.http_client import http_session
 
 RBAC_SVC_ENDPOINT = "/api/rbac/v1/access/?application=%s"
 AUTH_HEADER_NAME = "X-RH-IDENTITY"
@@ -23,7 +24,7 @@ def fetch_url(url, auth_header, logger, method="get"):
         abort(
             HTTPStatus.METHOD_NOT_ALLOWED, message="'%s' is not valid HTTP method." % method
         )
-    response = requests.request(
+    response = http_session('rbac').request(
         method, url, headers=auth_header, verify=TLS_CA_PATH)
     _validate_service_response(response, logger, auth_header)
     return response.json()
@@ -1,4 +1,3 @@
-from collections import Counter
 from http.server import BaseHTTPRequestHandler
 import threading
 import uuid
@@ -6,15 +5,17 @@ import base64
 import json
 from flask import jsonify, make_response
 from flask_restful import abort
-from sqlalchemy import Integer, select
+from sqlalchemy import bindparam, select
+from sqlalchemy.dialects.postgresql import insert
 from ros.lib.models import (
     RhAccount,
     System,
     PerformanceProfile,
     PerformanceProfileHistory,
     db,)
-from ros.lib.config import get_logger
-from ros.lib import aws_instance_types
+from ros.lib.config import get_logger, HISTORY_COPY_MIN_ROWS
+from ros.lib.history_copy import copy_performance_profile_history
+from ros.lib.catalog_snapshot import ec2_instance_types
 from ros.processor.metrics import ec2_instance_lookup_failures
 from ros.lib.constants import CloudProvider, OperatingSystem
 
@@ -163,26 +164,123 @@ def org_id_from_identity_header(request):
 
 
 def insert_performance_profiles(session, system_id, fields):
-    """This method deletes an old entry from performance_profile &
-       inserts latest data inside performance_profile as well as
-       performance_profile_history table.
+    """This method replaces the performance_profile entry of a system with
+       the latest data, in a single INSERT ... ON CONFLICT statement, and
+       inserts the data inside performance_profile_history table as well.
+       Both statements run in the session's transaction, committed by the caller.
     """
     fields = {} if fields is None else fields
-    fields_for_perf_profile_history = redact_instance_type_and_price(fields)
+    bulk_insert_performance_profiles(session, [{'system_id': system_id, **fields}])
 
-    old_profile_record = session.query(PerformanceProfile).filter_by(
-        system_id=system_id).first()
-    if old_profile_record:
-        session.delete(old_profile_record)
-        session.commit()
 
-    model_fields_map = {PerformanceProfile: fields,
-                        PerformanceProfileHistory: fields_for_perf_profile_history}
+def _by_keys(rows):
+    """Group rows by the fields they give, so the columns of the others get their defaults."""
+    groups = {}
+    for fields in rows:
+        groups.setdefault(frozenset(fields), []).append(fields)
+    return groups.values()
 
-    for model_class, model_fields in model_fields_map.items():
-        new_entry = model_class(**model_fields)
-        session.add(new_entry)
-        session.flush()
+
+def bulk_insert_performance_profiles(session, profiles):
+    """Upserts performance_profile and inserts performance_profile_history
+       rows for a list of profile fields holding their system_id, with one
+       statement per table. When a system has several profiles the last one
+       is kept in performance_profile, all of them go to the history, with
+       COPY from HISTORY_COPY_MIN_ROWS rows.
+    """
+    if not profiles:
+        return
+    latest = list({fields['system_id']: fields for fields in profiles}.values())
+    history = [redact_instance_type_and_price(fields) for fields in profiles]
+
+    table = PerformanceProfile.__table__
+    upsert_profile = insert(table)
+    # The new row replaces the old one entirely, columns not given get their defaults
+    upsert_profile = upsert_profile.on_conflict_do_update(
+        index_elements=[table.c.system_id],
+        set_={
+            column.name: upsert_profile.excluded[column.name]
+            for column in table.columns
+            if column.name != 'system_id' and column.computed is None
+        }
+    )
+    for rows in _by_keys(latest):
+        session.execute(upsert_profile, rows)
+    if HISTORY_COPY_MIN_ROWS and len(history) >= HISTORY_COPY_MIN_ROWS:
+        copy_performance_profile_history(session, history)
+    else:
+        for rows in _by_keys(history):
+            session.execute(insert(PerformanceProfileHistory.__table__), rows)
+
+
+def bulk_get_or_create_accounts(session, org_ids, accounts=None):
+    """Returns the RhAccount ids by org_id, creating the missing accounts.
+       accounts, the account numbers by org_id, are stored when given.
+    """
+    org_ids = sorted(set(org_ids))
+    if not org_ids:
+        return {}
+    table = RhAccount.__table__
+    upsert = insert(table)
+    if accounts is None:
+        upsert = upsert.on_conflict_do_nothing(index_elements=['org_id'])
+        rows = [{'org_id': org_id} for org_id in org_ids]
+    else:
+        upsert = upsert.on_conflict_do_update(
+            index_elements=['org_id'],
+            set_={'account': upsert.excluded.account},
+            where=table.c.account.is_distinct_from(upsert.excluded.account)
+        )
+        rows = [{'org_id': org_id, 'account': accounts.get(org_id)} for org_id in org_ids]
+    session.execute(upsert, rows)
+    rows = session.execute(
+        select(RhAccount.id, RhAccount.org_id).where(RhAccount.org_id.in_(org_ids))
+    )
+    return {org_id: account_id for account_id, org_id in rows}
+
+
+def bulk_upsert_systems(session, systems):
+    """Creates or updates the systems, a list of System fields holding their
+       inventory_id, and returns the system ids by inventory_id. Systems
+       giving the same fields are written by the same statement.
+    """
+    table = System.__table__
+    system_ids = {}
+    for rows in _by_keys(systems):
+        upsert = insert(table)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[table.c.inventory_id],
+            set_={key: upsert.excluded[key] for key in rows[0] if key != 'inventory_id'}
+        ).returning(table.c.id, table.c.inventory_id)
+        for system_id, inventory_id in session.execute(upsert, rows):
+            system_ids[str(inventory_id)] = system_id
+    return system_ids
+
+
+def bulk_update_systems(session, systems):
+    """Updates the existing systems, a list of System fields holding their
+       inventory_id, and returns the inventory_ids of the systems updated.
+    """
+    table = System.__table__
+    inventory_ids = [fields['inventory_id'] for fields in systems]
+    if not inventory_ids:
+        return set()
+    existing = {
+        str(inventory_id) for inventory_id in session.scalars(
+            select(System.inventory_id).where(System.inventory_id.in_(inventory_ids))
+        )
+    }
+    groups = {}
+    for fields in systems:
+        if str(fields['inventory_id']) in existing:
+            groups.setdefault(frozenset(fields), []).append(fields)
+    for keys, rows in groups.items():
+        # Bound parameters can not be named after the columns they set
+        update_systems = table.update().where(
+            table.c.inventory_id == bindparam('_inventory_id')
+        ).values({key: bindparam(f'_{key}') for key in keys if key != 'inventory_id'})
+        session.execute(update_systems, [{f'_{key}': value for key, value in row.items()} for row in rows])
+    return existing
 
 
 def redact_instance_type_and_price(fields):
@@ -199,8 +297,15 @@ def redact_instance_type_and_price(fields):
     return fields_for_perf_profile_history
 
 
-def count_per_state(queryset, custom_filters: dict):
-    return queryset.filter_by(**custom_filters).count() if queryset else 0
+def estimated_count(query):
+    """Number of rows of the query estimated by the planner, the query is not run."""
+    compiled = query.order_by(None).statement.compile(
+        dialect=db.session.get_bind().dialect, compile_kwargs={"render_postcompile": True}
+    )
+    plan = db.session.connection().exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+    ).scalar()
+    return int(plan[0]['Plan']['Plan Rows'])
 
 
 def calculate_percentage(numerator, denominator):
@@ -239,18 +344,11 @@ class MonitoringHandler(BaseHTTPRequestHandler):
             super().log_request(code, size)
 
 
-def get_psi_count(queryset: db.Model, bool_flag: bool) -> int:
-    return queryset.filter(
-        PerformanceProfile.operating_system['major'].astext.cast(Integer) != 7,
-        PerformanceProfile.psi_enabled == bool_flag
-    ).count()
-
-
 def instance_type_info_by_name(instance_type_name, cloud_provider):
     """Returns dict with metadata of instance type from static data."""
     instance_type_properties = None
     if cloud_provider == 'AWS':
-        instance_type_properties = aws_instance_types.INSTANCE_TYPES.get(
+        instance_type_properties = ec2_instance_types().get(
             instance_type_name, None)
         if instance_type_properties is None:
             # logging lookup failure on Prometheus
@@ -276,69 +374,20 @@ def generate_highlight_description(instance_type, cloud_provider, regions):
     return 'NA'
 
 
-def is_current_section(section):
-    """
-        Returns true when section is current
-        otherwise false for rest sections.
-    """
-    return section == 'current'
-
-
-def find_instance_type(section, record):
-    """Get instance type by current, suggested & historical section."""
-    instance_type = None
-    try:
-        if is_current_section(section):
-            instance_type = record.rule_hit_details[0]['details']['instance_type']
-        else:
-            instance_type = record.rule_hit_details[0]['details']['candidates'][0][0]
-    except (IndexError, KeyError):
-        instance_type = None
-
-    if is_current_section(section):
-        return (instance_type if instance_type else record.instance_type)
-
-    return instance_type
-
-
-def find_candidates_and_regions(highlight_type, dataset):
-    """Find candidates by highlight_type & regions per candidate ."""
-    instance_candidates, regions = [], {}
-    for record in dataset:
-        instance_type = find_instance_type(highlight_type, record)
-        if instance_type is None:
-            continue
-        instance_candidates.append(instance_type)
-        if instance_type not in regions:
-            regions[instance_type] = []
-        if record.region not in regions[instance_type]:
-            regions[instance_type].append(record.region)
-
-    return instance_candidates, regions
-
-
-def highlights_instance_types(queryset, highlight_type):
-    values_dict, highlights_list = {}, []
-    candidates, regions_by_type = find_candidates_and_regions(
-        highlight_type, queryset)
-
-    if candidates:
-        # Creates a dict with {value: count} values sorts the same, DESC order
-        values_dict = dict(sorted(Counter(candidates).items(), key=lambda x: x[1], reverse=True))
-
-    item_count = 1
-    for key, value in values_dict.items():
-        if item_count == 5:
-            break
-
+def highlights_instance_types(tally):
+    """Top 4 instance types of a tally by type and region, with their regions by count."""
+    highlights_list = []
+    counts = {instance_type: sum(regions.values()) for instance_type, regions in tally.items()}
+    top_types = sorted(counts, key=lambda instance_type: (-counts[instance_type], instance_type))[:4]
+    for instance_type in top_types:
+        regions = tally[instance_type]
+        by_count = sorted((region for region in regions if region), key=lambda region: (-regions[region], region))
         highlights_list.append({
-            "type": key,
-            "count": value,
+            "type": instance_type,
+            "count": counts[instance_type],
             # file will differ w.r.t. instance_type properties as per cloud_provider value
-            "desc": generate_highlight_description(
-                key, 'AWS', regions_by_type.get(key))
+            "desc": generate_highlight_description(instance_type, 'AWS', by_count)
         })
-        item_count += 1
 
     return highlights_list
 
@@ -1,56 +1,218 @@
 from ros.lib.app import app
 from ros.extensions import db
-from ros.lib.models import PerformanceProfile, PerformanceProfileHistory
+from ros.lib.models import PerformanceProfile, PerformanceProfileHistory, RhAccount, System
 from datetime import datetime, timedelta, timezone
-from ros.lib.config import GARBAGE_COLLECTION_INTERVAL, DAYS_UNTIL_STALE, METRICS_PORT, get_logger
+from ros.lib.config import (
+    GARBAGE_COLLECTION_INTERVAL,
+    DAYS_UNTIL_STALE,
+    GC_DELETE_CHUNK_SIZE,
+    GC_DELETE_CHUNK_SLEEP_MS,
+    GC_DELETE_MAX_WAL_BYTES_PER_SECOND,
+    METRICS_PORT,
+    get_logger,
+)
+from ros.lib.cache_utils import bump_org_generation
 from ros.lib.cw_logging import commence_cw_log_streaming
+from ros.lib.executive_report import build_pending, expire_history_before, remove_profiles
+from ros.lib.history_partitions import (
+    DEFAULT_PARTITION,
+    create_future_partitions,
+    is_partitioned,
+    remove_partitions_before,
+)
+from ros.processor.metrics import gc_delete_chunk_seconds, gc_rows_deleted
 from prometheus_client import start_http_server
+from sqlalchemy import column, literal, table, tuple_
 import time
 
 LOG = get_logger(__name__)
 
+HISTORY_KEY = ('system_id', 'report_date')
+DEFAULT_HISTORY_PARTITION = table(DEFAULT_PARTITION, column('system_id'), column('report_date'))
+
 
 class GarbageCollector():
     def __init__(self):
         self.prefix = 'GARBAGE COLLECTOR'
+        self.chunk_size = GC_DELETE_CHUNK_SIZE
+        self.chunk_sleep = GC_DELETE_CHUNK_SLEEP_MS / 1000
+        self.max_wal_rate = GC_DELETE_MAX_WAL_BYTES_PER_SECOND
+        # Last primary key deleted per table by an interrupted run
+        self.resume_from = {}
 
     def run(self):
         while True:
             self.remove_outdated_data()
+            self.build_executive_reports()
             time.sleep(GARBAGE_COLLECTION_INTERVAL)
 
-    def remove_outdated_data(self):
-        try:
-            time_value = datetime.now(timezone.utc) - timedelta(
-                        days=DAYS_UNTIL_STALE)
-            with app.app_context():
-                deleted_history = db.session.execute(
-                    db.delete(PerformanceProfileHistory).filter(
-                        PerformanceProfileHistory.report_date < time_value
-                    )
-                )
+    def maintain_history_partitions(self, time_value):
+        """
+        Create the upcoming daily partitions of the history and remove the
+        ones holding only outdated records, in their own transaction.
+        """
+        connection = db.session.connection()
+        created = create_future_partitions(connection)
+        removed = remove_partitions_before(connection, time_value)
+        db.session.commit()
 
-                if deleted_history.rowcount > 0:
-                    LOG.info(
-                        f"{self.prefix} - Deleted {deleted_history.rowcount} outdated history record(s) "
-                        f"older than {DAYS_UNTIL_STALE} days"
-                    )
+        if created:
+            LOG.info(f"{self.prefix} - Created {len(created)} history partition(s) up to {created[-1]}")
+        if removed:
+            LOG.info(
+                f"{self.prefix} - Removed {len(removed)} outdated history partition(s) "
+                f"older than {DAYS_UNTIL_STALE} days"
+            )
 
-                deleted_profiles = db.session.execute(
-                    db.delete(PerformanceProfile).filter(PerformanceProfile.report_date < time_value)
-                )
+    def delete_outdated(self, source, key, time_value, on_delete=None):
+        """
+        Delete the rows of source, a table, reported before time_value and
+        return their number. With a chunk size, they are deleted in primary
+        key order, chunk_size rows per transaction, throttled in between. A
+        run that fails resumes after the last deleted key on the next call,
+        rows of the keys before it left outdated meanwhile wait for the
+        following run. on_delete(keys) is called with the keys of the rows
+        deleted, in the same transaction, and returns the org_ids whose
+        cached responses to make stale once it is committed.
+        """
+        name = source.name
+        key_columns = [source.c[column_name] for column_name in key]
+        if not self.chunk_size:
+            keys = db.session.execute(
+                db.delete(source).where(source.c.report_date < time_value).returning(*key_columns)
+            ).all()
+            org_ids = on_delete(keys) if keys and on_delete else []
+            db.session.commit()
+            self._bump(org_ids)
+            return len(keys)
 
-                if deleted_profiles.rowcount > 0:
-                    LOG.info(
-                        f"{self.prefix} - Deleted {deleted_profiles.rowcount} outdated performance profile(s) "
-                        f"older than {DAYS_UNTIL_STALE} days"
-                    )
-                db.session.commit()
-        except Exception as error:  # pylint: disable=broad-except
-            LOG.error(
-                f"{self.prefix} - Could not remove outdated records "
-                f"due to the following error {str(error)}."
+        deleted = 0
+        while True:
+            started = time.monotonic()
+            wal_start = self._wal_position() if self.max_wal_rate else None
+
+            chunk = db.select(*key_columns).where(source.c.report_date < time_value)
+            last_key = self.resume_from.get(name)
+            if last_key is not None:
+                chunk = chunk.where(tuple_(*key_columns) > tuple_(*[literal(value) for value in last_key]))
+            chunk = chunk.order_by(*key_columns).limit(self.chunk_size)
+            keys = db.session.execute(
+                db.delete(source).where(tuple_(*key_columns).in_(chunk)).returning(*key_columns)
+            ).all()
+            org_ids = on_delete(keys) if keys and on_delete else []
+            wal_bytes = self._wal_bytes_since(wal_start) if keys and wal_start is not None else 0
+            db.session.commit()
+            self._bump(org_ids)
+
+            elapsed = time.monotonic() - started
+            gc_delete_chunk_seconds.labels(name).observe(elapsed)
+            if keys:
+                gc_rows_deleted.labels(name).inc(len(keys))
+                deleted += len(keys)
+                self.resume_from[name] = max(tuple(row) for row in keys)
+            if len(keys) < self.chunk_size:
+                self.resume_from.pop(name, None)
+                return deleted
+            self._throttle(elapsed, wal_bytes)
+
+    def _wal_position(self):
+        return db.session.execute(db.text("SELECT pg_current_wal_lsn()")).scalar()
+
+    def _wal_bytes_since(self, position):
+        return db.session.execute(
+            db.text("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), :position)"), {"position": position}
+        ).scalar()
+
+    def _throttle(self, elapsed, wal_bytes):
+        pause = self.chunk_sleep
+        if self.max_wal_rate:
+            pause = max(pause, float(wal_bytes) / self.max_wal_rate - elapsed)
+        if pause > 0:
+            time.sleep(pause)
+
+    def _org_ids(self, tenant_ids):
+        """Return the org_ids of tenant_ids, which may be a select."""
+        return db.session.scalars(db.select(RhAccount.org_id).where(RhAccount.id.in_(tenant_ids)).distinct()).all()
+
+    def _systems_org_ids(self, system_ids):
+        return self._org_ids(db.select(System.tenant_id).where(System.id.in_(system_ids)))
+
+    def _bump(self, org_ids):
+        for org_id in org_ids:
+            bump_org_generation(org_id)
+
+    def _remove_profiles(self, keys):
+        system_ids = [system_id for system_id, in keys]
+        remove_profiles(db.session, system_ids)
+        return self._systems_org_ids(system_ids)
+
+    def remove_outdated_history(self, time_value):
+        def on_delete(keys):
+            return self._systems_org_ids({system_id for system_id, _ in keys})
+
+        if is_partitioned(db.session.connection()):
+            self.maintain_history_partitions(time_value)
+            # Only late or back-filled reports are left to delete
+            deleted_history = self.delete_outdated(DEFAULT_HISTORY_PARTITION, HISTORY_KEY, time_value, on_delete)
+        else:
+            deleted_history = self.delete_outdated(
+                PerformanceProfileHistory.__table__, HISTORY_KEY, time_value, on_delete
             )
+        # Tallied per day, the day of the cutoff waits for the next run
+        expired = expire_history_before(db.session, time_value.date())
+        org_ids = self._org_ids(expired) if expired else []
+        db.session.commit()
+        self._bump(org_ids)
+
+        if deleted_history > 0:
+            LOG.info(
+                f"{self.prefix} - Deleted {deleted_history} outdated history record(s) "
+                f"older than {DAYS_UNTIL_STALE} days"
+            )
+
+    def remove_outdated_profiles(self, time_value):
+        deleted_profiles = self.delete_outdated(
+            PerformanceProfile.__table__, ('system_id',), time_value,
+            # Chunk by chunk, the aggregates of a chunk's orgs are locked until its commit
+            on_delete=self._remove_profiles,
+        )
+
+        if deleted_profiles > 0:
+            LOG.info(
+                f"{self.prefix} - Deleted {deleted_profiles} outdated performance profile(s) "
+                f"older than {DAYS_UNTIL_STALE} days"
+            )
+
+    def remove_outdated_data(self):
+        time_value = datetime.now(timezone.utc) - timedelta(
+                    days=DAYS_UNTIL_STALE)
+        with app.app_context():
+            for remove in (self.remove_outdated_history, self.remove_outdated_profiles):
+                try:
+                    remove(time_value)
+                except Exception as error:  # pylint: disable=broad-except
+                    db.session.rollback()
+                    LOG.error(
+                        f"{self.prefix} - Could not remove outdated records "
+                        f"due to the following error {str(error)}."
+                    )
+
+    def build_executive_reports(self):
+        """Build the executive report aggregates of the orgs served live so far."""
+        with app.app_context():
+            try:
+                built = build_pending(
+                    db.session, on_built=lambda tenant_id: self._bump(self._org_ids([tenant_id]))
+                )
+            except Exception as error:  # pylint: disable=broad-except
+                db.session.rollback()
+                LOG.error(
+                    f"{self.prefix} - Could not build the executive report aggregates "
+                    f"due to the following error {str(error)}."
+                )
+                return
+        if built:
+            LOG.info(f"{self.prefix} - Built the executive report aggregates of {built} org(s)")
 
 
 if __name__ == "__main__":
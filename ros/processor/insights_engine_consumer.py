@@ -3,9 +3,10 @@ from ros.lib import consume, produce
 from ros.lib.app import app
 from ros.extensions import db, cache
 from datetime import datetime, timezone
-from ros.lib.cache_utils import is_system_deleted
+from ros.lib.cache_utils import bump_org_generation, is_system_deleted
 from confluent_kafka import KafkaException
 from ros.lib.models import RhAccount, System
+from ros.lib.executive_report import record_profiles
 from ros.lib.config import (
     ENGINE_RESULT_TOPIC,
     METRICS_PORT,
@@ -65,34 +66,37 @@ class InsightsEngineConsumer:
         global producer
         producer = produce.init_producer()
 
-        for msg in iter(self):
-            if msg.error():
-                LOG.error(f"{self.prefix} - Consumer error: {msg.error()}")
-                kafka_failures.labels(reporter=self.reporter).inc()
-                raise KafkaException(msg.error())
-            try:
-                msg = json.loads(msg.value().decode("utf-8"))
-
-                org_id = msg["input"]["platform_metadata"].get('org_id')
-                if is_feature_flag_enabled(org_id, UNLEASH_ROS_V2_FLAG, self.prefix):
-                    continue
-
-                self.handle_msg(msg)
-            except json.decoder.JSONDecodeError:
-                kafka_failures.labels(reporter=self.reporter).inc()
-                LOG.error(
-                    f"{self.prefix} - Unable to decode kafka message: {msg.value()}"
-                )
-            except Exception as err:
-                processor_requests_failures.labels(
-                    reporter=self.reporter,
-                    org_id=msg["input"]["platform_metadata"].get('org_id')
-                ).inc()
-                LOG.error(
-                    f"{self.prefix} - An error occurred during message processing: {repr(err)}"
-                )
-            finally:
-                self.consumer.commit()
+        try:
+            for msg in iter(self):
+                if msg.error():
+                    LOG.error(f"{self.prefix} - Consumer error: {msg.error()}")
+                    kafka_failures.labels(reporter=self.reporter).inc()
+                    raise KafkaException(msg.error())
+                try:
+                    msg = json.loads(msg.value().decode("utf-8"))
+
+                    org_id = msg["input"]["platform_metadata"].get('org_id')
+                    if is_feature_flag_enabled(org_id, UNLEASH_ROS_V2_FLAG, self.prefix):
+                        continue
+
+                    self.handle_msg(msg)
+                except json.decoder.JSONDecodeError:
+                    kafka_failures.labels(reporter=self.reporter).inc()
+                    LOG.error(
+                        f"{self.prefix} - Unable to decode kafka message: {msg.value()}"
+                    )
+                except Exception as err:
+                    processor_requests_failures.labels(
+                        reporter=self.reporter,
+                        org_id=msg["input"]["platform_metadata"].get('org_id')
+                    ).inc()
+                    LOG.error(
+                        f"{self.prefix} - An error occurred during message processing: {repr(err)}"
+                    )
+                finally:
+                    self.consumer.commit()
+        finally:
+            producer.close()
 
     def handle_msg(self, msg):
         with app.app_context():
@@ -118,7 +122,8 @@ class InsightsEngineConsumer:
                     platform_metadata['url'],
                     platform_metadata.get('org_id'),
                     host['id'],
-                    custom_prefix=self.prefix
+                    custom_prefix=self.prefix,
+                    request_id=platform_metadata.get('request_id')
                 )
 
                 reports = []
@@ -236,10 +241,12 @@ class InsightsEngineConsumer:
 
                 insert_performance_profiles(
                     db.session, system.id, pprofile_fields)
+                record_profiles(db.session, [pprofile_fields])
                 LOG.info(
                     f"{self.prefix} - Performance profile created/updated successfully for the system: {host['id']}"
                 )
                 db.session.commit()
+                bump_org_generation(account.org_id)
 
                 # Trigger event for notification
                 self.trigger_notification(
@@ -1,12 +1,22 @@
 import json
 import os
 import sys
+import uuid
+from collections import namedtuple
 from prometheus_client import start_http_server
 from ros.lib import consume
 from ros.lib.app import app
 from ros.extensions import db, cache
-from ros.lib.utils import get_or_create, system_allowed_in_ros, update_system_record
-from ros.lib.cache_utils import set_deleted_system_cache, clear_deleted_system_cache
+from ros.lib.utils import (
+    bulk_get_or_create_accounts,
+    bulk_update_systems,
+    bulk_upsert_systems,
+    get_or_create,
+    system_allowed_in_ros,
+    update_system_record,
+)
+from ros.lib.cache_utils import bump_org_generation, set_deleted_system_cache, clear_deleted_system_cache
+from ros.lib.executive_report import remove_systems
 from confluent_kafka import KafkaException
 from ros.lib.models import RhAccount, System
 from ros.lib.config import (
@@ -14,16 +24,24 @@ from ros.lib.config import (
     METRICS_PORT,
     get_logger,
     GROUP_ID,
+    INVENTORY_EVENTS_BATCH_SIZE,
+    INVENTORY_EVENTS_BATCH_TIMEOUT_MS,
     UNLEASH_ROS_V2_FLAG
 )
 from ros.lib.cw_logging import commence_cw_log_streaming, threadctx
 from ros.processor.metrics import (processor_requests_success,
                                    processor_requests_failures,
-                                   kafka_failures)
+                                   kafka_failures,
+                                   inventory_events_coalesced)
 from ros.lib.unleash import is_feature_flag_enabled
 
 LOG = get_logger(__name__)
 
+# Events of a batch coalesced per inventory_id: the system fields of the
+# created and updated systems, the account of the created ones, the event
+# timestamp of the deleted ones and the org_id of all of them
+CoalescedEvents = namedtuple('CoalescedEvents', ['systems', 'created', 'deleted', 'org_ids'])
+
 
 class InventoryEventsConsumer:
     """Inventory events consumer."""
@@ -39,6 +57,8 @@ class InventoryEventsConsumer:
         }
         self.prefix = 'INVENTORY EVENTS'
         self.reporter = 'INVENTORY EVENTS'
+        self.batch_size = INVENTORY_EVENTS_BATCH_SIZE
+        self.batch_timeout = INVENTORY_EVENTS_BATCH_TIMEOUT_MS / 1000
 
     def __iter__(self):
         return self
@@ -52,67 +72,229 @@ class InventoryEventsConsumer:
     def run(self):
         """Initialize Consumer."""
         LOG.info(f"{self.prefix} - Processor is running. Awaiting msgs.")
+        if self.batch_size > 1:
+            self.run_batches()
+            return
+
         for msg in iter(self):
-            if msg.error():
-                LOG.error(f"{self.prefix} - Consumer error: {msg.error()}")
+            self.check_error(msg)
+            try:
+                self.process_message(msg.value())
+            finally:
+                self.consumer.commit()
+        LOG.warning("Stopping inventory consumer")
+        self.consumer.close()
+
+    def run_batches(self):
+        """Consume the events in batches of up to batch_size messages."""
+        try:
+            while True:
+                messages = self.consumer.consume(num_messages=self.batch_size, timeout=self.batch_timeout)
+                if messages:
+                    self.process_batch(messages)
+        finally:
+            LOG.warning("Stopping inventory consumer")
+            self.consumer.close()
+
+    def check_error(self, msg):
+        if msg.error():
+            LOG.error(f"{self.prefix} - Consumer error: {msg.error()}")
+            kafka_failures.labels(reporter=self.reporter).inc()
+            raise KafkaException(msg.error())
+
+    def process_message(self, value):
+        """Process the event of a kafka message value."""
+        account = None
+        host_id = None
+        org_id = None
+        try:
+            msg = json.loads(value.decode("utf-8"))
+            # SEE under consoledot documentation > services > inventory
+            # where there is a section called event_interface to get
+            # what keys present in event message.
+            event_type = msg['type']
+            metadata = msg['metadata']
+            if event_type == 'delete':
+                account = msg['account']
+                host_id = msg['id']
+                org_id = msg['org_id']
+            else:
+                account = msg['host']['account']
+                host_id = msg['host']['id']
+                org_id = msg['host'].get('org_id')
+
+            threadctx.request_id = None
+            if metadata is not None and isinstance(metadata, dict):
+                threadctx.request_id = metadata.get('request_id')
+            threadctx.account = account
+            threadctx.org_id = org_id
+
+            if is_feature_flag_enabled(org_id, UNLEASH_ROS_V2_FLAG, self.prefix):
+                return
+
+            if event_type in self.event_type_map.keys():
+                handler = self.event_type_map[event_type]
+                handler(msg)
+            else:
+                LOG.info(
+                    f"{self.prefix} - Unknown event of type {event_type}"
+                )
+        except json.decoder.JSONDecodeError:
+            kafka_failures.labels(reporter=self.reporter).inc()
+            LOG.error(
+                f"{self.prefix} - Unable to decode kafka message: {value}"
+            )
+        except Exception as err:
+            processor_requests_failures.labels(
+                reporter=self.reporter, org_id=org_id
+            ).inc()
+            _exc_type, _exc_obj, exc_tb = sys.exc_info()
+            fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
+            LOG.error(
+                f"{self.prefix} - An error occurred: {repr(err)}"
+                f" in {fname} at {exc_tb.tb_lineno} for a system {host_id}"
+                f" from account: {account} & org_id: {org_id}"
+            )
+
+    def process_batch(self, messages):
+        """
+        Apply a batch of events in one transaction, then commit the offsets
+        once. Events are coalesced per system, see coalesce_events. When the
+        transaction fails the events are processed one by one.
+        """
+        for message in messages:
+            self.check_error(message)
+
+        events = []
+        for message in messages:
+            try:
+                events.append(json.loads(message.value().decode("utf-8")))
+            except json.decoder.JSONDecodeError:
                 kafka_failures.labels(reporter=self.reporter).inc()
-                raise KafkaException(msg.error())
+                LOG.error(f"{self.reporter} - Unable to decode kafka message: {message.value()}")
+
+        with app.app_context():
+            try:
+                self._write_batch(self.coalesce_events(events))
+            except Exception as err:
+                db.session.rollback()
+                LOG.error(
+                    f"{self.reporter} - Failed to process a batch of {len(events)} events,"
+                    f" processing them one by one: {repr(err)}"
+                )
+                for message in messages:
+                    self.process_message(message.value())
 
-            account = None
-            host_id = None
+        self.consumer.commit(asynchronous=False)
+
+    def coalesce_events(self, events):
+        """
+        Coalesce the events of a batch per inventory_id: the fields of the
+        created and updated events of a system are merged in order, so the
+        newest values win, and a delete wins over both. Events skipped one by
+        one, of orgs on ROS v2 or of systems not allowed in ROS, are dropped.
+        """
+        batch = CoalescedEvents({}, {}, {}, {})
+        v2_orgs = {}
+        applied = 0
+        for msg in events:
             org_id = None
             try:
-                msg = json.loads(msg.value().decode("utf-8"))
-                # SEE under consoledot documentation > services > inventory
-                # where there is a section called event_interface to get
-                # what keys present in event message.
                 event_type = msg['type']
-                metadata = msg['metadata']
+                if event_type not in self.event_type_map:
+                    LOG.info(f"{self.reporter} - Unknown event of type {event_type}")
+                    continue
+                org_id = msg['org_id'] if event_type == 'delete' else msg['host'].get('org_id')
+                if org_id not in v2_orgs:
+                    v2_orgs[org_id] = is_feature_flag_enabled(org_id, UNLEASH_ROS_V2_FLAG, self.reporter)
+                if v2_orgs[org_id]:
+                    continue
+
                 if event_type == 'delete':
-                    account = msg['account']
-                    host_id = msg['id']
-                    org_id = msg['org_id']
+                    inventory_id = str(uuid.UUID(msg['id']))
+                    batch.deleted[inventory_id] = msg.get('timestamp')
                 else:
-                    account = msg['host']['account']
-                    host_id = msg['host']['id']
-                    org_id = msg['host'].get('org_id')
+                    if not system_allowed_in_ros(msg, self.reporter):
+                        continue
+                    inventory_id = str(uuid.UUID(msg['host']['id']))
+                    batch.systems.setdefault(inventory_id, {}).update(self.build_system_fields(msg))
+                    if event_type == 'created':
+                        batch.created[inventory_id] = msg['host']['account']
+                batch.org_ids[inventory_id] = org_id
+                applied += 1
+            except Exception as err:
+                processor_requests_failures.labels(reporter=self.reporter, org_id=org_id).inc()
+                LOG.error(f"{self.reporter} - Skipping an invalid event of the batch: {repr(err)}")
 
-                threadctx.request_id = None
-                if metadata is not None and isinstance(metadata, dict):
-                    threadctx.request_id = metadata.get('request_id')
-                threadctx.account = account
-                threadctx.org_id = org_id
+        for inventory_id in batch.deleted:
+            batch.systems.pop(inventory_id, None)
+            batch.created.pop(inventory_id, None)
+        inventory_events_coalesced.inc(applied - len(batch.org_ids))
+        return batch
 
-                if is_feature_flag_enabled(org_id, UNLEASH_ROS_V2_FLAG, self.prefix):
-                    continue
+    @staticmethod
+    def build_system_fields(msg):
+        """System fields of a created or updated event."""
+        host = msg['host']
+        system_profile = host['system_profile']
+        system_fields = {
+            "inventory_id": host['id'],
+            "display_name": host['display_name'],
+            "fqdn": host['fqdn'],
+            "stale_timestamp": host['stale_timestamp'],
+            "groups": host.get('groups', [])
+        }
+        if msg.get('type') == 'updated':
+            # Updated events only change the details they hold
+            for key in ('operating_system', 'cloud_provider'):
+                if system_profile.get(key) is not None:
+                    system_fields[key] = system_profile[key]
+        else:
+            system_fields.update({
+                "cloud_provider": system_profile['cloud_provider'],
+                "operating_system": system_profile.get('operating_system'),
+            })
+        return system_fields
 
-                if event_type in self.event_type_map.keys():
-                    handler = self.event_type_map[event_type]
-                    handler(msg)
-                else:
-                    LOG.info(
-                        f"{self.prefix} - Unknown event of type {event_type}"
-                    )
-            except json.decoder.JSONDecodeError:
-                kafka_failures.labels(reporter=self.reporter).inc()
-                LOG.error(
-                    f"{self.prefix} - Unable to decode kafka message: {msg.value()}"
-                )
-            except Exception as err:
-                processor_requests_failures.labels(
-                    reporter=self.reporter, org_id=org_id
-                ).inc()
-                _exc_type, _exc_obj, exc_tb = sys.exc_info()
-                fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
-                LOG.error(
-                    f"{self.prefix} - An error occurred: {repr(err)}"
-                    f" in {fname} at {exc_tb.tb_lineno} for a system {host_id}"
-                    f" from account: {account} & org_id: {org_id}"
+    def _write_batch(self, batch):
+        """Write the systems created, updated and deleted by a batch with bulk statements."""
+        accounts = bulk_get_or_create_accounts(
+            db.session,
+            [batch.org_ids[inventory_id] for inventory_id in batch.created],
+            accounts={batch.org_ids[inventory_id]: account for inventory_id, account in batch.created.items()}
+        )
+        for inventory_id in batch.created:
+            batch.systems[inventory_id]['tenant_id'] = accounts[batch.org_ids[inventory_id]]
+        system_ids = bulk_upsert_systems(db.session, [batch.systems[inventory_id] for inventory_id in batch.created])
+        updated = bulk_update_systems(
+            db.session,
+            [fields for inventory_id, fields in batch.systems.items() if inventory_id not in batch.created]
+        )
+
+        removed = set()
+        if batch.deleted:
+            doomed = System.inventory_id.in_(list(batch.deleted))
+            remove_systems(db.session, db.select(System.id).filter(doomed))
+            removed = {
+                str(inventory_id) for inventory_id in db.session.scalars(
+                    db.delete(System).filter(doomed).returning(System.inventory_id)
                 )
-            finally:
-                self.consumer.commit()
-        LOG.warning("Stopping inventory consumer")
-        self.consumer.close()
+            }
+        db.session.commit()
+
+        for inventory_id in removed:
+            set_deleted_system_cache(batch.org_ids[inventory_id], inventory_id, batch.deleted[inventory_id])
+        for inventory_id in system_ids.keys() | updated:
+            clear_deleted_system_cache(batch.org_ids[inventory_id], inventory_id)
+        changed = system_ids.keys() | updated | removed
+        for org_id in {batch.org_ids[inventory_id] for inventory_id in changed}:
+            bump_org_generation(org_id)
+        for inventory_id in changed:
+            processor_requests_success.labels(reporter=self.reporter, org_id=batch.org_ids[inventory_id]).inc()
+        LOG.info(
+            f"{self.reporter} - Processed a batch: {len(system_ids)} systems created/updated,"
+            f" {len(updated)} systems updated, {len(removed)} systems deleted."
+        )
 
     def host_delete_event(self, msg):
         """Process delete message."""
@@ -126,12 +308,14 @@ class InventoryEventsConsumer:
                 f"{self.prefix} - Received a message for system with inventory_id {host_id}"
             )
 
+            remove_systems(db.session, db.select(System.id).filter(System.inventory_id == host_id))
             rows_deleted = db.session.execute(db.delete(System).filter(System.inventory_id == host_id))
             db.session.commit()
 
             if rows_deleted.rowcount == 1:
 
                 set_deleted_system_cache(org_id, host_id, event_timestamp)
+                bump_org_generation(org_id)
                 processor_requests_success.labels(
                     reporter=self.reporter, org_id=org_id
                 ).inc()
@@ -154,21 +338,7 @@ class InventoryEventsConsumer:
         host = msg['host']
         with app.app_context():
             if (msg.get('type') == 'updated'):
-                system_fields = {
-                    "inventory_id": host['id'],
-                    "display_name": host['display_name'],
-                    "fqdn": host['fqdn'],
-                    "stale_timestamp": host['stale_timestamp'],
-                    "groups": host.get('groups', [])
-                }
-
-                operating_system = host['system_profile'].get('operating_system')
-                cloud_provider = host['system_profile'].get('cloud_provider')
-                if (operating_system is not None):
-                    system_fields.update({"operating_system": operating_system})
-                if (cloud_provider is not None):
-                    system_fields.update({"cloud_provider": cloud_provider})
-
+                system_fields = self.build_system_fields(msg)
                 system = update_system_record(db.session, **system_fields)
                 if system is not None:
                     db.session.commit()
@@ -181,6 +351,7 @@ class InventoryEventsConsumer:
                         f"belonging to account: {account.account} ({account.id}) and org_id: {account.org_id}"
                     )
                     clear_deleted_system_cache(account.org_id, host.get('id'))
+                    bump_org_generation(account.org_id)
             else:
                 try:
                     account = get_or_create(
@@ -189,16 +360,7 @@ class InventoryEventsConsumer:
                         org_id=host.get('org_id')
                     )
 
-                    system_fields = {
-                        "tenant_id": account.id,
-                        "inventory_id": host['id'],
-                        "display_name": host['display_name'],
-                        "fqdn": host['fqdn'],
-                        "cloud_provider": host['system_profile']['cloud_provider'],
-                        "stale_timestamp": host['stale_timestamp'],
-                        "operating_system": host['system_profile'].get('operating_system'),
-                        "groups": host.get('groups', [])
-                    }
+                    system_fields = {"tenant_id": account.id, **self.build_system_fields(msg)}
                     system = get_or_create(db.session, System, 'inventory_id', **system_fields)
 
                     # Commit changes
@@ -211,6 +373,7 @@ class InventoryEventsConsumer:
                         f"belonging to account: {account.account} ({account.id}) and org_id: {account.org_id}"
                     )
                     clear_deleted_system_cache(account.org_id, host['id'])
+                    bump_org_generation(account.org_id)
                 except Exception as err:
                     processor_requests_failures.labels(
                         reporter=self.reporter, org_id=account.org_id
@@ -1,4 +1,4 @@
-from prometheus_client import Counter
+from prometheus_client import Counter, Gauge, Histogram
 
 processor_requests_success = Counter(
     "ros_processor_requests_success",
@@ -30,8 +30,125 @@ archive_failed_to_download = Counter(
     ["org_id"]
 )
 
+archive_download_bytes = Histogram(
+    "ros_archive_download_bytes",
+    "Size of the downloaded archives in bytes",
+    buckets=[2 ** power for power in range(16, 28)] + [float("inf")]
+)
+
+archive_download_seconds = Histogram(
+    "ros_archive_download_seconds",
+    "Time taken to download an archive in seconds"
+)
+
+archive_cache_hits = Counter(
+    "ros_archive_cache_hits",
+    "Number of extracted archives served from the archive cache"
+)
+
+archive_cache_misses = Counter(
+    "ros_archive_cache_misses",
+    "Number of archives downloaded and extracted on an archive cache miss"
+)
+
+archive_cache_bytes_saved = Counter(
+    "ros_archive_cache_bytes_saved",
+    "Archive bytes not downloaded again thanks to the archive cache"
+)
+
 ec2_instance_lookup_failures = Counter(
     "failed_to_lookup_ec2_instance_type",
     "Number of AWS EC2 instance type lookup failures",
     ["org_id"]
 )
+
+solution_cache_hits = Counter(
+    "ros_solution_cache_hits",
+    "Number of priced candidate lists served from the solution cache"
+)
+
+solution_cache_misses = Counter(
+    "ros_solution_cache_misses",
+    "Number of priced candidate lists computed on a solution cache miss"
+)
+
+gc_rows_deleted = Counter(
+    "ros_gc_rows_deleted",
+    "Number of outdated rows deleted by the garbage collector",
+    ["table"]
+)
+
+gc_delete_chunk_seconds = Histogram(
+    "ros_gc_delete_chunk_seconds",
+    "Time taken by the garbage collector to delete and commit a chunk of rows in seconds",
+    ["table"]
+)
+
+response_cache_hits = Counter(
+    "ros_response_cache_hits",
+    "Number of API responses served from the response cache",
+    ["endpoint"]
+)
+
+response_cache_misses = Counter(
+    "ros_response_cache_misses",
+    "Number of API responses computed on a response cache miss",
+    ["endpoint"]
+)
+
+permission_cache_hits = Counter(
+    "ros_permission_cache_hits",
+    "Number of permission checks answered from the permission cache",
+    ["tier"]
+)
+
+permission_cache_misses = Counter(
+    "ros_permission_cache_misses",
+    "Number of permission checks that queried RBAC or Kessel"
+)
+
+permission_check_seconds = Histogram(
+    "ros_permission_check_seconds",
+    "Time spent querying RBAC or Kessel for a permission verdict",
+    ["backend"]
+)
+
+http_client_request_seconds = Histogram(
+    "ros_http_client_request_seconds",
+    "Time until the response headers of the HTTP requests of a client, retries included",
+    ["client"]
+)
+
+http_client_connections_opened = Counter(
+    "ros_http_client_connections_opened",
+    "Number of connections opened by an HTTP client, the other requests reused one",
+    ["client"]
+)
+
+inventory_events_coalesced = Counter(
+    "ros_inventory_events_coalesced",
+    "Number of inventory events superseded by a later event of the same system in their batch"
+)
+
+suggestions_engine_events_skipped = Counter(
+    "ros_suggestions_engine_events_skipped",
+    "Number of events with an archive skipped for a newer event of the same host, of the same archive or not",
+    ["reason"]
+)
+
+kafka_producer_queue_depth = Gauge(
+    "ros_kafka_producer_queue_depth",
+    "Number of messages waiting in the producer queue to be delivered"
+)
+
+kafka_producer_delivery_seconds = Histogram(
+    "ros_kafka_producer_delivery_seconds",
+    "Time from producing a message to its acknowledgement by the broker",
+    ["topic"]
+)
+
+kafka_producer_delivery_failures = Counter(
+    "ros_kafka_producer_delivery_failures",
+    "Number of messages the producer failed to deliver",
+    ["topic"]
+)
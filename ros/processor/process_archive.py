@@ -1,16 +1,15 @@
-import requests
 import logging
 import pydash as _
-from http import HTTPStatus
 from contextlib import contextmanager
-from tempfile import NamedTemporaryFile
-from insights import extract, rule, run, make_metadata
+from insights import rule, run, make_metadata
 from insights.parsers.pmlog_summary import PmLogSummary
 from insights.parsers.lscpu import LsCPU
 from insights.parsers.aws_instance_id import AWSInstanceIdDoc
 from insights.parsers.azure_instance import AzureInstanceType
 from insights.core import dr
 from ros.lib.config import INSIGHTS_EXTRACT_LOGLEVEL
+from ros.lib.archive_cache import archive_cache
+from ros.lib.archive_download import download_archive, DownloadError
 from ros.processor.metrics import (archive_downloaded_success,
                                    archive_failed_to_download,
                                    processor_requests_failures)
@@ -58,8 +57,10 @@ def performance_profile(lscpu, aws_instance_id, azure_instance_type, pmlog_summa
     return metadata_response
 
 
-def get_performance_profile(report_url, org_id, host_id, custom_prefix=prefix):
-    with _download_and_extract_report(report_url, org_id, host_id, custom_prefix=custom_prefix) as archive:
+def get_performance_profile(report_url, org_id, host_id, custom_prefix=prefix, request_id=None):
+    with _download_and_extract_report(
+            report_url, org_id, host_id, custom_prefix=custom_prefix, request_id=request_id
+    ) as archive:
         try:
             LOG.debug(
                 f"{custom_prefix} - Extracting performance profile from the report present at {report_url}\n"
@@ -83,21 +84,23 @@ def get_performance_profile(report_url, org_id, host_id, custom_prefix=prefix):
 
 
 @contextmanager
-def _download_and_extract_report(report_url, org_id, host_id, custom_prefix=prefix):
-    download_response = requests.get(report_url)
-    LOG.info(f"{custom_prefix} - Downloading the report for system {host_id} from {report_url}.\n")
+def _download_and_extract_report(report_url, org_id, host_id, custom_prefix=prefix, request_id=None):
+    @contextmanager
+    def download(url):
+        LOG.info(f"{custom_prefix} - Downloading the report for system {host_id} from {url}.\n")
+        with download_archive(url) as archive_path:
+            archive_downloaded_success.labels(org_id=org_id).inc()
+            LOG.debug(f"{custom_prefix} - Downloaded the report successfully from {url}.\n")
+            yield archive_path
 
-    if download_response.status_code != HTTPStatus.OK:
+    try:
+        # The extracted archive is shared through the cache, e.g. with a redelivered message
+        with archive_cache().extracted(report_url, request_id, download=download) as ex:
+            yield ex
+    except DownloadError as error:
         archive_failed_to_download.labels(org_id=org_id).inc()
         LOG.error(
             f"{custom_prefix} - Unable to download the report for system {host_id} from {report_url}. "
-            f"ERROR - {download_response.reason}\n"
+            f"ERROR - {error}\n"
         )
-    else:
-        archive_downloaded_success.labels(org_id=org_id).inc()
-        with NamedTemporaryFile() as tf:
-            tf.write(download_response.content)
-            LOG.debug(f"{custom_prefix} - Downloaded the report successfully from {report_url}.\n")
-            tf.flush()
-            with extract(tf.name) as ex:
-                yield ex
+        raise
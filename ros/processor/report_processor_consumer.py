@@ -1,21 +1,30 @@
 import json
+import uuid
 from datetime import datetime, timezone
 from prometheus_client import start_http_server
 
 from ros.lib import consume
 from ros.lib.app import app
-from ros.extensions import db
+from ros.extensions import db, cache
+from ros.lib.cache_utils import bump_org_generation
 from ros.lib.models import RhAccount, System
+from ros.lib.executive_report import record_profiles
 from ros.lib.config import (
     ROS_EVENTS_TOPIC,
     METRICS_PORT,
     get_logger,
     GROUP_ID_REPORT_PROCESSOR,
+    REPORT_PROCESSOR_BATCH_SIZE,
+    REPORT_PROCESSOR_BATCH_TIMEOUT_MS,
 )
 from ros.lib.utils import (
     get_or_create,
     insert_performance_profiles,
-    update_system_record
+    update_system_record,
+    bulk_get_or_create_accounts,
+    bulk_insert_performance_profiles,
+    bulk_update_systems,
+    bulk_upsert_systems,
 )
 
 logging = get_logger(__name__)
@@ -25,12 +34,20 @@ class ReportProcessorConsumer:
     def __init__(self):
         self.consumer = consume.init_consumer(ROS_EVENTS_TOPIC, GROUP_ID_REPORT_PROCESSOR)
         self.service = 'REPORT_PROCESSOR'
+        self.batch_size = REPORT_PROCESSOR_BATCH_SIZE
+        self.batch_timeout = REPORT_PROCESSOR_BATCH_TIMEOUT_MS / 1000
 
     def run(self):
         logging.info(f"{self.service} - ReportProcessor is running. Awaiting msgs.")
 
         try:
             while True:
+                if self.batch_size > 1:
+                    messages = self.consumer.consume(num_messages=self.batch_size, timeout=self.batch_timeout)
+                    if messages:
+                        self.process_batch(messages)
+                    continue
+
                 message = self.consumer.poll(timeout=1.0)
                 if message is None:
                     continue
@@ -51,14 +68,95 @@ class ReportProcessorConsumer:
         payload = json.loads(message.value().decode('utf-8'))
 
         with app.app_context():
+            self.process_payload(payload)
+
+            self.consumer.commit()
+
+    def process_batch(self, messages):
+        """
+        Write the systems and performance profiles of a batch of messages in
+        one transaction, then commit the offsets. When the transaction fails
+        the messages are processed one by one, a bad message only fails itself.
+        """
+        payloads = []
+        for message in messages:
+            if message.error():
+                logging.error(f"{self.service} - Consumer error: {message.error()}")
+                continue
+            try:
+                payloads.append(json.loads(message.value().decode('utf-8')))
+            except json.JSONDecodeError as error:
+                logging.error(f"{self.service} - Failed to decode message: {error}")
+
+        if payloads:
+            with app.app_context():
+                try:
+                    self._write_batch(payloads)
+                except Exception as error:
+                    db.session.rollback()
+                    logging.error(
+                        f"{self.service} - Failed to process a batch of {len(payloads)} messages,"
+                        f" processing them one by one: {error}"
+                    )
+                    for payload in payloads:
+                        self.process_payload(payload)
+
+        self.consumer.commit(asynchronous=False)
+
+    def process_payload(self, payload):
+        if self._has_performance_data(payload):
+            self._process_with_performance_data(payload)
+        else:
+            self._process_without_performance_data(payload)
+
+    def _write_batch(self, payloads):
+        """
+        Apply the payloads in order: the fields of the messages of a system
+        are merged, the later ones win, and every performance profile goes to
+        the history. Systems are only created by created events and events
+        with performance data, updated events only update existing systems.
+        """
+        systems = {}
+        created = {}
+        profiles = []
+        for payload in payloads:
+            event_type = payload.get('type')
             has_performance_data = self._has_performance_data(payload)
+            if not has_performance_data and event_type not in ('created', 'updated'):
+                continue
 
+            inventory_id = str(uuid.UUID(payload.get('id')))
+            system_fields = self._build_system_fields(payload)
             if has_performance_data:
-                self._process_with_performance_data(payload)
-            else:
-                self._process_without_performance_data(payload)
-
-            self.consumer.commit()
+                system_fields.update(self._build_rules_system_fields(payload))
+                profiles.append((inventory_id, self._build_performance_profile_fields(payload)))
+            systems.setdefault(inventory_id, {}).update(system_fields)
+            if has_performance_data or event_type == 'created':
+                created[inventory_id] = payload.get('org_id')
+
+        accounts = bulk_get_or_create_accounts(db.session, created.values())
+        for inventory_id, org_id in created.items():
+            systems[inventory_id]['tenant_id'] = accounts[org_id]
+
+        system_ids = bulk_upsert_systems(db.session, [systems[inventory_id] for inventory_id in created])
+        updated = bulk_update_systems(
+            db.session,
+            [fields for inventory_id, fields in systems.items() if inventory_id not in created]
+        )
+        performance_profiles = [{"system_id": system_ids[inventory_id], **fields} for inventory_id, fields in profiles]
+        bulk_insert_performance_profiles(db.session, performance_profiles)
+        if performance_profiles:
+            record_profiles(db.session, performance_profiles)
+        db.session.commit()
+        for org_id in {payload.get('org_id') for payload in payloads}:
+            bump_org_generation(org_id)
+
+        for inventory_id in systems.keys() - created.keys() - updated:
+            logging.warning(f"{self.service} - System {inventory_id} not found for update.")
+        logging.info(
+            f"{self.service} - Processed a batch of {len(payloads)} messages: {len(system_ids)} systems"
+            f" created/updated, {len(updated)} systems updated, {len(profiles)} performance profiles."
+        )
 
     def _has_performance_data(self, payload):
         return (
@@ -84,6 +182,30 @@ class ReportProcessorConsumer:
 
         return system_fields
 
+    def _build_rules_system_fields(self, payload):
+        return {
+            "cpu_states": payload.get('cpu_states'),
+            "io_states": payload.get('io_states'),
+            "memory_states": payload.get('memory_states'),
+            "state": payload.get('state'),
+            "instance_type": payload.get('instance_type'),
+            "region": payload.get('region')
+        }
+
+    def _build_performance_profile_fields(self, payload):
+        return {
+            "performance_record": payload.get('performance_record'),
+            "performance_utilization": payload.get('performance_utilization'),
+            "report_date": datetime.now(timezone.utc),
+            "rule_hit_details": payload.get('rule_hit_details'),
+            "number_of_recommendations": payload.get('number_of_recommendations', 0),
+            "state": payload.get('state'),
+            "operating_system": payload.get('operating_system'),
+            "psi_enabled": payload.get('psi_enabled'),
+            "top_candidate": payload.get('top_candidate'),
+            "top_candidate_price": payload.get('top_candidate_price')
+        }
+
     def _process_without_performance_data(self, payload):
         """
         Process API events or create/update events without PCP data.
@@ -109,6 +231,7 @@ class ReportProcessorConsumer:
 
                 if system is not None:
                     db.session.commit()
+                    bump_org_generation(org_id)
                     logging.info(f"{self.service} - Updated system {system.inventory_id} ({system.id})")
                 else:
                     logging.warning(f"{self.service} - System {inventory_id} not found for update.")
@@ -119,6 +242,7 @@ class ReportProcessorConsumer:
                 system = get_or_create(db.session, System, 'inventory_id', **system_fields)
 
                 db.session.commit()
+                bump_org_generation(org_id)
                 logging.info(f"{self.service} - Created system {system.inventory_id} ({system.id})")
 
         except Exception as error:
@@ -145,14 +269,7 @@ class ReportProcessorConsumer:
             account = get_or_create(db.session, RhAccount, 'org_id', org_id=org_id)
 
             system_fields = self._build_system_fields(payload, account.id)
-            system_fields.update({
-                "cpu_states": payload.get('cpu_states'),
-                "io_states": payload.get('io_states'),
-                "memory_states": payload.get('memory_states'),
-                "state": payload.get('state'),
-                "instance_type": payload.get('instance_type'),
-                "region": payload.get('region')
-            })
+            system_fields.update(self._build_rules_system_fields(payload))
 
             system = get_or_create(db.session, System, 'inventory_id', **system_fields)
             logging.info(
@@ -161,24 +278,17 @@ class ReportProcessorConsumer:
 
             performance_profile_fields = {
                 "system_id": system.id,
-                "performance_record": payload.get('performance_record'),
-                "performance_utilization": payload.get('performance_utilization'),
-                "report_date": datetime.now(timezone.utc),
-                "rule_hit_details": payload.get('rule_hit_details'),
-                "number_of_recommendations": payload.get('number_of_recommendations', 0),
-                "state": payload.get('state'),
-                "operating_system": payload.get('operating_system'),
-                "psi_enabled": payload.get('psi_enabled'),
-                "top_candidate": payload.get('top_candidate'),
-                "top_candidate_price": payload.get('top_candidate_price')
+                **self._build_performance_profile_fields(payload)
             }
 
             insert_performance_profiles(db.session, system.id, performance_profile_fields)
+            record_profiles(db.session, [performance_profile_fields])
             logging.info(
                 f"{self.service} - Performance profile created/updated successfully for system: {inventory_id}"
             )
 
             db.session.commit()
+            bump_org_generation(org_id)
             logging.info(f"{self.service} - Successfully processed system {inventory_id} ({system.id})")
 
         except Exception as error:
@@ -187,5 +297,6 @@ class ReportProcessorConsumer:
 
 if __name__ == "__main__":
     start_http_server(int(METRICS_PORT))
+    cache.init_app(app)
     processor = ReportProcessorConsumer()
     processor.run()
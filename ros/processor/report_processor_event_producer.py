@@ -405,7 +405,7 @@ def _send_event(producer, final_payload, host_id, request_id):
     """Serialize and send the event to Kafka.
 
     Args:
-        producer: Kafka producer instance
+        producer: EventProducer of ros.lib.produce
         final_payload: Complete payload to send
         host_id: Host inventory ID for the message key
         request_id: Request ID for logging
@@ -417,7 +417,6 @@ def _send_event(producer, final_payload, host_id, request_id):
         key=host_id,
         on_delivery=lambda err, msg: delivery_report(err, msg, host_id, request_id, ROS_EVENTS_TOPIC)
     )
-    producer.poll()
 
 
 def produce_report_processor_event(
@@ -1,13 +1,14 @@
 import os
 import json
 import shutil
+import threading
 import subprocess
-from http import HTTPStatus
+import time
+from collections import deque
 from contextlib import contextmanager
-from tempfile import NamedTemporaryFile
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
-from insights import extract
+from confluent_kafka import KafkaException
 from prometheus_client import start_http_server
 from tenacity import (
     retry,
@@ -23,7 +24,11 @@ from ros.lib.config import (
     METRICS_PORT,
     INVENTORY_EVENTS_TOPIC,
     GROUP_ID_SUGGESTIONS_ENGINE,
-    UNLEASH_ROS_V2_FLAG
+    UNLEASH_ROS_V2_FLAG,
+    POLL_TIMEOUT_SECS,
+    SUGGESTIONS_ENGINE_WORKERS,
+    SUGGESTIONS_ENGINE_MAX_IN_FLIGHT,
+    SUGGESTIONS_ENGINE_DEDUP_WINDOW_MS
 )
 from ros.extensions import cache
 from ros.rules.rules_engine import (
@@ -38,17 +43,44 @@ from ros.processor.report_processor_event_producer import (
 )
 from ros.lib.unleash import is_feature_flag_enabled
 from ros.lib.cache_utils import is_system_deleted
+from ros.lib.offset_tracker import OffsetTracker
+from ros.lib.archive_download import download_archive, DownloadError
+from ros.lib.archive_extract import extract_archive
+from ros.processor.metrics import suggestions_engine_events_skipped
 
 logging = get_logger(__name__)
 
 
 class SuggestionsEngine:
     def __init__(self):
-        self.consumer = consume.init_consumer(INVENTORY_EVENTS_TOPIC, GROUP_ID_SUGGESTIONS_ENGINE)
+        self.consumer = consume.init_consumer(
+            INVENTORY_EVENTS_TOPIC, GROUP_ID_SUGGESTIONS_ENGINE, on_revoke=self.on_revoke
+        )
         self.producer = produce.init_producer()
         self.service = 'SUGGESTIONS_ENGINE'
+        self.workers = SUGGESTIONS_ENGINE_WORKERS
+        self.max_in_flight = max(SUGGESTIONS_ENGINE_MAX_IN_FLIGHT, 1)
+        self.offsets = OffsetTracker()
+        self.dedup_window = SUGGESTIONS_ENGINE_DEDUP_WINDOW_MS / 1000
+        # Messages with an archive held for the de-duplication window, by host id,
+        # with the archive and the time they are released at
+        self.held = {}
+        # Messages of a host are processed one at a time in the order they are
+        # consumed, the first message of each host is the one being processed
+        self.host_messages = {}
+        self.hosts_lock = threading.Condition()
+        # Messages are processed by several threads, keep the event per thread
+        self._local = threading.local()
         self.event = None
 
+    @property
+    def event(self):
+        return getattr(self._local, 'event', None)
+
+    @event.setter
+    def event(self, value):
+        self._local.event = value
+
     @retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type(subprocess.TimeoutExpired))
     def run_pmlogextract(self, host, index_file_path, output_dir):
         """Run the pmlogextract command."""
@@ -150,16 +182,6 @@ class SuggestionsEngine:
                 f" {error}"
             )
 
-    def find_root_directory(self, directory, target_file):
-        """
-        Recursively search for the target file in the given directory - to get root directory of an archive.
-        """
-        for dirpath, _, filenames in os.walk(directory):
-            if target_file in filenames:
-                return dirpath
-
-        return None
-
     def get_index_file_path(self, host, extracted_dir_root):
         if not extracted_dir_root:
             logging.error(
@@ -182,24 +204,18 @@ class SuggestionsEngine:
         logging.debug(f"{self.service} - {self.event} - Report downloading for system {host.get('id')}.")
 
         try:
-            response = requests.get(archive_URL, timeout=10)
-            self.consumer.commit()
-
-            if response.status_code != HTTPStatus.OK:
-                logging.error(
-                    f"{self.service} - {self.event} - Unable to download the report for system {host.get('id')}. "
-                    f"ERROR - {response.reason}"
+            with download_archive(archive_URL) as archive_path:
+                logging.info(
+                    f"{self.service} - {self.event} - Report downloaded successfully for system {host.get('id')}"
                 )
-                yield None
-            else:
-                with NamedTemporaryFile(delete=True) as tempfile:
-                    tempfile.write(response.content)
-                    logging.info(
-                        f"{self.service} - {self.event} - Report downloaded successfully for system {host.get('id')}"
-                    )
-                    tempfile.flush()
-                    with extract(tempfile.name) as extract_dir:
-                        yield extract_dir
+                with extract_archive(archive_path) as extract_dir:
+                    yield extract_dir
+        except DownloadError as error:
+            logging.error(
+                f"{self.service} - {self.event} - Unable to download the report for system {host.get('id')}. "
+                f"ERROR - {error}"
+            )
+            yield None
         except Exception as error:
             logging.error(f"{self.service} - {self.event} - Error occurred during download and extraction: {error}")
 
@@ -227,8 +243,7 @@ class SuggestionsEngine:
                 host,
                 org_id=host.get('org_id')
         ) as ext_dir:
-            extracted_dir = ext_dir.tmp_dir
-            extracted_dir_root = self.find_root_directory(extracted_dir, "insights_archive.txt")
+            extracted_dir_root = ext_dir.root
 
             if not is_pcp_raw_data_collected:
                 # No PCP data - only run report_metadata rule to get system metadata
@@ -241,7 +256,6 @@ class SuggestionsEngine:
                 # Run only report_metadata rule (cloud_metadata is a condition, so it will be evaluated)
                 rules_runner = insights_run([report_metadata], root=extracted_dir_root)
 
-                self.consumer.commit()
                 produce_report_processor_event(
                     payload,
                     self.producer,
@@ -278,7 +292,6 @@ class SuggestionsEngine:
         logging.debug(
             f"{self.service} - {self.event} - Triggering an event for system {host.get('id')}, updated via API"
         )
-        self.consumer.commit()
         # API events don't have PCP data - only update System, no PerformanceProfile
         produce_report_processor_event(
             payload,
@@ -307,24 +320,200 @@ class SuggestionsEngine:
         elif event_type in ('created', 'updated'):
             self.handle_create_update(payload)
 
+    @staticmethod
+    def archive_event_key(message):
+        """
+        Return the host id and the archive, its request_id or URL, of a
+        created or updated event with an archive, None for other messages.
+        """
+        try:
+            payload = json.loads(message.value().decode('utf-8'))
+        except (TypeError, ValueError):
+            return None
+
+        event_type = payload.get('type')
+        if event_type not in ('created', 'updated'):
+            return None
+        producer = dict(message.headers() or []).get('producer', b'').decode('utf-8')
+        if event_type == 'updated' and 'host-inventory-service' in producer:
+            return None
+
+        host = payload.get('host') or {}
+        platform_metadata = payload.get('platform_metadata') or {}
+        if not host.get('id') or not platform_metadata.get('url'):
+            return None
+        return host['id'], platform_metadata.get('request_id') or platform_metadata['url']
+
+    def hold(self, message):
+        """
+        Hold a message with an archive for the de-duplication window and
+        return True, the message held for the same host before is skipped.
+        The window of a host starts with its first held message, any other
+        message of the host releases it, see submit.
+        """
+        if self.dedup_window <= 0:
+            return False
+        key = self.archive_event_key(message)
+        if key is None:
+            return False
+
+        host_id, archive = key
+        release_at = time.monotonic() + self.dedup_window
+        if host_id in self.held:
+            superseded, superseded_archive, release_at = self.held[host_id]
+            reason = 'duplicate' if superseded_archive == archive else 'superseded'
+            suggestions_engine_events_skipped.labels(reason).inc()
+            logging.info(f"{self.service} - Skipping an event of system {host_id} for a newer one ({reason})")
+            self.offsets.done(superseded)
+        self.held[host_id] = (message, archive, release_at)
+        return True
+
+    def release(self):
+        """
+        Return the held messages whose window ended. Messages still held on
+        shutdown are not committed, they are consumed again on restart.
+        """
+        now = time.monotonic()
+        released = [host_id for host_id, (_message, _archive, release_at) in self.held.items() if release_at <= now]
+        return [self.held.pop(host_id)[0] for host_id in released]
+
+    @staticmethod
+    def message_host_id(message):
+        """Return the id of the host of an event, None when it can not be decoded."""
+        try:
+            payload = json.loads(message.value().decode('utf-8'))
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(payload, dict):
+            return None
+        return (payload.get('host') or {}).get('id') or payload.get('id')
+
+    def submit(self, executor, message):
+        """
+        Queue a message behind the ones of its host, after the message held
+        for the host if any, so the events of a host are processed in order.
+        """
+        host_id = self.message_host_id(message)
+        messages = [message]
+        if host_id is not None and host_id in self.held:
+            messages.insert(0, self.held.pop(host_id)[0])
+        key = host_id or (message.topic(), message.partition(), message.offset())
+
+        with self.hosts_lock:
+            idle = key not in self.host_messages
+            self.host_messages.setdefault(key, deque()).extend(messages)
+        if idle:
+            executor.submit(self.process_host_messages, key)
+
+    def process_host_messages(self, key):
+        """Process the queued messages of a host until there is none left."""
+        with self.hosts_lock:
+            message = self.host_messages[key][0]
+        while True:
+            self.process_message_task(message)
+            with self.hosts_lock:
+                queue = self.host_messages[key]
+                queue.popleft()
+                self.hosts_lock.notify_all()
+                if not queue:
+                    del self.host_messages[key]
+                    return
+                message = queue[0]
+
+    def in_flight(self):
+        """Number of the messages being processed or queued."""
+        with self.hosts_lock:
+            return sum(len(queue) for queue in self.host_messages.values())
+
+    def process_message_task(self, message):
+        """Process a message in a worker thread and mark its offset as done."""
+        try:
+            self.process_message(message)
+        except json.JSONDecodeError as error:
+            logging.error(f"{self.service} - {self.event} - Failed to decode message: {error}")
+        except Exception as error:
+            logging.error(f"{self.service} - {self.event} - Error processing message: {error}")
+        finally:
+            self.offsets.done(message)
+
+    def commit_offsets(self):
+        """Commit, in order per partition, the offsets of the processed messages."""
+        offsets = self.offsets.committable()
+        if not offsets:
+            return
+        try:
+            self.consumer.commit(offsets=offsets, asynchronous=False)
+        except KafkaException as error:
+            logging.error(f"{self.service} - Failed to commit offsets: {error}")
+            return
+        self.offsets.committed(offsets)
+
+    def on_revoke(self, consumer, partitions):
+        """
+        Rebalance callback, drop the held and queued messages of the revoked
+        partitions, wait for the ones being processed and commit their offsets
+        before the partitions are handed to another consumer. The dropped
+        messages are consumed again by the new owner.
+        """
+        revoked = {(tp.topic, tp.partition) for tp in partitions}
+
+        def is_revoked(message):
+            return (message.topic(), message.partition()) in revoked
+
+        for host_id in [host_id for host_id, (message, *_) in self.held.items() if is_revoked(message)]:
+            del self.held[host_id]
+        with self.hosts_lock:
+            for queue in self.host_messages.values():
+                processing = queue.popleft()
+                kept = [message for message in queue if not is_revoked(message)]
+                queue.clear()
+                queue.extend([processing] + kept)
+            self.hosts_lock.wait_for(
+                lambda: not any(is_revoked(queue[0]) for queue in self.host_messages.values())
+            )
+
+        self.commit_offsets()
+        self.offsets.forget(partitions)
+        logging.info(f"{self.service} - Partitions revoked: {sorted(revoked)}")
+
     def run(self):
-        logging.info(f"{self.service} - Engine is running. Awaiting msgs.")
+        logging.info(
+            f"{self.service} - Engine is running with {self.workers} workers. Awaiting msgs."
+        )
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='suggestions-engine-worker')
+        paused = False
         try:
             while True:
-                message = self.consumer.poll(timeout=1.0)
+                self.commit_offsets()
+                for message in self.release():
+                    self.submit(executor, message)
+
+                # Keep polling while the workers are busy, so the consumer stays
+                # in its group and serves rebalances, with its partitions paused
+                if self.in_flight() >= self.max_in_flight:
+                    self.consumer.pause(self.consumer.assignment())
+                    paused = True
+                elif paused:
+                    self.consumer.resume(self.consumer.assignment())
+                    paused = False
+
+                message = self.consumer.poll(timeout=POLL_TIMEOUT_SECS)
                 if message is None:
                     continue
+                if message.error():
+                    logging.error(f"{self.service} - Consumer error: {message.error()}")
+                    continue
 
-                try:
-                    self.process_message(message)
-                except json.JSONDecodeError as error:
-                    logging.error(f"{self.service} - {self.event} - Failed to decode message: {error}")
-                except Exception as error:
-                    logging.error(f"{self.service} - {self.event} - Error processing message: {error}")
+                self.offsets.add(message)
+                if not self.hold(message):
+                    self.submit(executor, message)
 
         except Exception as error:
             logging.error(f"{self.service} - {self.event} - error: {error}")
         finally:
+            executor.shutdown(wait=True)
+            self.producer.close()
+            self.commit_offsets()
             self.consumer.close()
 
 
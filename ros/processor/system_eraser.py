@@ -16,7 +16,8 @@ from ros.lib.app import app
 from ros.extensions import db, cache
 from ros.lib.models import System
 from ros.lib.unleash import is_feature_flag_enabled
-from ros.lib.cache_utils import set_deleted_system_cache
+from ros.lib.cache_utils import bump_org_generation, set_deleted_system_cache
+from ros.lib.executive_report import remove_systems
 
 
 logging = get_logger(__name__)
@@ -38,6 +39,7 @@ class SystemEraser:
     def delete_system(self, host_id, org_id=None, event_timestamp=None):
         try:
             with app.app_context():
+                remove_systems(db.session, db.select(System.id).filter(System.inventory_id == host_id))
                 rows_deleted = db.session.execute(
                     db.delete(System).filter(System.inventory_id == host_id)
                 )
@@ -45,6 +47,7 @@ class SystemEraser:
 
                 if org_id:
                     set_deleted_system_cache(org_id, host_id, event_timestamp)
+                    bump_org_generation(org_id)
 
                 if rows_deleted.rowcount > 0:
                     logging.info(
@@ -0,0 +1,74 @@
+"""
+Batch evaluation of already parsed utilization data.
+
+run_rules evaluates one archive at a time through the insights-core
+dependency graph. evaluate_batch runs the same ROS logic of
+ros.rules.rules_engine over many hosts at once, e.g. to re-evaluate a fleet
+after RosThresholds change or to back-fill states without downloading the
+archives again.
+
+Every host goes through the same condition functions an archive goes
+through, so the results are identical to run_rules. The candidate lists and
+the priced solution are computed once per distinct host shape of the batch.
+"""
+from collections import namedtuple
+
+from insights import SkipComponent
+
+from ros.rules import rules_engine
+from ros.rules.rules_engine import CloudInstance
+
+# Utilization of one host, in the format returned by the rules engine conditions
+# - cpu: cpu_utilization, (cpu_ut, idle)
+# - mem: mem_utilization, (mem_ut, in_use)
+# - io: io_utilization, {device: total}
+# - psi: psi_utilization, 5-tuple of pressures or None when PSI is disabled
+# None stands for the data missing from an archive.
+HostUtilization = namedtuple(
+    'HostUtilization',
+    ['instance_type', 'region', 'cpu', 'mem', 'io', 'psi'],
+    defaults=(None, None, None, None),
+)
+
+# - state: RosKeys flags of the host
+# - solution: find_solution result, (err_key, cur_price, states, candidates)
+#   or None when the host gets no recommendation
+BatchResult = namedtuple('BatchResult', ['state', 'solution'])
+
+
+def _solve(cm, cpu_ev, mem_ev, io_ev, idle_ev, psi_ev):
+    # The candidate conditions fail for an instance type missing from the
+    # catalog, the dependency graph then skips find_solution
+    if cm.type not in rules_engine.EC2_INSTANCE_TYPES:
+        return None
+    cpu = rules_engine.cpu_candidates(cm, cpu_ev, psi_ev)
+    mem = rules_engine.mem_candidates(cm, mem_ev, psi_ev)
+    io = rules_engine.io_candidates(cm, io_ev)
+    try:
+        return rules_engine.find_solution(cm, cpu, mem, io, idle_ev, psi_ev)
+    except SkipComponent:
+        return None
+
+
+def evaluate_batch(hosts):
+    """
+    Evaluate a list of HostUtilization and return a list of BatchResult in
+    the same order. Hosts of the same shape share the same solution object,
+    it must not be modified.
+    """
+    results = []
+    solutions = {}
+    for host in hosts:
+        cpu_ev = rules_engine.cpu_evaluation(host.cpu)
+        mem_ev = rules_engine.mem_evaluation(host.mem)
+        io_ev = rules_engine.io_evaluation(host.io)
+        idle_ev = rules_engine.idle_evaluation(host.cpu, host.mem)
+        psi_ev = rules_engine.psi_evaluation(host.psi)
+        state = cpu_ev[0] | mem_ev[0] | io_ev | idle_ev | psi_ev
+
+        key = (host.instance_type, host.region, cpu_ev, mem_ev, io_ev, idle_ev, psi_ev)
+        if key not in solutions:
+            cm = CloudInstance('aws', host.instance_type, None, host.region)
+            solutions[key] = _solve(cm, cpu_ev, mem_ev, io_ev, idle_ev, psi_ev)
+        results.append(BatchResult(state, solutions[key]))
+    return results
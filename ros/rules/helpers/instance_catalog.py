@@ -0,0 +1,127 @@
+"""
+Precomputed lookup structures over the EC2 instance type catalog.
+
+The candidate conditions of the rules engine only compare the vCPU count,
+the RAM and the physical processor of every instance type. Those attributes
+are grouped once per process and kept sorted, so that selecting candidates
+is a binary search over the distinct values instead of a scan of the whole
+catalog for every archive.
+
+The selected range of distinct values identifies the candidates exactly, it
+is kept on the returned Candidates as their bucket.
+"""
+from collections import defaultdict
+from itertools import count
+
+_generations = count()
+
+
+def _first_true(values, predicate):
+    """
+    Index of the first value satisfying predicate.
+    The predicate must be monotone over values (False...False, True...True).
+    """
+    lo, hi = 0, len(values)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if predicate(values[mid]):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+class Candidates(set):
+    """
+    Set of candidate instance type names.
+    bucket: hashable key of the index selection the names come from.
+    """
+    def __init__(self, names=(), bucket=None):
+        super().__init__(names)
+        self.bucket = bucket
+
+
+class SortedGroups:
+    """Instance type names grouped by a numeric attribute, sorted by it."""
+    __slots__ = ('values', 'names')
+
+    def __init__(self, pairs):
+        grouped = defaultdict(set)
+        for value, name in pairs:
+            grouped[value].add(name)
+        self.values = sorted(grouped)
+        self.names = [frozenset(grouped[value]) for value in self.values]
+
+    def bounds(self, at_least=None, at_most=None):
+        """
+        Return the range of values satisfying both predicates.
+        - at_least: monotone predicate, True from some value upwards
+        - at_most: monotone predicate, True up to some value
+        """
+        lo = 0 if at_least is None else _first_true(self.values, at_least)
+        hi = len(self.values) if at_most is None else _first_true(
+            self.values, lambda value: not at_most(value))
+        return lo, max(lo, hi)
+
+    def names_between(self, lo, hi):
+        selected = set()
+        for names in self.names[lo:hi]:
+            selected.update(names)
+        return selected
+
+    def select(self, at_least=None, at_most=None):
+        """Return the names whose value satisfies both predicates."""
+        return self.names_between(*self.bounds(at_least, at_most))
+
+
+class InstanceTypeIndex:
+    """
+    Index of an instance types catalog (see ros.lib.aws_instance_types).
+    - vcpu_by_processor: {physicalProcessor: SortedGroups by vCPU count}
+    - memory: SortedGroups by RAM in KiB
+    """
+    def __init__(self, instance_types):
+        self.source = instance_types
+        self.generation = next(_generations)
+        self.all_types = frozenset(instance_types.keys())
+
+        vcpus = defaultdict(list)
+        memory = []
+        for name, info in instance_types.items():
+            extra = info['extra']
+            vcpus[extra['physicalProcessor']].append((float(extra['vcpu']), name))
+            memory.append((float(info['ram'] * 1024), name))
+
+        self.vcpu_by_processor = {
+            processor: SortedGroups(pairs) for processor, pairs in vcpus.items()
+        }
+        self.memory = SortedGroups(memory)
+
+    def by_vcpu(self, processor, at_least=None, at_most=None):
+        groups = self.vcpu_by_processor.get(processor)
+        if groups is None:
+            return Candidates(bucket=(self.generation, 'vcpu', processor))
+        bounds = groups.bounds(at_least, at_most)
+        return Candidates(groups.names_between(*bounds), (self.generation, 'vcpu', processor, bounds))
+
+    def by_memory(self, at_least=None, at_most=None):
+        bounds = self.memory.bounds(at_least, at_most)
+        return Candidates(self.memory.names_between(*bounds), (self.generation, 'memory', bounds))
+
+    def all(self):
+        return Candidates(self.all_types, (self.generation, 'all'))
+
+
+_index = None
+
+
+def instance_type_index(instance_types):
+    """
+    Return the index of instance_types, built once per process.
+    It is rebuilt only when a different catalog object is passed in.
+    """
+    global _index
+    index = _index
+    if index is None or index.source is not instance_types:
+        index = _index = InstanceTypeIndex(instance_types)
+    return index
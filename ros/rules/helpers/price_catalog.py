@@ -0,0 +1,105 @@
+"""
+Process wide, compact catalog of the EC2 linux on-demand prices.
+
+The pricing JSON is parsed once per process (and again only when the file
+changes) instead of on every lookup. Instance type and region names are
+interned to integer ids and the prices are kept in one flat float array,
+mapped from the catalog snapshot when one is available (see
+ros.lib.catalog_snapshot).
+"""
+import os
+import sys
+import threading
+from array import array
+from math import isnan
+
+from ros.lib.catalog_snapshot import catalog_snapshot
+from ros.rules.helpers import load_json, root
+
+PRICING_FILE = os.path.join(root, 'ec2_instance_pricing.json')
+MISSING_PRICE = float('nan')
+
+
+class Ec2PriceCatalog:
+    """
+    Read-only price table of EC2 instance types per region.
+    - type_ids/region_ids: {name: id}
+    - prices: array of len(type_ids) * len(region_ids), NaN if not priced
+    """
+    __slots__ = ('type_ids', 'region_ids', 'prices', 'version')
+
+    def __init__(self, prices, version=None):
+        self.version = version
+        self.type_ids = {sys.intern(name): i for i, name in enumerate(prices)}
+        regions = sorted({region for by_region in prices.values() for region in by_region})
+        self.region_ids = {sys.intern(name): i for i, name in enumerate(regions)}
+
+        self.prices = array('d', [MISSING_PRICE]) * (len(self.type_ids) * len(self.region_ids))
+        for name, by_region in prices.items():
+            offset = self.type_ids[name] * len(self.region_ids)
+            for region, price in by_region.items():
+                if price is not None:
+                    self.prices[offset + self.region_ids[region]] = price
+
+    @classmethod
+    def from_json(cls, file_path=PRICING_FILE):
+        version = _file_version(file_path)
+        return cls(load_json(file_path).get('compute').get('ec2_linux'), version)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        catalog = cls.__new__(cls)
+        catalog.version = tuple(snapshot.sources['pricing'])
+        strings = snapshot.strings
+        catalog.type_ids = {strings[name]: i for i, name in enumerate(snapshot.section('price_type'))}
+        catalog.region_ids = {strings[name]: i for i, name in enumerate(snapshot.section('price_region'))}
+        catalog.prices = snapshot.section('prices')
+        return catalog
+
+    def price(self, instance_type, region, default=None):
+        """Hourly price of instance_type in region or default if not priced."""
+        type_id = self.type_ids.get(instance_type)
+        region_id = self.region_ids.get(region)
+        if type_id is None or region_id is None:
+            return default
+        price = self.prices[type_id * len(self.region_ids) + region_id]
+        return default if isnan(price) else price
+
+    def __contains__(self, instance_type):
+        return instance_type in self.type_ids
+
+    def __len__(self):
+        return len(self.type_ids)
+
+
+def _load(file_path):
+    snapshot = catalog_snapshot() if file_path == PRICING_FILE else None
+    if snapshot is not None and snapshot.is_current('pricing', file_path):
+        return Ec2PriceCatalog.from_snapshot(snapshot)
+    return Ec2PriceCatalog.from_json(file_path)
+
+
+def _file_version(file_path):
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def ec2_price_catalog(file_path=PRICING_FILE):
+    """
+    Return the process wide price catalog.
+    It is loaded lazily on first use and reloaded when the file changes.
+    """
+    global _catalog
+    catalog = _catalog
+    version = _file_version(file_path)
+    if catalog is not None and catalog.version == version:
+        return catalog
+
+    with _catalog_lock:
+        if _catalog is None or _catalog.version != version:
+            _catalog = _load(file_path)
+        return _catalog
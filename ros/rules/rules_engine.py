@@ -27,14 +27,20 @@ from insights.parsers.aws_instance_id import AWSInstanceIdDoc
 from insights.combiners.cloud_provider import CloudProvider
 
 from ros.rules.combiners.rhel_release import RhelRelease
-from ros.rules.helpers import Ec2LinuxPrices
-from ros.lib.aws_instance_types import INSTANCE_TYPES as EC2_INSTANCE_TYPES
+from ros.rules.helpers.price_catalog import ec2_price_catalog
+from ros.rules.helpers.instance_catalog import instance_type_index
+from ros.lib.catalog_snapshot import ec2_instance_types
 from ros.rules.helpers.rules_data import RosThresholds, RosKeys
-from ros.lib.config import INSIGHTS_EXTRACT_LOGLEVEL
+from ros.lib.config import INSIGHTS_EXTRACT_LOGLEVEL, SOLUTION_CACHE_SIZE
+from ros.lib.lru_cache import LRUCache
+from ros.processor.metrics import solution_cache_hits, solution_cache_misses
 
 add_filter(InsightsClientConf, ['ros_collect'])
 dr.log.setLevel(INSIGHTS_EXTRACT_LOGLEVEL)
 
+EC2_INSTANCE_TYPES = ec2_instance_types()
+SOLUTION_CACHE = LRUCache(SOLUTION_CACHE_SIZE, solution_cache_hits, solution_cache_misses)
+
 ERROR_KEY_NO_DATA = "NO_PCP_DATA"
 ERROR_KEY_IDLE = "INSTANCE_IDLE"
 ERROR_KEY_OVERSIZED = "INSTANCE_OVERSIZED"
@@ -316,29 +322,28 @@ def cpu_candidates(cm, cpu_ut, psi_ut):
     inst_phyp = cur_inst["extra"]["physicalProcessor"]
     in_use = inst_vcpu - cpu_ut[1]
 
-    candidates = set()
-    for ci, cd in EC2_INSTANCE_TYPES.items():
-        # Skip the current instance
-        if ci == cm.type:
-            continue
-        if cd["extra"]["physicalProcessor"] != inst_phyp:
-            continue
-        cand_vcpu = float(cd["extra"]["vcpu"])
+    def can_handle_load(cand_vcpu):
         cand_vcpu_ev = cand_vcpu * RosThresholds.CPU_UTILIZATION_WARNING_UPPER_THRESHOLD
-        # print(cand_vcpu, cand_vcpu_ev, in_use)
-        if not (cand_vcpu_ev > in_use or isclose(cand_vcpu_ev, in_use)):
-            continue
-        # CPU_UNDERSIZED _OR_ CPU_UNDERSIZED_BY_PRESSURE
-        if ut & RosKeys.CPU_UNDERSIZED or ut & RosKeys.CPU_UNDERSIZED_BY_PRESSURE:
-            # print(cand_vcpu, inst_vcpu, cand_vcpu > inst_vcpu or isclose(cand_vcpu, inst_vcpu))
-            if cand_vcpu > inst_vcpu or isclose(cand_vcpu, inst_vcpu):
-                candidates.add(ci)
-        # CPU_OVERSIZED
-        elif ut & RosKeys.CPU_OVERSIZED:
-            if cand_vcpu < inst_vcpu or isclose(cand_vcpu, inst_vcpu):
-                candidates.add(ci)
-        else:
-            candidates.add(ci)
+        return cand_vcpu_ev > in_use or isclose(cand_vcpu_ev, in_use)
+
+    def not_smaller(cand_vcpu):
+        return cand_vcpu > inst_vcpu or isclose(cand_vcpu, inst_vcpu)
+
+    def not_larger(cand_vcpu):
+        return cand_vcpu < inst_vcpu or isclose(cand_vcpu, inst_vcpu)
+
+    index = instance_type_index(EC2_INSTANCE_TYPES)
+    # CPU_UNDERSIZED _OR_ CPU_UNDERSIZED_BY_PRESSURE
+    if ut & RosKeys.CPU_UNDERSIZED or ut & RosKeys.CPU_UNDERSIZED_BY_PRESSURE:
+        candidates = index.by_vcpu(
+            inst_phyp, at_least=lambda v: can_handle_load(v) and not_smaller(v))
+    # CPU_OVERSIZED
+    elif ut & RosKeys.CPU_OVERSIZED:
+        candidates = index.by_vcpu(inst_phyp, at_least=can_handle_load, at_most=not_larger)
+    else:
+        candidates = index.by_vcpu(inst_phyp, at_least=can_handle_load)
+    # Skip the current instance
+    candidates.discard(cm.type)
     # print('cpu_cand', len(candidates))
     return ut, candidates
 
@@ -351,24 +356,26 @@ def mem_candidates(cm, mem_ut, psi_ut):
     inst_mem = float(cur_inst['ram'] * 1024)
     in_use = mem_ut[1]
 
-    candidates = set()
-    for ci, cd in EC2_INSTANCE_TYPES.items():
-        # Skip the current instance
-        if ci == cm.type:
-            continue
-        cand_mem = float(cd['ram'] * 1024)
-        if not (cand_mem * RosThresholds.MEMORY_UTILIZATION_WARNING_UPPER_THRESHOLD >= in_use):
-            continue
-        # MEM_UNDERSIZED _OR_ MEMORY_UNDERSIZED_BY_PRESSURE
-        if ut & RosKeys.MEMORY_UNDERSIZED or ut & RosKeys.MEMORY_UNDERSIZED_BY_PRESSURE:
-            if cand_mem > inst_mem or isclose(cand_mem, inst_mem):
-                candidates.add(ci)
-        # MEM_OVERSIZED
-        elif ut & RosKeys.MEMORY_OVERSIZED:
-            if cand_mem < inst_mem or isclose(cand_mem, inst_mem):
-                candidates.add(ci)
-        else:
-            candidates.add(ci)
+    def can_handle_load(cand_mem):
+        return cand_mem * RosThresholds.MEMORY_UTILIZATION_WARNING_UPPER_THRESHOLD >= in_use
+
+    def not_smaller(cand_mem):
+        return cand_mem > inst_mem or isclose(cand_mem, inst_mem)
+
+    def not_larger(cand_mem):
+        return cand_mem < inst_mem or isclose(cand_mem, inst_mem)
+
+    index = instance_type_index(EC2_INSTANCE_TYPES)
+    # MEM_UNDERSIZED _OR_ MEMORY_UNDERSIZED_BY_PRESSURE
+    if ut & RosKeys.MEMORY_UNDERSIZED or ut & RosKeys.MEMORY_UNDERSIZED_BY_PRESSURE:
+        candidates = index.by_memory(at_least=lambda m: can_handle_load(m) and not_smaller(m))
+    # MEM_OVERSIZED
+    elif ut & RosKeys.MEMORY_OVERSIZED:
+        candidates = index.by_memory(at_least=can_handle_load, at_most=not_larger)
+    else:
+        candidates = index.by_memory(at_least=can_handle_load)
+    # Skip the current instance
+    candidates.discard(cm.type)
     # print('mem_cand', len(candidates))
     return ut, candidates
 
@@ -378,7 +385,7 @@ def mem_candidates(cm, mem_ut, psi_ut):
 @condition(cloud_metadata, io_evaluation)
 def io_candidates(cm, io_ut):
     # print('io_cand', len(EC2_INSTANCE_TYPES.keys()))
-    return io_ut, set(EC2_INSTANCE_TYPES.keys())
+    return io_ut, instance_type_index(EC2_INSTANCE_TYPES).all()
 
 
 @condition(cloud_metadata,
@@ -389,25 +396,48 @@ def find_solution(cm, cpu, mem, io, idle, psi):
     solution = reduce(lambda x, y: x & y, [cpu[1], mem[1], io[1]])
     err_key, states = readable_evalution(ret)
     if err_key and solution:
-        solution_w_price = list()
-        cur_price = Ec2LinuxPrices().get(cm.type, {}).get(cm.region, 0)
-        for can in solution:
-            price = Ec2LinuxPrices().get(can, {}).get(cm.region)
-            if err_key in (ERROR_KEY_IDLE, ERROR_KEY_OVERSIZED):
-                # When IDLE/OVERSIZED, skip the candidates more expansive than the current
-                solution_w_price.append((can, price)) if price <= cur_price else None
-            else:
-                solution_w_price.append((can, price))
-        # sort with name at first and then price
-        solution_w_price = sorted(solution_w_price, key=lambda x: (x[1], x[0]))
+        prices = ec2_price_catalog()
+        cur_price = prices.price(cm.type, cm.region, 0)
+        cache_key = solution_cache_key(cm, err_key, prices, cpu[1], mem[1], io[1])
+        solution_w_price = SOLUTION_CACHE.get(cache_key) if cache_key else None
+        if solution_w_price is None:
+            solution_w_price = priced_solution(cm, err_key, prices, cur_price, solution)
+            if cache_key:
+                SOLUTION_CACHE.put(cache_key, solution_w_price)
 
         if solution_w_price:
-            return err_key, cur_price, states, solution_w_price
+            return err_key, cur_price, states, list(solution_w_price)
 
     # Not reach
     raise SkipComponent
 
 
+def priced_solution(cm, err_key, prices, cur_price, solution):
+    solution_w_price = list()
+    for can in solution:
+        price = prices.price(can, cm.region)
+        if err_key in (ERROR_KEY_IDLE, ERROR_KEY_OVERSIZED):
+            # When IDLE/OVERSIZED, skip the candidates more expansive than the current
+            solution_w_price.append((can, price)) if price <= cur_price else None
+        else:
+            solution_w_price.append((can, price))
+    # sort with name at first and then price
+    return tuple(sorted(solution_w_price, key=lambda x: (x[1], x[0])))
+
+
+def solution_cache_key(cm, err_key, prices, *candidates):
+    """
+    Key of the priced solution of the candidates, None if it can not be cached.
+    The candidates of the same index buckets are the same, so hosts of the same
+    instance type, region and error key share a solution when their in-use
+    CPU and memory fall in the same buckets.
+    """
+    buckets = tuple(getattr(cans, 'bucket', None) for cans in candidates)
+    if None in buckets:
+        return None
+    return cm.type, cm.region, err_key, prices.version, buckets
+
+
 @rule([PmLogSummaryRules, LsCPU], cloud_metadata)
 def performance_profile_rule(pmlog_summary, lscpu, cloud_metadata):
     """
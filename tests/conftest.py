@@ -1,6 +1,20 @@
+import pytest
+from unittest.mock import patch
+
+from ros.lib.permission_cache import clear_local_verdicts
+
 pytest_plugins = [
     "tests.fixtures.db_fixtures",
     "tests.fixtures.db_fixtures_for_inventory_groups",
     "tests.fixtures.redis_fixture",
     "tests.fixtures.rules_engine_fixtures",
 ]
+
+
+@pytest.fixture(autouse=True)
+def no_permission_cache():
+    """Tests mock RBAC and Kessel per test for the same identity, verdicts are not cached across them."""
+    with patch('ros.lib.permission_cache.PERMISSION_CACHE_TIMEOUT', 0), \
+            patch('ros.lib.permission_cache.PERMISSION_CACHE_NEGATIVE_TIMEOUT', 0):
+        yield
+    clear_local_verdicts()
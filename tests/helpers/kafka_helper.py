@@ -0,0 +1,14 @@
+from unittest.mock import Mock
+
+
+def kafka_message(offset, partition=0, topic='platform.inventory.events'):
+    message = Mock()
+    message.topic.return_value = topic
+    message.partition.return_value = partition
+    message.offset.return_value = offset
+    return message
+
+
+def committed(offsets):
+    """{(topic, partition): offset} of a list of TopicPartition."""
+    return {(tp.topic, tp.partition): tp.offset for tp in offsets}
@@ -4,6 +4,7 @@ from dateutil import parser
 import json
 from base64 import b64encode
 from ros.api.main import app
+from ros.lib import executive_report
 from ros.lib.models import db, PerformanceProfile, System
 from tests.helpers.db_helper import db_get_host, db_get_record
 from pathlib import Path
@@ -409,6 +410,26 @@ def test_psi_enabled(
     assert response.json['meta']['non_psi_count'] == 0
 
 
+def test_executive_report_from_aggregates(
+        auth_token,
+        db_setup,
+        db_create_account,
+        db_create_system,
+        db_create_performance_profile,
+        db_create_performance_profile_history
+):
+    with app.test_client() as client:
+        live = client.get('/api/ros/v1/executive_report', headers={"x-rh-identity": auth_token})
+        executive_report.rebuild(db.session, 1)
+        db.session.commit()
+        stored = client.get('/api/ros/v1/executive_report', headers={"x-rh-identity": auth_token})
+
+    assert live.status_code == stored.status_code == 200
+    assert stored.json == live.json
+    assert stored.json['meta']['total_count'] == 1
+    assert stored.json['instance_types_highlights']['historical'][0]['type'] == 't2.nano'
+
+
 def test_openapi_endpoint(auth_token):
     with open("ros/openapi/openapi.json") as f:
         content_from_file = json.loads(f.read())
@@ -852,3 +873,94 @@ def test_get_suggested_instance_details_filtered_by_os(
         assert response.json["meta"]["count"] == 1
         assert response.json["data"][0]["instance_type"] == "t2.nano"
         assert response.json["data"][0]["os"] == "RHEL 7.4"
+
+
+@pytest.fixture
+def db_create_systems_to_sort(db_create_account):
+    report_date = datetime.datetime(2026, 1, 2, tzinfo=datetime.timezone.utc)
+    operating_systems = [
+        {"name": "RHEL", "major": 8, "minor": 4},
+        {"name": "RHEL", "major": 9, "minor": 0},
+        None,
+    ]
+    for index in range(11):
+        db.session.add(System(
+            id=100 + index,
+            tenant_id=1,
+            inventory_id=f'ee0b9978-fe1b-4191-8408-cbadbd47f{index:03d}',
+            display_name=f'host-{index % 4}',
+            state=['Idling', 'Oversized', 'Optimized'][index % 3],
+            operating_system=operating_systems[index % 3],
+            groups=[{"id": f"group-{index % 2}", "name": f"group-{index % 2}"}] if index % 3 else [],
+        ))
+    db.session.commit()
+    for index in range(11):
+        db.session.add(PerformanceProfile(
+            system_id=100 + index,
+            performance_record={},
+            performance_utilization=(
+                {"cpu": index % 5, "memory": 10, "max_io": float(index % 2), "io": {}} if index % 4 else {"io": {}}
+            ),
+            report_date=report_date + datetime.timedelta(days=index % 3),
+            number_of_recommendations=index % 2,
+            state=['Idling', 'Oversized', 'Optimized'][index % 3],
+        ))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('order_how', ['asc', 'desc'])
+@pytest.mark.parametrize('order_by', [
+    'display_name', 'cpu', 'memory', 'max_io', 'number_of_suggestions', 'state', 'os', 'report_date', 'group_name'
+])
+def test_systems_cursor_pagination(auth_token, db_create_systems_to_sort, order_by, order_how):
+    order = f"order_by={order_by}&order_how={order_how}"
+    with app.test_client() as client:
+        response = client.get(f'/api/ros/v1/systems?limit=-1&{order}', headers={"x-rh-identity": auth_token})
+        expected = [host['inventory_id'] for host in response.json['data']]
+        assert len(expected) == 11
+
+        pages = []
+        link = f'/api/ros/v1/systems?limit=4&cursor=&{order}'
+        while link:
+            response = client.get(link, headers={"x-rh-identity": auth_token})
+            assert response.status_code == 200
+            assert response.json['meta']['count'] == 11
+            pages.append([host['inventory_id'] for host in response.json['data']])
+            link = response.json['links']['next']
+
+    assert [len(page) for page in pages] == [4, 4, 3]
+    assert [inventory_id for page in pages for inventory_id in page] == expected
+
+
+def test_systems_invalid_cursor(auth_token, db_create_systems_to_sort):
+    with app.test_client() as client:
+        response = client.get('/api/ros/v1/systems?limit=4&cursor=', headers={"x-rh-identity": auth_token})
+        next_link = response.json['links']['next']
+        assert 'order_by' not in next_link
+
+        other_order = client.get(f'{next_link}&order_by=cpu', headers={"x-rh-identity": auth_token})
+        assert other_order.status_code == 400
+        invalid = client.get('/api/ros/v1/systems?cursor=invalid', headers={"x-rh-identity": auth_token})
+        assert invalid.status_code == 400
+        everything = client.get('/api/ros/v1/systems?cursor=&limit=-1', headers={"x-rh-identity": auth_token})
+        assert everything.status_code == 400
+
+
+def test_systems_count_methods(auth_token, db_create_systems_to_sort):
+    with app.test_client() as client:
+        response = client.get('/api/ros/v1/systems?limit=4&count=none', headers={"x-rh-identity": auth_token})
+        assert response.json['meta']['count'] is None
+        assert response.json['links']['last'] is None
+        assert 'offset=4' in response.json['links']['next']
+
+        response = client.get('/api/ros/v1/systems?limit=-1&count=none', headers={"x-rh-identity": auth_token})
+        assert response.json['meta']['count'] == 11
+        assert response.json['links']['next'] is None
+
+        response = client.get('/api/ros/v1/systems?count=estimate', headers={"x-rh-identity": auth_token})
+        assert response.status_code == 200
+        assert isinstance(response.json['meta']['count'], int)
+        assert len(response.json['data']) == 10
+
+        response = client.get('/api/ros/v1/systems?count=maybe', headers={"x-rh-identity": auth_token})
+        assert response.status_code == 400
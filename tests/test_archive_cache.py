@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from contextlib import contextmanager
+from unittest.mock import Mock
+
+from ros.lib.archive_cache import ArchiveCache
+from ros.lib.archive_download import DownloadError
+from ros.processor.metrics import archive_cache_bytes_saved, archive_cache_hits, archive_cache_misses
+
+SAMPLE_ARCHIVE = 'sample-files/insights-aws-no-pcp-data.tar.gz'
+
+
+def fill_in_process(directory, downloads_log):
+    @contextmanager
+    def download(url):
+        with open(downloads_log, 'a') as log:
+            log.write(f"{os.getpid()}\n")
+        # Let the other process wait for the fill
+        time.sleep(0.2)
+        yield SAMPLE_ARCHIVE
+
+    with ArchiveCache(directory, 10 * 1024 * 1024).extracted("http://archive/1", download=download) as extraction:
+        return os.path.isfile(os.path.join(extraction.root, 'insights_archive.txt'))
+
+
+class TestArchiveCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.downloads = Mock()
+
+    @contextmanager
+    def download(self, url):
+        self.downloads(url)
+        yield SAMPLE_ARCHIVE
+
+    def test_hit_shares_the_extracted_tree(self):
+        cache = ArchiveCache(self.directory, 10 * 1024 * 1024)
+        hits, misses = archive_cache_hits._value.get(), archive_cache_misses._value.get()
+        saved = archive_cache_bytes_saved._value.get()
+
+        with cache.extracted("http://archive/1", "request-1", download=self.download) as first:
+            self.assertTrue(os.path.isfile(os.path.join(first.root, 'insights_archive.txt')))
+        with cache.extracted("http://archive/1?signature=other", "request-1", download=self.download) as second:
+            self.assertEqual(second, first)
+
+        self.downloads.assert_called_once_with("http://archive/1")
+        self.assertEqual(archive_cache_misses._value.get(), misses + 1)
+        self.assertEqual(archive_cache_hits._value.get(), hits + 1)
+        self.assertEqual(archive_cache_bytes_saved._value.get(), saved + os.path.getsize(SAMPLE_ARCHIVE))
+        self.assertEqual(len(cache), 1)
+
+    def test_least_recently_used_evicted(self):
+        sizing = ArchiveCache(self.directory, 10 * 1024 * 1024)
+        with sizing.extracted("http://archive/0", download=self.download):
+            entry_size = sizing.size
+        self.assertTrue(entry_size)
+
+        cache = ArchiveCache(self.directory, 2 * entry_size)
+
+        paths = []
+        for url in ("http://archive/1", "http://archive/2", "http://archive/1", "http://archive/3"):
+            with cache.extracted(url, download=self.download) as extraction:
+                paths.append(extraction.tmp_dir)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.size, 2 * entry_size)
+        # archive/2 was the least recently used
+        self.assertFalse(os.path.exists(paths[1]))
+        self.assertTrue(os.path.exists(paths[2]))
+        self.assertTrue(os.path.exists(paths[3]))
+
+    def test_trees_in_use_are_kept(self):
+        cache = ArchiveCache(self.directory, 0)
+        with cache.extracted("http://archive/1", download=self.download) as first:
+            with cache.extracted("http://archive/1", download=self.download) as second:
+                self.assertEqual(second, first)
+            self.assertTrue(os.path.exists(first.tmp_dir))
+        self.assertFalse(os.path.exists(first.tmp_dir))
+        self.assertEqual(len(cache), 0)
+        self.downloads.assert_called_once()
+
+    def test_failed_download_not_cached(self):
+        @contextmanager
+        def failing_download(url):
+            raise DownloadError("404 Not Found")
+            yield
+
+        cache = ArchiveCache(self.directory, 10 * 1024 * 1024)
+        with self.assertRaises(DownloadError):
+            with cache.extracted("http://archive/1", download=failing_download):
+                pass
+
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_entries_shared_with_other_processes(self):
+        with ArchiveCache(self.directory, 10 * 1024 * 1024).extracted("http://archive/1", download=self.download):
+            pass
+
+        # As after a restart, or in another process using the directory
+        cache = ArchiveCache(self.directory, 10 * 1024 * 1024)
+        self.assertEqual(len(cache), 1)
+        with cache.extracted("http://archive/1", download=self.download) as extraction:
+            self.assertTrue(os.path.isfile(os.path.join(extraction.root, 'insights_archive.txt')))
+        self.downloads.assert_called_once()
+
+    def test_one_process_fills_an_entry(self):
+        downloads_log = os.path.join(self.directory, '.downloads')
+        with multiprocessing.get_context('fork').Pool(2) as pool:
+            results = pool.starmap(fill_in_process, [(self.directory, downloads_log)] * 2)
+
+        self.assertEqual(results, [True, True])
+        with open(downloads_log) as log:
+            self.assertEqual(len(log.readlines()), 1)
+
+    def test_leftovers_removed_on_start(self):
+        key = ArchiveCache.key("http://archive/1")
+        os.makedirs(os.path.join(self.directory, f".tmp-{key}-abandoned", 'tree'))
+        os.makedirs(os.path.join(self.directory, f".evicted-{key}-1-1"))
+        open(os.path.join(self.directory, f"{key}.lock"), 'w').close()
+
+        cache = ArchiveCache(self.directory, 10 * 1024 * 1024)
+
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(len(cache), 0)
@@ -0,0 +1,66 @@
+import os
+from unittest.mock import patch, MagicMock
+
+import pytest
+import requests
+
+from ros.lib.archive_download import download_archive, DownloadError, ArchiveTooLarge
+from ros.processor.metrics import archive_download_bytes
+
+
+def mock_response(chunks, status_code=200, reason="OK", headers=None):
+    response = MagicMock()
+    response.__enter__.return_value = response
+    response.status_code = status_code
+    response.reason = reason
+    response.headers = headers or {}
+    response.iter_content.return_value = iter(chunks)
+    return response
+
+
+@pytest.fixture
+def mock_session():
+    with patch('ros.lib.archive_download.http_session') as http_session:
+        yield http_session.return_value
+
+
+def test_download_archive_streams_to_file(mock_session):
+    mock_session.get.return_value = mock_response([b"abc", b"def"])
+    observed = archive_download_bytes._sum.get()
+
+    with download_archive("http://example.com/archive.tar.gz", timeout=5) as archive_path:
+        with open(archive_path, 'rb') as archive:
+            assert archive.read() == b"abcdef"
+
+    assert not os.path.exists(archive_path)
+    assert archive_download_bytes._sum.get() == observed + 6
+    mock_session.get.assert_called_once_with("http://example.com/archive.tar.gz", stream=True, timeout=5)
+
+
+def test_download_archive_http_error(mock_session):
+    mock_session.get.return_value = mock_response([], status_code=404, reason="Not Found")
+
+    with pytest.raises(DownloadError, match="404 Not Found"):
+        with download_archive("http://example.com/archive.tar.gz"):
+            pass
+
+
+def test_download_archive_connection_error(mock_session):
+    mock_session.get.side_effect = requests.ConnectionError("refused")
+
+    with pytest.raises(DownloadError, match="refused"):
+        with download_archive("http://example.com/archive.tar.gz"):
+            pass
+
+
+def test_download_archive_too_large(mock_session):
+    mock_session.get.return_value = mock_response([b"a" * 4, b"a" * 4])
+
+    with pytest.raises(ArchiveTooLarge):
+        with download_archive("http://example.com/archive.tar.gz", max_size=6):
+            pass
+
+    mock_session.get.return_value = mock_response([], headers={'Content-Length': '100'})
+    with pytest.raises(ArchiveTooLarge):
+        with download_archive("http://example.com/archive.tar.gz", max_size=6):
+            pass
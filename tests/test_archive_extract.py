@@ -0,0 +1,119 @@
+import glob
+import os
+import shutil
+import tarfile
+import unittest
+from unittest.mock import patch
+
+from insights import run
+
+from ros.lib import archive_extract
+from ros.lib.archive_extract import extract_archive, find_root_directory, is_needed
+from ros.processor.process_archive import performance_profile
+from ros.rules.rules_engine import run_rules, report, report_metadata, performance_profile_rule
+
+SAMPLE_ARCHIVES = sorted(
+    glob.glob('sample-files/*.tar.gz') + glob.glob('sample-files/rhel*/*.tar.gz')
+)
+
+
+def add_pmlogsummary(root):
+    # Stands in for the output of the pcp commands run by the suggestions engine
+    summaries = glob.glob(os.path.join(root, 'data/insights_commands/pmlogsummary_*'))
+    if summaries:
+        shutil.copy(summaries[0], os.path.join(root, 'pmlogsummary'))
+
+
+def rules_results(root):
+    add_pmlogsummary(root)
+    broker = run_rules(root)
+    results = {
+        component: broker.get(component)
+        for component in (report, report_metadata, performance_profile_rule)
+    }
+    profile = run(performance_profile, root=root).get(performance_profile)
+    return results, profile
+
+
+class TestSelectiveExtraction(unittest.TestCase):
+    def test_sample_archives_found(self):
+        self.assertTrue(SAMPLE_ARCHIVES)
+
+    def test_same_results_as_full_extraction(self):
+        for archive in SAMPLE_ARCHIVES:
+            with self.subTest(archive=archive):
+                with extract_archive(archive, selective=False) as full:
+                    expected = rules_results(full.root)
+                with extract_archive(archive, selective=True) as selective:
+                    actual = rules_results(selective.root)
+
+                self.assertEqual(actual, expected)
+                self.assertIsNotNone(actual[0][report_metadata])
+
+    def test_extracts_only_needed_files(self):
+        archive = 'sample-files/rhel8/rhel8-insights-ip-aws-idle.tar.gz'
+        with tarfile.open(archive) as tar:
+            members = [member for member in tar.getmembers() if member.isfile()]
+
+        with extract_archive(archive) as extraction:
+            extracted = [
+                os.path.join(dirpath, filename)
+                for dirpath, _, filenames in os.walk(extraction.tmp_dir)
+                for filename in filenames
+            ]
+
+        self.assertEqual(len(extracted), sum(is_needed(member.name) for member in members))
+        self.assertLess(len(extracted), len(members) / 4)
+
+    def test_root_located_during_extraction(self):
+        archive = 'sample-files/insights-aws-no-pcp-data.tar.gz'
+        with patch.object(archive_extract, 'find_root_directory') as mock_find_root:
+            with extract_archive(archive) as extraction:
+                self.assertTrue(os.path.isfile(os.path.join(extraction.root, 'insights_archive.txt')))
+                self.assertEqual(extraction.root, find_root_directory(extraction.tmp_dir))
+                tmp_dir = extraction.tmp_dir
+
+        mock_find_root.assert_not_called()
+        self.assertFalse(os.path.exists(tmp_dir))
+
+    def test_not_a_tarball_is_fully_extracted(self):
+        with patch.object(archive_extract, 'extract') as mock_extract, \
+                patch.object(archive_extract, 'find_root_directory', return_value='/tmp/x/root'):
+            mock_extract.return_value.__enter__.return_value.tmp_dir = '/tmp/x'
+            with extract_archive(os.devnull) as extraction:
+                self.assertEqual(extraction, ('/tmp/x', '/tmp/x/root'))
+
+        mock_extract.assert_called_once_with(os.devnull, extract_dir=None)
+
+    def test_is_needed(self):
+        self.assertTrue(is_needed('insights-host/insights-host-1/data/insights_commands/lscpu'))
+        self.assertTrue(is_needed('./insights-host/insights_commands/lscpu'))
+        self.assertTrue(is_needed('insights-host/meta_data/insights.specs.Specs.lscpu.json'))
+        self.assertTrue(is_needed('insights-host/insights_archive.txt'))
+        self.assertFalse(is_needed('insights-host/data/insights_commands/lsmod'))
+        self.assertFalse(is_needed('insights-host/meta_data/insights.specs.Specs.lsmod.json'))
+        self.assertFalse(is_needed('insights-host/data/dev/insights_commands/lscpu'))
+
+
+class TestFindRootDirectory(unittest.TestCase):
+    @patch('ros.lib.archive_extract.os.walk')
+    def test_file_found_in_root_directory(self, mock_walk):
+        mock_walk.return_value = [
+            ("/root", ["subdir1", "subdir2"], ["other_file.txt"]),
+            ("/root/subdir1", [], ["insights_archive.txt"]),
+            ("/root/subdir2", [], ["file2.txt"]),
+        ]
+
+        result = find_root_directory("/root", "insights_archive.txt")
+        self.assertEqual(result, "/root/subdir1")
+
+    @patch('ros.lib.archive_extract.os.walk')
+    def test_file_not_found(self, mock_walk):
+        mock_walk.return_value = [
+            ("/root", ["subdir1", "subdir2"], ["other_file.txt"]),
+            ("/root/subdir1", [], ["file1.txt"]),
+            ("/root/subdir2", [], ["file2.txt"]),
+        ]
+
+        result = find_root_directory("/root", "insights_archive.txt")
+        self.assertIsNone(result)
@@ -0,0 +1,80 @@
+import pytest
+from unittest import mock
+
+from ros.lib import catalog_snapshot as snapshot_module
+from ros.lib.aws_instance_types import INSTANCE_TYPES
+from ros.lib.catalog_snapshot import CatalogSnapshot, InstanceTypes, build_snapshot, ec2_instance_types
+from ros.rules.helpers import Ec2LinuxPrices
+from ros.rules.helpers.instance_catalog import InstanceTypeIndex
+from ros.rules.helpers.price_catalog import Ec2PriceCatalog
+
+
+@pytest.fixture(scope="module")
+def snapshot(tmp_path_factory):
+    file_path = tmp_path_factory.mktemp("catalog") / "catalog.snapshot"
+    return CatalogSnapshot(build_snapshot(str(file_path)))
+
+
+def test_instance_types_match_source(snapshot):
+    instance_types = InstanceTypes(snapshot)
+
+    assert set(instance_types) == set(INSTANCE_TYPES)
+    for name, info in INSTANCE_TYPES.items():
+        snapshot_info = instance_types[name]
+        assert snapshot_info['ram'] == info['ram']
+        for attribute in ('vcpu', 'memory', 'physicalProcessor'):
+            assert snapshot_info['extra'][attribute] == info['extra'][attribute]
+    assert instance_types.get('not.an.instance') is None
+
+
+def test_instance_type_index_from_snapshot(snapshot):
+    expected = InstanceTypeIndex(INSTANCE_TYPES)
+    index = InstanceTypeIndex(InstanceTypes(snapshot))
+
+    assert index.all_types == expected.all_types
+    assert index.memory.values == expected.memory.values
+    assert index.memory.names == expected.memory.names
+    for processor, groups in expected.vcpu_by_processor.items():
+        assert index.vcpu_by_processor[processor].values == groups.values
+        assert index.vcpu_by_processor[processor].names == groups.names
+
+
+def test_prices_match_pricing_file(snapshot):
+    catalog = Ec2PriceCatalog.from_snapshot(snapshot)
+    prices = Ec2LinuxPrices()
+
+    assert len(catalog) == len(prices)
+    for instance_type, by_region in prices.items():
+        for region, price in by_region.items():
+            assert catalog.price(instance_type, region) == price
+    assert catalog.price('t2.micro', 'not-a-region', 0) == 0
+
+
+def test_snapshot_is_current(snapshot, tmp_path):
+    assert snapshot.is_current('instance_types', snapshot_module.INSTANCE_TYPES_FILE)
+
+    changed_file = tmp_path / "aws_instance_types.py"
+    changed_file.write_text("INSTANCE_TYPES = {}\n")
+    assert not snapshot.is_current('instance_types', str(changed_file))
+    assert not snapshot.is_current('instance_types', str(tmp_path / "missing.py"))
+
+
+def test_stale_snapshot_falls_back_to_source(snapshot):
+    stale = mock.Mock(spec=CatalogSnapshot)
+    stale.is_current.return_value = False
+
+    with mock.patch.object(snapshot_module, '_instance_types', None), \
+            mock.patch.object(snapshot_module, 'catalog_snapshot', return_value=stale):
+        assert ec2_instance_types() is INSTANCE_TYPES
+
+    with mock.patch.object(snapshot_module, '_instance_types', None), \
+            mock.patch.object(snapshot_module, 'catalog_snapshot', return_value=snapshot):
+        assert isinstance(ec2_instance_types(), InstanceTypes)
+
+
+def test_invalid_snapshot_file(tmp_path):
+    file_path = tmp_path / "catalog.snapshot"
+    file_path.write_bytes(b"not a snapshot file")
+
+    with pytest.raises(ValueError):
+        CatalogSnapshot(str(file_path))
@@ -0,0 +1,192 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from ros.extensions import db
+from ros.lib import executive_report
+from ros.lib.app import app
+from ros.lib.models import ExecutiveReportContribution, PerformanceProfile, PerformanceProfileHistory, System
+from ros.lib.utils import insert_performance_profiles
+from ros.processor.garbage_collector import GarbageCollector
+
+NOW = datetime.now(timezone.utc)
+TODAY = NOW.date()
+STALE_DATE = (NOW - timedelta(days=7)).date()
+
+
+def rule_hit_details(instance_type, candidate):
+    return [{"details": {"instance_type": instance_type, "candidates": [[candidate, 0.0058]]}}]
+
+
+def stored_summary():
+    return executive_report.summarize(executive_report.stored_totals(db.session, 1), STALE_DATE, TODAY)
+
+
+def live_summary():
+    totals = executive_report.query_totals(
+        db.session,
+        executive_report.system_records().filter(System.tenant_id == 1),
+        executive_report.history_records().filter(System.tenant_id == 1),
+    )
+    return executive_report.summarize(totals, STALE_DATE, TODAY)
+
+
+def build():
+    executive_report.rebuild(db.session, 1)
+    db.session.commit()
+
+
+def test_system_tally():
+    record = SimpleNamespace(
+        state='Undersized',
+        cpu_states=['CPU_UNDERSIZED', 'CPU_UNDERSIZED_BY_PRESSURE'],
+        memory_states=['MEMORY_OVERSIZED'],
+        io_states=None,
+        operating_system={"name": "RHEL", "major": 8, "minor": 4},
+        psi_enabled=True,
+        instance_type='t2.micro',
+        region=None,
+        rule_hit_details=rule_hit_details(None, 't2.large'),
+    )
+    assert executive_report.system_tally(record) == {
+        'counters': {
+            'systems': 1,
+            'state:Undersized': 1,
+            'non_optimized': 1,
+            'cpu': 2,
+            'cpu:undersized': 1,
+            'cpu:under_pressure': 1,
+            'memory': 1,
+            'memory:oversized': 1,
+            'psi_enabled': 1,
+        },
+        'instance_types': {'current': {'t2.micro': {'': 1}}, 'suggested': {'t2.large': {'': 1}}},
+    }
+
+    record.operating_system = {"name": "RHEL", "major": 7, "minor": 9}
+    assert 'psi_enabled' not in executive_report.system_tally(record)['counters']
+
+
+def test_rebuild_matches_live(db_create_system, db_create_performance_profile, db_create_performance_profile_history):
+    with app.app_context():
+        assert not executive_report.is_built(db.session, 1)
+        build()
+
+        assert executive_report.is_built(db.session, 1)
+        summary = stored_summary()
+        assert summary == live_summary()
+        assert summary['counters']['state:Idling'] == 1
+        assert summary['instance_types']['current'] == {'t2.micro': {'ap-south-1': 1}}
+        assert summary['instance_types']['historical'] == {'t2.nano': {'ap-south-1': 1}}
+
+
+def test_record_profiles_applies_the_difference(db_create_system, db_create_performance_profile):
+    with app.app_context():
+        build()
+        db.session.execute(db.update(System).where(System.id == 1).values(state='Optimized', region='us-east-1'))
+        fields = {
+            "system_id": 1,
+            "report_date": NOW,
+            "state": "Optimized",
+            "rule_hit_details": rule_hit_details('t2.small', 't2.medium'),
+            "operating_system": {"name": "RHEL", "major": 8, "minor": 4},
+            "psi_enabled": True,
+        }
+        insert_performance_profiles(db.session, 1, fields)
+        executive_report.record_profiles(db.session, [fields])
+        db.session.commit()
+
+        summary = stored_summary()
+        assert summary == live_summary()
+        assert summary['counters'] == {'systems': 1, 'state:Optimized': 1, 'psi_enabled': 1}
+        assert summary['instance_types']['current'] == {'t2.small': {'us-east-1': 1}}
+        assert summary['instance_types']['historical'] == {'t2.medium': {'us-east-1': 1}}
+
+
+def test_record_profiles_skips_orgs_not_built(db_create_system, db_create_performance_profile):
+    with app.app_context():
+        executive_report.record_profiles(db.session, [{"system_id": 1, "report_date": NOW}])
+        db.session.commit()
+
+        assert executive_report.stored_totals(db.session, 1) == []
+        assert db.session.scalar(db.select(db.func.count()).select_from(ExecutiveReportContribution)) == 0
+
+
+def test_remove_systems(db_create_system, db_create_performance_profile, db_create_performance_profile_history):
+    with app.app_context():
+        build()
+        executive_report.remove_systems(db.session, db.select(System.id).filter(System.id == 1))
+        db.session.execute(db.delete(System).filter(System.id == 1))
+        db.session.commit()
+
+        assert executive_report.stored_totals(db.session, 1) == []
+
+
+def test_garbage_collector_maintains_aggregates(
+        db_create_system, db_create_performance_profile, db_create_performance_profile_history):
+    with app.app_context():
+        old_date = NOW - timedelta(days=60)
+        for model in (PerformanceProfile, PerformanceProfileHistory):
+            db.session.execute(db.update(model).values(report_date=old_date))
+        db.session.commit()
+
+        GarbageCollector().build_executive_reports()
+        assert executive_report.is_built(db.session, 1)
+        assert stored_summary()['counters']['systems'] == 1
+        assert stored_summary()['stale_count'] == 1
+
+        GarbageCollector().remove_outdated_data()
+
+        assert executive_report.stored_totals(db.session, 1) == []
+        assert db.session.scalar(db.select(db.func.count()).select_from(ExecutiveReportContribution)) == 0
+
+
+def test_garbage_collector_removes_contributions_by_chunk(
+        db_create_system, db_create_performance_profile, db_create_performance_profile_history):
+    with app.app_context():
+        db.session.execute(db.update(PerformanceProfile).values(report_date=NOW - timedelta(days=60)))
+        db.session.commit()
+        garbage_collector = GarbageCollector()
+        garbage_collector.build_executive_reports()
+        garbage_collector.chunk_size = 1
+
+        with patch('ros.processor.garbage_collector.remove_profiles', wraps=executive_report.remove_profiles) as remove:
+            garbage_collector.remove_outdated_profiles(NOW - timedelta(days=45))
+
+        assert [call.args[1] for call in remove.call_args_list] == [[1]]
+        assert db.session.scalar(db.select(db.func.count()).select_from(ExecutiveReportContribution)) == 0
+        assert stored_summary()['counters'].get('systems', 0) == 0
+
+
+def test_query_totals_match_tallies(db_create_account):
+    systems = [
+        ('Undersized', ['CPU_UNDERSIZED', 'CPU_UNDERSIZED_BY_PRESSURE'], ['MEMORY_UNDERSIZED'], None, 'us-east-1', 8),
+        ('Oversized', ['CPU_OVERSIZED'], None, ['IO_UNDERSIZED_BY_PRESSURE'], None, 7),
+        ('Optimized', None, None, None, 'us-east-1', 9),
+        ('Waiting for data', None, None, None, 'eu-west-1', None),
+    ]
+    with app.app_context():
+        for system_id, (state, cpu, memory, io, region, major) in enumerate(systems, start=1):
+            db.session.add(System(
+                id=system_id, tenant_id=1, inventory_id=f'ee0b9978-fe1b-4191-8408-cbadbd47f7a{system_id}',
+                state=state, cpu_states=cpu, memory_states=memory, io_states=io, region=region,
+                instance_type='t2.micro',
+            ))
+            db.session.flush()
+            insert_performance_profiles(db.session, system_id, {
+                "report_date": NOW - timedelta(days=system_id * 3),
+                "rule_hit_details": rule_hit_details(None, f't2.size{system_id % 2}') if major else [],
+                "operating_system": {"name": "RHEL", "major": major, "minor": 0} if major else None,
+                "psi_enabled": system_id % 2 == 0,
+            })
+        db.session.commit()
+        build()
+
+        summary = live_summary()
+        assert summary == stored_summary()
+        assert summary['counters']['cpu'] == 3
+        assert summary['counters']['io:under_pressure'] == 1
+        assert 'psi_enabled' not in summary['counters']
+        assert summary['counters']['non_psi'] == 2
+        assert summary['stale_count'] == 2
+        assert summary['instance_types']['historical'] == {'t2.size1': {'us-east-1': 2}, 't2.size0': {'': 1}}
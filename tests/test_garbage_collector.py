@@ -1,8 +1,12 @@
 import pytest
 from datetime import datetime
 from datetime import timedelta
+from datetime import timezone
+from unittest.mock import patch
+from ros.lib.history_partitions import DEFAULT_PARTITION
 from ros.lib.models import db, PerformanceProfile, PerformanceProfileHistory
 from ros.processor.garbage_collector import GarbageCollector
+from ros.processor.metrics import gc_rows_deleted
 from tests.helpers.db_helper import db_get_records
 
 
@@ -37,6 +41,29 @@ def test_remove_outdated_data(
     assert history_records.count() == (total_history_records_before - 1)
 
 
+def test_outdated_data_removal_makes_cached_responses_stale(
+        garbage_collector,
+        db_setup,
+        db_create_system,
+        db_create_performance_profile,
+        db_create_performance_profile_history):
+    garbage_collector.chunk_size = 1
+    for model in (PerformanceProfile, PerformanceProfileHistory):
+        db.session.execute(db.update(model).values(report_date=datetime.now(timezone.utc) - timedelta(days=60)))
+    db.session.commit()
+
+    with patch('ros.processor.garbage_collector.bump_org_generation') as bump_org_generation:
+        garbage_collector.build_executive_reports()
+        garbage_collector.remove_outdated_data()
+    assert db_get_records(PerformanceProfile, system_id=1).count() == 0
+    # Once built, after the history chunk, the expired historical tallies and the profile chunk
+    assert [call.args[0] for call in bump_org_generation.call_args_list] == ['000001'] * 4
+
+    with patch('ros.processor.garbage_collector.bump_org_generation') as bump_org_generation:
+        garbage_collector.remove_outdated_data()
+    bump_org_generation.assert_not_called()
+
+
 def test_gc_method_when_no_outdated_data(
         garbage_collector,
         db_setup,
@@ -53,3 +80,56 @@ def test_gc_method_when_no_outdated_data(
     historical_profile_records = db_get_records(
         PerformanceProfileHistory, system_id=system_id)
     assert profile_records.count() == historical_profile_records.count() == 1
+
+
+def create_outdated_history(count, system_id=1):
+    for days in range(count):
+        db.session.add(PerformanceProfileHistory(
+            system_id=system_id,
+            report_date=datetime.now(timezone.utc) - timedelta(days=50 + days),
+        ))
+    db.session.commit()
+
+
+def test_remove_outdated_data_in_chunks(garbage_collector, db_setup, db_create_system):
+    create_outdated_history(5)
+    garbage_collector.chunk_size = 2
+    deleted_before = gc_rows_deleted.labels(DEFAULT_PARTITION)._value.get()
+
+    with patch('ros.processor.garbage_collector.time.sleep') as mock_sleep:
+        garbage_collector.remove_outdated_data()
+
+    assert db_get_records(PerformanceProfileHistory, system_id=1).count() == 0
+    assert gc_rows_deleted.labels(DEFAULT_PARTITION)._value.get() == deleted_before + 5
+    # Throttled between the chunks of 2, 2 and 1 rows
+    assert mock_sleep.call_count == 2
+    assert garbage_collector.resume_from == {}
+
+
+def test_chunked_deletion_resumes(garbage_collector, db_setup, db_create_system):
+    create_outdated_history(5)
+    garbage_collector.chunk_size = 2
+
+    with patch.object(garbage_collector, '_throttle', side_effect=[None, Exception("statement timeout")]):
+        garbage_collector.remove_outdated_data()
+
+    assert db_get_records(PerformanceProfileHistory, system_id=1).count() == 1
+    resume_from = garbage_collector.resume_from[DEFAULT_PARTITION]
+
+    with patch('ros.processor.garbage_collector.time.sleep'):
+        garbage_collector.remove_outdated_data()
+
+    assert resume_from[0] == 1
+    assert db_get_records(PerformanceProfileHistory, system_id=1).count() == 0
+    assert garbage_collector.resume_from == {}
+
+
+def test_throttle_to_wal_rate(garbage_collector):
+    garbage_collector.chunk_sleep = 0.1
+    garbage_collector.max_wal_rate = 1000
+
+    with patch('ros.processor.garbage_collector.time.sleep') as mock_sleep:
+        garbage_collector._throttle(1.0, 3000)
+        garbage_collector._throttle(1.0, 500)
+
+    assert [call.args[0] for call in mock_sleep.call_args_list] == [2.0, 0.1]
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from ros.extensions import db
+from ros.lib import history_copy, utils
+from ros.lib.app import app
+from ros.lib.history_copy import HistoryCopyWriter, copy_performance_profile_history, format_row
+from ros.lib.models import PerformanceProfile, PerformanceProfileHistory
+
+REPORT_DATE = datetime(2026, 1, 2, tzinfo=timezone.utc)
+
+
+def history_rows(count, system_id=1):
+    return [
+        {
+            "system_id": system_id,
+            "report_date": REPORT_DATE + timedelta(hours=hour),
+            "performance_record": {"hinv.ncpu": 2.0, "note": "tab\there\\ and\nnewline"},
+            "performance_utilization": {"cpu": hour, "io": {}},
+            "state": "Idling",
+            "operating_system": None,
+            "rule_hit_details": [{"key": "IDLE"}],
+            "number_of_recommendations": 1,
+            "psi_enabled": hour % 2 == 0,
+        }
+        for hour in range(count)
+    ]
+
+
+def stored_history(system_id=1):
+    return db.session.scalars(
+        db.select(PerformanceProfileHistory)
+        .filter_by(system_id=system_id)
+        .order_by(PerformanceProfileHistory.report_date)
+    ).all()
+
+
+def test_format_row():
+    row = format_row(
+        {"state": "a\tb", "psi_enabled": False, "number_of_recommendations": 0},
+        ("state", "psi_enabled", "number_of_recommendations", "operating_system"),
+    )
+    assert row == "a\\tb\tf\t0\t\\N\n"
+
+
+def test_copy_performance_profile_history(db_create_system):
+    rows = history_rows(3)
+    with app.app_context():
+        assert copy_performance_profile_history(db.session, rows) == 3
+        db.session.commit()
+
+        history = stored_history()
+        assert len(history) == 3
+        for stored, row in zip(history, rows):
+            assert stored.report_date == row["report_date"]
+            assert stored.performance_record == row["performance_record"]
+            assert stored.performance_utilization == row["performance_utilization"]
+            assert stored.rule_hit_details == row["rule_hit_details"]
+            assert stored.operating_system is None
+            assert stored.psi_enabled is row["psi_enabled"]
+
+
+def test_writer_copies_in_batches(db_create_system):
+    with app.app_context():
+        with patch('ros.lib.history_copy._copy', wraps=history_copy._copy) as mock_copy:
+            with HistoryCopyWriter(db.session, batch_size=2) as writer:
+                for fields in history_rows(5):
+                    writer.add(fields)
+        db.session.commit()
+
+        assert writer.written == 5
+        assert mock_copy.call_count == 3
+        assert len(stored_history()) == 5
+
+
+def test_writer_skips_duplicates(db_create_system):
+    rows = history_rows(4)
+    with app.app_context():
+        copy_performance_profile_history(db.session, rows[:2])
+        db.session.commit()
+
+        with HistoryCopyWriter(db.session, batch_size=3, skip_duplicates=True) as writer:
+            for fields in rows:
+                writer.add(fields)
+        db.session.commit()
+
+        assert writer.written == 2
+        assert len(stored_history()) == 4
+
+
+def test_bulk_insert_copies_history(db_create_system):
+    profiles = [dict(fields, top_candidate="t2.micro", top_candidate_price=0.0116) for fields in history_rows(3)]
+    with app.app_context():
+        with patch('ros.lib.utils.HISTORY_COPY_MIN_ROWS', 2), \
+                patch('ros.lib.utils.copy_performance_profile_history',
+                      wraps=utils.copy_performance_profile_history) as mock_copy:
+            utils.bulk_insert_performance_profiles(db.session, profiles)
+        db.session.commit()
+
+        mock_copy.assert_called_once()
+        assert len(stored_history()) == 3
+        profile = db.session.scalar(db.select(PerformanceProfile).filter_by(system_id=1))
+        assert profile.report_date == profiles[-1]["report_date"]
+        assert profile.top_candidate == "t2.micro"
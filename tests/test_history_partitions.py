@@ -0,0 +1,123 @@
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from datetime import date, datetime, timedelta, timezone
+
+from ros.extensions import db
+from ros.lib.app import app
+from ros.lib.history_partitions import (
+    DEFAULT_PARTITION,
+    create_future_partitions,
+    include_in_autogenerate,
+    is_partitioned,
+    partition_name,
+    partitions,
+    remove_partitions_before,
+)
+from ros.lib.models import PerformanceProfileHistory
+from ros.processor.garbage_collector import GarbageCollector
+
+TODAY = date(2026, 1, 10)
+
+
+def add_history(report_date):
+    db.session.add(PerformanceProfileHistory(system_id=1, report_date=report_date, state="Idling"))
+    db.session.commit()
+
+
+def row_partitions():
+    return db.session.execute(db.text(
+        "SELECT tableoid::regclass::text FROM performance_profile_history ORDER BY report_date"
+    )).scalars().all()
+
+
+def drop_partitions():
+    db.session.rollback()
+    connection = db.session.connection()
+    for day in partitions(connection):
+        connection.execute(db.text(f"DROP TABLE {partition_name(day)}"))
+    db.session.commit()
+
+
+@pytest.fixture
+def no_partitions(db_create_system):
+    # Only the DEFAULT partition, the garbage collector may have created others
+    with app.app_context():
+        drop_partitions()
+        yield
+        drop_partitions()
+
+
+def test_create_future_partitions_moves_default_rows(no_partitions):
+    with app.app_context():
+        assert is_partitioned(db.session.connection())
+        add_history(datetime(2026, 1, 11, 23, 59, tzinfo=timezone.utc))
+        add_history(datetime(2026, 1, 30, tzinfo=timezone.utc))
+        assert row_partitions() == [DEFAULT_PARTITION, DEFAULT_PARTITION]
+
+        created = create_future_partitions(db.session.connection(), today=TODAY, days=2)
+        db.session.commit()
+
+        assert created == [date(2026, 1, 10), date(2026, 1, 11), date(2026, 1, 12)]
+        assert partitions(db.session.connection()) == created
+        assert row_partitions() == ["performance_profile_history_p20260111", DEFAULT_PARTITION]
+        assert create_future_partitions(db.session.connection(), today=TODAY, days=3) == [date(2026, 1, 13)]
+
+        add_history(datetime(2026, 1, 12, 8, tzinfo=timezone.utc))
+        assert "performance_profile_history_p20260112" in row_partitions()
+
+
+def test_remove_partitions_before(no_partitions):
+    with app.app_context():
+        connection = db.session.connection()
+        create_future_partitions(connection, today=TODAY, days=4)
+        db.session.commit()
+        add_history(datetime(2026, 1, 10, 12, tzinfo=timezone.utc))
+        add_history(datetime(2026, 1, 12, 12, tzinfo=timezone.utc))
+
+        cutoff = datetime(2026, 1, 12, 6, tzinfo=timezone.utc)
+        removed = remove_partitions_before(db.session.connection(), cutoff)
+        db.session.commit()
+        assert removed == [date(2026, 1, 10), date(2026, 1, 11)]
+        assert partitions(db.session.connection())[0] == date(2026, 1, 12)
+        # The partition holding the cutoff is kept whole
+        assert row_partitions() == ["performance_profile_history_p20260112"]
+
+        removed = remove_partitions_before(db.session.connection(), date(2026, 1, 14), retention="detach")
+        db.session.commit()
+        assert removed == [date(2026, 1, 12), date(2026, 1, 13)]
+        assert row_partitions() == []
+        detached = db.session.execute(db.text("SELECT count(*) FROM performance_profile_history_p20260112"))
+        assert detached.scalar() == 1
+        db.session.execute(db.text("DROP TABLE performance_profile_history_p20260112"))
+        db.session.execute(db.text("DROP TABLE performance_profile_history_p20260113"))
+        db.session.commit()
+
+
+def test_garbage_collector_maintains_partitions(no_partitions):
+    today = datetime.now(timezone.utc).date()
+    with app.app_context():
+        connection = db.session.connection()
+        create_future_partitions(connection, today=today - timedelta(days=50), days=0)
+        db.session.commit()
+        add_history(datetime.now(timezone.utc) - timedelta(days=50))
+        add_history(datetime.now(timezone.utc) - timedelta(days=60))
+
+        GarbageCollector().remove_outdated_data()
+
+        days = partitions(db.session.connection())
+        assert days[0] == today
+        assert len(days) == 8
+        assert row_partitions() == []
+
+
+def test_autogenerate_ignores_partitions(no_partitions):
+    with app.app_context():
+        create_future_partitions(db.session.connection(), today=TODAY)
+        db.session.commit()
+        with db.engine.connect() as connection:
+            context = MigrationContext.configure(connection, opts={"include_name": include_in_autogenerate})
+            changes = compare_metadata(context, db.metadata)
+
+    dropped = [change[1].name for change in changes if change[0] in ("remove_table", "remove_index")]
+    assert not [name for name in dropped if name.startswith("performance_profile_history_")]
@@ -0,0 +1,64 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pytest
+from requests.adapters import HTTPAdapter
+
+from ros.lib import http_client
+from ros.processor.metrics import http_client_connections_opened, http_client_request_seconds
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    statuses = []
+
+    def do_GET(self):
+        status = self.statuses.pop(0) if self.statuses else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("localhost", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    with patch.dict(http_client._sessions, clear=True), patch.object(http_client, 'HTTP_CLIENT_RETRY_BACKOFF', 0):
+        yield f"http://localhost:{httpd.server_address[1]}/"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_connections_reused(server):
+    opened = http_client_connections_opened.labels('rbac')._value.get()
+    requests_timed = http_client_request_seconds.labels('rbac')._sum.get()
+    session = http_client.http_session('rbac')
+    assert http_client.http_session('rbac') is session
+
+    for _ in range(3):
+        assert session.get(server).text == "ok"
+
+    assert http_client_connections_opened.labels('rbac')._value.get() == opened + 1
+    assert http_client_request_seconds.labels('rbac')._sum.get() > requests_timed
+
+
+def test_unavailable_retried(server):
+    Handler.statuses = [503, 502]
+    assert http_client.http_session('archive').get(server).status_code == 200
+
+    Handler.statuses = [503] * (http_client.HTTP_CLIENT_RETRIES + 1)
+    assert http_client.http_session('archive').get(server).status_code == 503
+
+
+def test_default_timeout(server):
+    session = http_client.http_session('rbac')
+    with patch.object(HTTPAdapter, 'send', autospec=True, side_effect=HTTPAdapter.send) as send:
+        session.get(server)
+        session.get(server, timeout=1)
+    assert [call.kwargs['timeout'] for call in send.call_args_list] == [http_client.RBAC_TIMEOUT, 1]
@@ -1,10 +1,14 @@
+import copy
 import pytest
 import json
 from pathlib import Path
+from unittest.mock import MagicMock
 from ros.lib.app import app
 from ros.extensions import cache
+from ros.lib.models import RhAccount
 from ros.processor.inventory_events_consumer import InventoryEventsConsumer
-from tests.helpers.db_helper import db_get_host
+from ros.processor.metrics import inventory_events_coalesced
+from tests.helpers.db_helper import db_get_host, db_get_record
 from ros.lib.config import CACHE_KEYWORD_FOR_DELETED_SYSTEM
 
 
@@ -150,3 +154,51 @@ def test_recreate_remove_cached_key(inventory_event_consumer, inventory_event_me
     with app.app_context():
         cached_sys_val = cache.get(cached_skey)
         assert cached_sys_val is None
+
+
+def kafka_message(msg):
+    message = MagicMock()
+    message.error.return_value = None
+    message.value.return_value = msg if isinstance(msg, bytes) else json.dumps(msg).encode('utf-8')
+    return message
+
+
+def test_process_batch_coalesces_events(inventory_event_consumer, inventory_event_message, db_setup, mocker):
+    mocker.patch('ros.processor.inventory_events_consumer.is_feature_flag_enabled', return_value=False)
+    inventory_event_consumer.consumer = MagicMock()
+    created = copy.deepcopy(inventory_event_message)
+    created['type'] = 'created'
+    updated = copy.deepcopy(inventory_event_message)
+    updated['host']['display_name'] = 'Test - Display Name Update'
+    updated['host']['groups'] = []
+    other = copy.deepcopy(created)
+    other['host']['id'] = 'bb0b9978-fe1b-4191-8408-cbadbd47f7a3'
+    delete = {"type": "delete", "id": other['host']['id'], "account": '0000001', 'org_id': '000001',
+              'timestamp': '2022-05-11T13:58:54.509083+00:00'}
+    coalesced = inventory_events_coalesced._value.get()
+
+    inventory_event_consumer.process_batch(
+        [kafka_message(msg) for msg in (created, other, updated, b'not json', delete)]
+    )
+
+    with app.app_context():
+        host = db_get_host(inventory_event_message['host']['id'])
+        assert host.display_name == 'Test - Display Name Update'
+        assert host.groups == []
+        assert db_get_record(RhAccount, id=host.tenant_id).account == '0000001'
+        assert db_get_host(other['host']['id']) is None
+    assert inventory_events_coalesced._value.get() == coalesced + 2
+    inventory_event_consumer.consumer.commit.assert_called_once_with(asynchronous=False)
+
+
+def test_process_batch_falls_back_to_one_by_one(inventory_event_consumer, inventory_event_message, db_setup, mocker):
+    mocker.patch('ros.processor.inventory_events_consumer.is_feature_flag_enabled', return_value=False)
+    mocker.patch.object(inventory_event_consumer, '_write_batch', side_effect=Exception('deadlock detected'))
+    inventory_event_consumer.consumer = MagicMock()
+    inventory_event_message['type'] = 'created'
+
+    inventory_event_consumer.process_batch([kafka_message(inventory_event_message)])
+
+    with app.app_context():
+        assert db_get_host(inventory_event_message['host']['id']) is not None
+    inventory_event_consumer.consumer.commit.assert_called_once_with(asynchronous=False)
@@ -0,0 +1,36 @@
+from unittest import mock
+
+from ros.lib.lru_cache import LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+
+    cache.put('c', 3)
+
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert len(cache) == 2
+
+
+def test_lru_cache_counts_hits_and_misses():
+    hits, misses = mock.Mock(), mock.Mock()
+    cache = LRUCache(2, hits, misses)
+    cache.put('a', ())
+
+    assert cache.get('a') == ()
+    assert cache.get('b', 'default') == 'default'
+    hits.inc.assert_called_once()
+    misses.inc.assert_called_once()
+
+
+def test_lru_cache_disabled():
+    cache = LRUCache(0)
+    cache.put('a', 1)
+
+    assert cache.get('a') is None
+    assert len(cache) == 0
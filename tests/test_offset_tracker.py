@@ -0,0 +1,56 @@
+from confluent_kafka import TopicPartition
+
+from ros.lib.offset_tracker import OffsetTracker
+from tests.helpers.kafka_helper import kafka_message, committed
+
+
+def test_offsets_committed_in_order():
+    tracker = OffsetTracker()
+    messages = [kafka_message(offset) for offset in (10, 11, 12)]
+    for message in messages:
+        tracker.add(message)
+
+    tracker.done(messages[1])
+    tracker.done(messages[2])
+    assert tracker.committable() == []
+    assert len(tracker) == 3
+
+    tracker.done(messages[0])
+    offsets = tracker.committable()
+    assert committed(offsets) == {('platform.inventory.events', 0): 13}
+    # Offsets stay tracked until their commit succeeds
+    assert committed(tracker.committable()) == {('platform.inventory.events', 0): 13}
+    tracker.committed(offsets)
+    assert tracker.committable() == []
+    assert len(tracker) == 0
+
+
+def test_offsets_tracked_per_partition():
+    tracker = OffsetTracker()
+    slow = kafka_message(5, partition=0)
+    fast = kafka_message(7, partition=1)
+    tracker.add(slow)
+    tracker.add(fast)
+
+    tracker.done(fast)
+    offsets = tracker.committable()
+    assert committed(offsets) == {('platform.inventory.events', 1): 8}
+    tracker.committed(offsets)
+
+    tracker.done(slow)
+    assert committed(tracker.committable()) == {('platform.inventory.events', 0): 6}
+
+
+def test_revoked_partition_forgotten():
+    tracker = OffsetTracker()
+    revoked = [kafka_message(offset, partition=0) for offset in (3, 4)]
+    kept = kafka_message(9, partition=1)
+    for message in revoked + [kept]:
+        tracker.add(message)
+    tracker.done(revoked[0])
+    tracker.done(kept)
+
+    tracker.forget([TopicPartition('platform.inventory.events', 0)])
+    assert committed(tracker.committable()) == {('platform.inventory.events', 1): 10}
+    tracker.done(revoked[1])
+    assert committed(tracker.committable()) == {('platform.inventory.events', 1): 10}
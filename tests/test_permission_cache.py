@@ -0,0 +1,83 @@
+import pytest
+from flask import request
+from flask_caching import Cache
+from unittest.mock import patch
+from werkzeug.exceptions import Forbidden
+
+from ros.lib.app import app
+from ros.lib.check_permission import check_permission
+from ros.lib.permission_cache import clear_local_verdicts
+from ros.processor.metrics import permission_cache_hits, permission_cache_misses
+
+RBAC_RESPONSE = {
+    "data": [
+        {"permission": "ros:*:read", "resourceDefinitions": []},
+        {
+            "permission": "inventory:hosts:read",
+            "resourceDefinitions": [
+                {"attributeFilter": {"key": "group.id", "operation": "in", "value": ["group-a", None]}}
+            ],
+        },
+    ]
+}
+
+
+@pytest.fixture
+def permission_cache():
+    cache = Cache(config={'CACHE_TYPE': 'SimpleCache'})
+    cache.init_app(app)
+    with patch('ros.lib.permission_cache.cache', cache), \
+            patch('ros.lib.permission_cache.PERMISSION_CACHE_TIMEOUT', 60), \
+            patch('ros.lib.permission_cache.PERMISSION_CACHE_NEGATIVE_TIMEOUT', 10):
+        yield cache
+    clear_local_verdicts()
+
+
+def checked_request(auth_token):
+    with app.test_request_context('/api/ros/v1/systems', headers={"x-rh-identity": auth_token}):
+        check_permission(permissions=["ros:*:read"], application="ros,inventory", app_name="ros", logger=None)
+        return request.host_groups, request.able_to_access_all_systems
+
+
+def test_rbac_verdict_cached_in_both_tiers(permission_cache, auth_token):
+    memory_hits = permission_cache_hits.labels('memory')._value.get()
+    redis_hits = permission_cache_hits.labels('redis')._value.get()
+    misses = permission_cache_misses._value.get()
+    with patch('ros.lib.check_permission.ENABLE_RBAC', True), \
+            patch('ros.lib.check_permission.query_rbac', return_value=RBAC_RESPONSE) as query_rbac:
+        assert checked_request(auth_token) == ({"group-a", None}, False)
+        assert checked_request(auth_token) == ({"group-a", None}, False)
+        clear_local_verdicts()
+        assert checked_request(auth_token) == ({"group-a", None}, False)
+
+    assert query_rbac.call_count == 1
+    assert permission_cache_misses._value.get() == misses + 1
+    assert permission_cache_hits.labels('memory')._value.get() == memory_hits + 1
+    assert permission_cache_hits.labels('redis')._value.get() == redis_hits + 1
+    with app.app_context():
+        assert not [key for key in permission_cache.cache._cache if auth_token in key]
+
+
+def test_denial_cached(permission_cache, auth_token):
+    denied = {"data": [{"permission": "inventory:hosts:read", "resourceDefinitions": []}]}
+    with patch('ros.lib.check_permission.ENABLE_RBAC', True), \
+            patch('ros.lib.check_permission.query_rbac', return_value=denied) as query_rbac:
+        for _ in range(2):
+            with pytest.raises(Forbidden):
+                checked_request(auth_token)
+    assert query_rbac.call_count == 1
+
+
+def test_failed_kessel_query_not_cached(permission_cache, auth_token):
+    failed = {"ros_can_read": False, "host_groups": set(), "error": True}
+    with patch('ros.lib.check_permission.ENABLE_KESSEL', True), \
+            patch('ros.lib.check_permission.query_kessel', return_value=failed) as query_kessel:
+        for _ in range(2):
+            with pytest.raises(Forbidden):
+                checked_request(auth_token)
+        assert query_kessel.call_count == 2
+
+        query_kessel.return_value = {"ros_can_read": True, "host_groups": {"workspace-a"}}
+        assert checked_request(auth_token) == ({"workspace-a"}, False)
+        assert checked_request(auth_token) == ({"workspace-a"}, False)
+        assert query_kessel.call_count == 3
@@ -0,0 +1,67 @@
+import pytest
+from unittest.mock import MagicMock, patch
+
+from ros.lib import produce
+from ros.processor.metrics import kafka_producer_delivery_failures, kafka_producer_delivery_seconds
+
+
+@pytest.fixture
+def kafka_producer():
+    with patch('ros.lib.produce.Producer') as producer_class, patch('ros.lib.produce.atexit'):
+        kafka_producer = producer_class.return_value
+        kafka_producer.__len__.return_value = 0
+        kafka_producer.flush.return_value = 0
+        yield producer_class
+
+
+def delivered_callback(kafka_producer):
+    return kafka_producer.return_value.produce.call_args.kwargs['on_delivery']
+
+
+def test_producer_batches_messages(kafka_producer):
+    producer = produce.init_producer()
+    producer.close()
+
+    config = kafka_producer.call_args.args[0]
+    assert config['linger.ms'] == produce.KAFKA_PRODUCER_LINGER_MS
+    assert config['batch.size'] == produce.KAFKA_PRODUCER_BATCH_SIZE
+    assert config['compression.type'] == produce.KAFKA_PRODUCER_COMPRESSION
+
+
+def test_delivery_reports_recorded(kafka_producer):
+    failures = kafka_producer_delivery_failures.labels('topic')._value.get()
+    latency = kafka_producer_delivery_seconds.labels('topic')._sum.get()
+    on_delivery = MagicMock()
+    producer = produce.init_producer()
+
+    producer.produce('topic', b'value', key=b'key', on_delivery=on_delivery)
+    message = MagicMock()
+    message.latency.return_value = 0.5
+    delivered_callback(kafka_producer)(None, message)
+    delivered_callback(kafka_producer)('error', message)
+    producer.close()
+
+    assert on_delivery.call_args_list[0].args == (None, message)
+    assert on_delivery.call_args_list[1].args == ('error', message)
+    assert kafka_producer_delivery_failures.labels('topic')._value.get() == failures + 1
+    assert kafka_producer_delivery_seconds.labels('topic')._sum.get() == latency + 0.5
+
+
+def test_full_queue_flushed_before_retry(kafka_producer):
+    kafka_producer.return_value.produce.side_effect = [BufferError, None]
+    producer = produce.init_producer()
+
+    producer.produce('topic', b'value')
+    producer.close()
+
+    assert kafka_producer.return_value.produce.call_count == 2
+    assert kafka_producer.return_value.flush.call_count == 2
+
+
+def test_close_flushes_once(kafka_producer):
+    producer = produce.init_producer()
+    producer.close()
+    producer.close()
+
+    kafka_producer.return_value.flush.assert_called_once_with(produce.KAFKA_PRODUCER_FLUSH_TIMEOUT)
+    assert not producer._poll_thread.is_alive()
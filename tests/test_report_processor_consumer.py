@@ -1,5 +1,7 @@
+import json
 import pytest
 from datetime import datetime, timezone
+from unittest.mock import Mock, patch
 from ros.lib.app import app
 from ros.processor.report_processor_consumer import ReportProcessorConsumer
 from ros.lib.models import RhAccount, PerformanceProfile, PerformanceProfileHistory
@@ -197,3 +199,68 @@ def test_process_with_performance_data(
         assert perf_history.performance_record == report_event_with_perf_data['performance_record']
         assert perf_history.performance_utilization == report_event_with_perf_data['performance_utilization']
         assert perf_history.state == report_event_with_perf_data['state']
+
+
+def batch_message(payload):
+    message = Mock()
+    message.error.return_value = None
+    message.value.return_value = json.dumps(payload).encode('utf-8')
+    return message
+
+
+def test_process_batch(
+    report_processor_consumer, report_event_without_perf_data, update_event_without_perf_data,
+    report_event_with_perf_data, db_setup
+):
+    report_processor_consumer.consumer = Mock()
+    second_report = dict(report_event_with_perf_data, state="Under pressure", number_of_recommendations=2)
+    missing_update = dict(update_event_without_perf_data, id="ee0b9978-fe1b-4191-8408-cbadbd47f7a4")
+    undecodable = Mock()
+    undecodable.error.return_value = None
+    undecodable.value.return_value = b'not json'
+    messages = [
+        batch_message(report_event_without_perf_data),
+        batch_message(report_event_with_perf_data),
+        undecodable,
+        batch_message(update_event_without_perf_data),
+        batch_message(second_report),
+        batch_message(missing_update),
+    ]
+
+    report_processor_consumer.process_batch(messages)
+
+    report_processor_consumer.consumer.commit.assert_called_once_with(asynchronous=False)
+    with app.app_context():
+        system = db_get_host(update_event_without_perf_data['id'])
+        assert system.display_name == update_event_without_perf_data['display_name']
+        assert system.groups == update_event_without_perf_data['groups']
+        assert db_get_host(missing_update['id']) is None
+
+        system = db_get_host(report_event_with_perf_data['id'])
+        assert system.state == second_report['state']
+        assert system.region == report_event_with_perf_data['region']
+        perf_profile = db.session.scalar(db.select(PerformanceProfile).filter_by(system_id=system.id))
+        assert perf_profile.state == second_report['state']
+        assert perf_profile.number_of_recommendations == 2
+        history = db.session.scalars(
+            db.select(PerformanceProfileHistory).filter_by(system_id=system.id)
+        ).all()
+        assert len(history) == 2
+
+
+def test_process_batch_falls_back_to_single_messages(
+    report_processor_consumer, report_event_without_perf_data, report_event_with_perf_data, db_setup
+):
+    report_processor_consumer.consumer = Mock()
+    messages = [batch_message(report_event_without_perf_data), batch_message(report_event_with_perf_data)]
+
+    with patch(
+        'ros.processor.report_processor_consumer.bulk_upsert_systems', side_effect=Exception("deadlock")
+    ):
+        report_processor_consumer.process_batch(messages)
+
+    report_processor_consumer.consumer.commit.assert_called_once_with(asynchronous=False)
+    with app.app_context():
+        assert db_get_host(report_event_without_perf_data['id']) is not None
+        system = db_get_host(report_event_with_perf_data['id'])
+        assert db.session.scalar(db.select(PerformanceProfile).filter_by(system_id=system.id)) is not None
@@ -0,0 +1,53 @@
+import pytest
+from flask_caching import Cache
+from unittest.mock import patch
+
+from ros.api.main import app
+from ros.lib.cache_utils import bump_org_generation
+from ros.lib.models import db, PerformanceProfile
+from ros.processor.metrics import response_cache_hits, response_cache_misses
+
+
+@pytest.fixture
+def memory_cache():
+    cache = Cache(config={'CACHE_TYPE': 'SimpleCache'})
+    cache.init_app(app)
+    with patch('ros.api.common.response_cache.cache', cache), patch('ros.lib.cache_utils.cache', cache):
+        yield cache
+
+
+def is_configured(client, auth_token, **args):
+    return client.get('/api/ros/v1/is_configured', headers={"x-rh-identity": auth_token}, query_string=args)
+
+
+def test_response_served_from_cache_until_bumped(
+        memory_cache, auth_token, db_setup, db_create_account, db_create_system, db_create_performance_profile):
+    hits = response_cache_hits.labels('is_configured')._value.get()
+    misses = response_cache_misses.labels('is_configured')._value.get()
+    with app.test_client() as client:
+        assert is_configured(client, auth_token).json['count'] == 1
+        db.session.execute(db.delete(PerformanceProfile))
+        db.session.commit()
+        assert is_configured(client, auth_token).json['count'] == 1
+        assert response_cache_hits.labels('is_configured')._value.get() == hits + 1
+
+        with app.app_context():
+            bump_org_generation('000001')
+        assert is_configured(client, auth_token).json['count'] == 0
+    assert response_cache_misses.labels('is_configured')._value.get() == misses + 2
+
+
+def test_request_arguments_are_part_of_the_key(memory_cache, auth_token, db_setup, db_create_account):
+    misses = response_cache_misses.labels('is_configured')._value.get()
+    with app.test_client() as client:
+        is_configured(client, auth_token)
+        is_configured(client, auth_token, unused='1')
+        is_configured(client, auth_token, unused='1')
+    assert response_cache_misses.labels('is_configured')._value.get() == misses + 2
+
+
+def test_responses_not_cached_when_disabled(memory_cache, auth_token, db_setup, db_create_account):
+    with patch('ros.api.common.response_cache.RESPONSE_CACHE_TIMEOUT', 0), app.test_client() as client:
+        assert is_configured(client, auth_token).status_code == 200
+    with app.app_context():
+        assert not [key for key in memory_cache.cache._cache if key.startswith('response_')]
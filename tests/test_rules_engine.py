@@ -9,13 +9,24 @@ This module tests all components of the rules engine including:
 - Utility functions
 """
 
+import json
+import os
 import pytest
+from math import isclose
 from unittest.mock import Mock, patch
 
 from insights import SkipComponent
 
 from ros.rules import rules_engine
+from ros.rules.rules_engine import CloudInstance
+from ros.lib.lru_cache import LRUCache
+from ros.processor.metrics import solution_cache_hits
+from ros.rules.batch_evaluation import HostUtilization, evaluate_batch
 from ros.rules.helpers.rules_data import RosKeys, RosThresholds
+from ros.rules.helpers import Ec2LinuxPrices
+from ros.rules.helpers.instance_catalog import instance_type_index
+from ros.rules.helpers.price_catalog import Ec2PriceCatalog, ec2_price_catalog
+from ros.lib.aws_instance_types import INSTANCE_TYPES as EC2_INSTANCE_TYPES
 from ros.processor.insights_engine_consumer import (
     topmost_candidate_from_rule_hit
 )
@@ -400,14 +411,155 @@ class TestCandidateFunctions:
         assert len(candidates) == len(mock_ec2_instance_types)  # All instance types returned
 
 
+class TestInstanceTypeIndex:
+    """Test the precomputed instance type index against a full catalog scan."""
+
+    @staticmethod
+    def scan_cpu_candidates(cur_type, ut, idle):
+        """Reference implementation: linear scan over every instance type."""
+        cur_inst = EC2_INSTANCE_TYPES[cur_type]
+        inst_vcpu = float(cur_inst["extra"]["vcpu"])
+        in_use = inst_vcpu - idle
+        candidates = set()
+        for ci, cd in EC2_INSTANCE_TYPES.items():
+            if ci == cur_type or cd["extra"]["physicalProcessor"] != cur_inst["extra"]["physicalProcessor"]:
+                continue
+            cand_vcpu = float(cd["extra"]["vcpu"])
+            cand_vcpu_ev = cand_vcpu * RosThresholds.CPU_UTILIZATION_WARNING_UPPER_THRESHOLD
+            if not (cand_vcpu_ev > in_use or isclose(cand_vcpu_ev, in_use)):
+                continue
+            if ut & RosKeys.CPU_UNDERSIZED or ut & RosKeys.CPU_UNDERSIZED_BY_PRESSURE:
+                if cand_vcpu > inst_vcpu or isclose(cand_vcpu, inst_vcpu):
+                    candidates.add(ci)
+            elif ut & RosKeys.CPU_OVERSIZED:
+                if cand_vcpu < inst_vcpu or isclose(cand_vcpu, inst_vcpu):
+                    candidates.add(ci)
+            else:
+                candidates.add(ci)
+        return candidates
+
+    @staticmethod
+    def scan_mem_candidates(cur_type, ut, in_use):
+        """Reference implementation: linear scan over every instance type."""
+        inst_mem = float(EC2_INSTANCE_TYPES[cur_type]['ram'] * 1024)
+        candidates = set()
+        for ci, cd in EC2_INSTANCE_TYPES.items():
+            if ci == cur_type:
+                continue
+            cand_mem = float(cd['ram'] * 1024)
+            if not (cand_mem * RosThresholds.MEMORY_UTILIZATION_WARNING_UPPER_THRESHOLD >= in_use):
+                continue
+            if ut & RosKeys.MEMORY_UNDERSIZED or ut & RosKeys.MEMORY_UNDERSIZED_BY_PRESSURE:
+                if cand_mem > inst_mem or isclose(cand_mem, inst_mem):
+                    candidates.add(ci)
+            elif ut & RosKeys.MEMORY_OVERSIZED:
+                if cand_mem < inst_mem or isclose(cand_mem, inst_mem):
+                    candidates.add(ci)
+            else:
+                candidates.add(ci)
+        return candidates
+
+    @pytest.mark.parametrize("instance_type", ["t2.micro", "m5.large", "c5.4xlarge", "r6g.xlarge"])
+    @pytest.mark.parametrize("cpu_key", [
+        RosKeys.OPTIMIZED, RosKeys.CPU_UNDERSIZED, RosKeys.CPU_OVERSIZED, RosKeys.CPU_UNDERSIZED_BY_PRESSURE
+    ])
+    @pytest.mark.parametrize("idle_ratio", [0.0, 0.2, 0.6, 0.95])
+    def test_cpu_candidates_match_scan(self, instance_type, cpu_key, idle_ratio):
+        """Index based CPU candidates are identical to the full scan."""
+        cm = CloudInstance('aws', instance_type, None, 'us-east-1')
+        idle = float(EC2_INSTANCE_TYPES[instance_type]["extra"]["vcpu"]) * idle_ratio
+
+        ut, candidates = rules_engine.cpu_candidates(cm, (cpu_key, idle), RosKeys.OPTIMIZED)
+
+        assert ut == cpu_key
+        assert candidates == self.scan_cpu_candidates(instance_type, cpu_key, idle)
+
+    @pytest.mark.parametrize("instance_type", ["t2.micro", "m5.large", "c5.4xlarge", "r6g.xlarge"])
+    @pytest.mark.parametrize("mem_key", [
+        RosKeys.OPTIMIZED, RosKeys.MEMORY_UNDERSIZED, RosKeys.MEMORY_OVERSIZED, RosKeys.MEMORY_UNDERSIZED_BY_PRESSURE
+    ])
+    @pytest.mark.parametrize("usage_ratio", [0.05, 0.5, 0.8, 0.99])
+    def test_mem_candidates_match_scan(self, instance_type, mem_key, usage_ratio):
+        """Index based memory candidates are identical to the full scan."""
+        cm = CloudInstance('aws', instance_type, None, 'us-east-1')
+        in_use = EC2_INSTANCE_TYPES[instance_type]['ram'] * 1024 * usage_ratio
+
+        ut, candidates = rules_engine.mem_candidates(cm, (mem_key, in_use), RosKeys.OPTIMIZED)
+
+        assert ut == mem_key
+        assert candidates == self.scan_mem_candidates(instance_type, mem_key, in_use)
+
+    def test_index_is_built_once(self):
+        """The index is reused as long as the catalog object is unchanged."""
+        index = instance_type_index(EC2_INSTANCE_TYPES)
+
+        assert instance_type_index(EC2_INSTANCE_TYPES) is index
+        assert index.all_types == set(EC2_INSTANCE_TYPES)
+        assert instance_type_index(dict(EC2_INSTANCE_TYPES)) is not index
+
+
+class TestEc2PriceCatalog:
+    """Test the process wide EC2 price catalog."""
+
+    def test_prices_match_pricing_file(self):
+        """Every price of the pricing file is returned unchanged."""
+        catalog = ec2_price_catalog()
+        prices = Ec2LinuxPrices()
+
+        assert len(catalog) == len(prices)
+        for instance_type, by_region in prices.items():
+            for region, price in by_region.items():
+                assert catalog.price(instance_type, region) == price
+
+    def test_missing_price_returns_default(self):
+        """Unknown instance types and regions fall back to the default."""
+        catalog = Ec2PriceCatalog({
+            "t2.micro": {"us-east-1": 0.0116},
+            "t2.small": {"us-west-2": 0.023},
+        })
+
+        assert catalog.price("t2.micro", "us-east-1") == 0.0116
+        assert catalog.price("t2.micro", "us-west-2") is None
+        assert catalog.price("t2.micro", "us-west-2", 0) == 0
+        assert catalog.price("t2.nano", "us-east-1", 0) == 0
+        assert catalog.price("t2.small", "eu-west-1") is None
+        assert "t2.small" in catalog
+
+    def test_catalog_is_loaded_once(self):
+        """The catalog is reused as long as the pricing file is unchanged."""
+        assert ec2_price_catalog() is ec2_price_catalog()
+
+    def test_catalog_reloads_on_file_change(self, tmp_path):
+        """A modified pricing file is picked up on the next lookup."""
+        pricing_file = tmp_path / "ec2_instance_pricing.json"
+
+        def write_prices(price, mtime):
+            pricing_file.write_text(json.dumps(
+                {"compute": {"ec2_linux": {"t2.micro": {"us-east-1": price}}}}))
+            os.utime(pricing_file, ns=(mtime, mtime))
+
+        write_prices(0.0116, 1_000_000_000)
+        catalog = ec2_price_catalog(str(pricing_file))
+        assert catalog.price("t2.micro", "us-east-1") == 0.0116
+
+        write_prices(0.0232, 2_000_000_000)
+        reloaded = ec2_price_catalog(str(pricing_file))
+        assert reloaded is not catalog
+        assert reloaded.price("t2.micro", "us-east-1") == 0.0232
+
+        # Restore the catalog of the real pricing file for the other tests
+        ec2_price_catalog()
+
+
 class TestFindSolution:
     """Test find_solution function that combines all evaluations."""
 
-    @patch('ros.rules.rules_engine.Ec2LinuxPrices')
+    @patch('ros.rules.rules_engine.ec2_price_catalog')
     def test_find_solution_idle(self, mock_pricing, mock_cloud_instance_aws, mock_ec2_pricing):
         """Test find solution for idle system."""
         # Mock pricing using fixture
-        mock_pricing.return_value.get.return_value = mock_ec2_pricing["t2.micro"]
+        mock_pricing.return_value.price.side_effect = \
+            lambda instance_type, region, default=None: mock_ec2_pricing["t2.micro"].get(region, default)
 
         # Mock evaluations
         cpu = (RosKeys.CPU_OVERSIZED, {"t2.nano", "t2.small"})
@@ -424,11 +576,12 @@ class TestFindSolution:
         assert isinstance(states, dict)
         assert isinstance(solution_w_price, list)
 
-    @patch('ros.rules.rules_engine.Ec2LinuxPrices')
+    @patch('ros.rules.rules_engine.ec2_price_catalog')
     def test_find_solution_undersized(self, mock_pricing, mock_cloud_instance_aws, mock_ec2_pricing):
         """Test find solution for undersized system."""
         # Mock pricing using fixture
-        mock_pricing.return_value.get.return_value = mock_ec2_pricing["t2.micro"]
+        mock_pricing.return_value.price.side_effect = \
+            lambda instance_type, region, default=None: mock_ec2_pricing["t2.micro"].get(region, default)
 
         # Mock evaluations
         cpu = (RosKeys.CPU_UNDERSIZED, {"t2.small", "t2.medium"})
@@ -445,6 +598,126 @@ class TestFindSolution:
         assert isinstance(states, dict)
         assert isinstance(solution_w_price, list)
 
+    @staticmethod
+    def solve(cm, cpu_ut, mem_ut):
+        """Run find_solution on the real catalog and pricing."""
+        info = EC2_INSTANCE_TYPES[cm.type]
+        vcpu = float(info["extra"]["vcpu"])
+        physmem = float(info["ram"] * 1024)
+        cpu_ev = rules_engine.cpu_evaluation((cpu_ut, vcpu * (1.0 - cpu_ut)))
+        mem_ev = rules_engine.mem_evaluation((mem_ut, physmem * mem_ut))
+        io_ev = rules_engine.io_evaluation(None)
+        psi_ev = rules_engine.psi_evaluation(None)
+        idle_ev = rules_engine.idle_evaluation((cpu_ut, 0), (mem_ut, 0))
+        return rules_engine.find_solution(
+            cm,
+            rules_engine.cpu_candidates(cm, cpu_ev, psi_ev),
+            rules_engine.mem_candidates(cm, mem_ev, psi_ev),
+            rules_engine.io_candidates(cm, io_ev),
+            idle_ev, psi_ev)
+
+    def test_find_solution_is_cached(self):
+        """Hosts whose in-use CPU and memory fall in the same buckets share the solution."""
+        cm = CloudInstance('aws', 'm5.2xlarge', None, 'us-east-1')
+        rules_engine.SOLUTION_CACHE.clear()
+
+        first = self.solve(cm, 0.01, 0.01)
+        hits = solution_cache_hits._value.get()
+        second = self.solve(cm, 0.02, 0.011)
+
+        assert solution_cache_hits._value.get() == hits + 1
+        assert second == first
+        with patch('ros.rules.rules_engine.SOLUTION_CACHE', LRUCache(0)):
+            assert self.solve(cm, 0.02, 0.011) == second
+
+    def test_find_solution_cache_key_differs(self):
+        """Different buckets, regions or types do not share a solution."""
+        rules_engine.SOLUTION_CACHE.clear()
+        cm = CloudInstance('aws', 'm5.2xlarge', None, 'us-east-1')
+
+        idle = self.solve(cm, 0.01, 0.01)
+        undersized = self.solve(cm, 0.9, 0.9)
+        other_region = self.solve(cm._replace(region='eu-west-1'), 0.01, 0.01)
+
+        assert idle[0] == "INSTANCE_IDLE"
+        assert undersized[0] == "INSTANCE_UNDERSIZED"
+        assert other_region[1] != idle[1]
+        assert len(rules_engine.SOLUTION_CACHE) == 3
+
+
+class TestBatchEvaluation:
+    """Test batch evaluation against the per-archive evaluation chain."""
+
+    @staticmethod
+    def evaluate_host(host):
+        """Evaluate one host the way the dependency graph does."""
+        cm = CloudInstance('aws', host.instance_type, None, host.region)
+        cpu_ev = rules_engine.cpu_evaluation(host.cpu)
+        mem_ev = rules_engine.mem_evaluation(host.mem)
+        io_ev = rules_engine.io_evaluation(host.io)
+        idle_ev = rules_engine.idle_evaluation(host.cpu, host.mem)
+        psi_ev = rules_engine.psi_evaluation(host.psi)
+        state = cpu_ev[0] | mem_ev[0] | io_ev | idle_ev | psi_ev
+        try:
+            solution = rules_engine.find_solution(
+                cm,
+                rules_engine.cpu_candidates(cm, cpu_ev, psi_ev),
+                rules_engine.mem_candidates(cm, mem_ev, psi_ev),
+                rules_engine.io_candidates(cm, io_ev),
+                idle_ev, psi_ev)
+        except SkipComponent:
+            solution = None
+        return state, solution
+
+    @staticmethod
+    def fleet():
+        hosts = []
+        for instance_type in ("t2.micro", "m5.large", "c5.4xlarge", "r6g.xlarge"):
+            gib = EC2_INSTANCE_TYPES[instance_type]['ram'] * 1024
+            for cpu_ut in (0.01, 0.1, 0.5, 0.9):
+                for mem_ut in (0.01, 0.1, 0.5, 0.9):
+                    for psi in (None, (0.0, 0.0, 25.0, 0.0, 0.0), (0.0, 0.0, 0.0, 25.0, 1.0)):
+                        hosts.append(HostUtilization(
+                            instance_type, "us-east-1",
+                            cpu=(cpu_ut, 1.0 - cpu_ut),
+                            mem=(mem_ut, mem_ut * gib),
+                            io={"sda": 1.5},
+                            psi=psi,
+                        ))
+        return hosts
+
+    def test_batch_matches_per_host_evaluation(self):
+        hosts = self.fleet()
+        # Repeated shapes share their solution
+        hosts += hosts[:10]
+
+        results = evaluate_batch(hosts)
+
+        assert len(results) == len(hosts)
+        assert any(result.solution for result in results)
+        for host, result in zip(hosts, results):
+            assert (result.state, result.solution) == self.evaluate_host(host)
+
+    def test_batch_handles_missing_data(self):
+        hosts = [
+            HostUtilization("t2.micro", "us-east-1"),
+            HostUtilization("t2.micro", "us-east-1", cpu=(0.01, 0.99)),
+            HostUtilization("not.an.instance", "us-east-1", cpu=(0.95, 0.05), mem=(0.95, 1024.0)),
+        ]
+
+        results = evaluate_batch(hosts)
+
+        assert results[0] == (RosKeys.OPTIMIZED, None)
+        assert results[1].state == RosKeys.CPU_OVERSIZED
+        assert results[2].state == RosKeys.CPU_UNDERSIZED | RosKeys.MEMORY_UNDERSIZED
+        assert results[2].solution is None
+
+    def test_batch_raises_unexpected_errors(self):
+        host = HostUtilization("m5.large", "us-east-1", cpu=(0.95, 0.05))
+        with patch.object(rules_engine, 'find_solution', side_effect=ZeroDivisionError):
+            with pytest.raises(ZeroDivisionError):
+                evaluate_batch([host])
+
 
 class TestRuleFunctions:
     """Test rule functions that generate the final reports."""
@@ -25,7 +25,7 @@ class TestRulesEngineIntegration:
     """Integration tests for complete rules engine workflow."""
 
     @patch('ros.rules.rules_engine.EC2_INSTANCE_TYPES')
-    @patch('ros.rules.rules_engine.Ec2LinuxPrices')
+    @patch('ros.rules.rules_engine.ec2_price_catalog')
     def test_complete_workflow_idle_system(self, mock_pricing, mock_instances,
                                            mock_rhel_release, mock_cloud_instance_aws,
                                            mock_ec2_instance_types, mock_ec2_pricing):
@@ -36,7 +36,8 @@ class TestRulesEngineIntegration:
         mock_instances.keys.return_value = mock_ec2_instance_types.keys()
 
         pricing_instance = Mock()
-        pricing_instance.get.return_value = mock_ec2_pricing["t2.micro"]
+        pricing_instance.price.side_effect = \
+            lambda instance_type, region, default=None: mock_ec2_pricing["t2.micro"].get(region, default)
         mock_pricing.return_value = pricing_instance
 
         # Mock performance data for idle system
@@ -87,7 +88,7 @@ class TestRulesEngineIntegration:
         assert report_result is not None
 
     @patch('ros.rules.rules_engine.EC2_INSTANCE_TYPES')
-    @patch('ros.rules.rules_engine.Ec2LinuxPrices')
+    @patch('ros.rules.rules_engine.ec2_price_catalog')
     def test_complete_workflow_undersized_system(self, mock_pricing, mock_instances,
                                                  mock_rhel_release, mock_cloud_instance_aws,
                                                  mock_ec2_instance_types, mock_ec2_pricing):
@@ -98,7 +99,8 @@ class TestRulesEngineIntegration:
         mock_instances.keys.return_value = mock_ec2_instance_types.keys()
 
         pricing_instance = Mock()
-        pricing_instance.get.return_value = mock_ec2_pricing["t2.micro"]
+        pricing_instance.price.side_effect = \
+            lambda instance_type, region, default=None: mock_ec2_pricing["t2.micro"].get(region, default)
         mock_pricing.return_value = pricing_instance
 
         # Mock performance data for undersized system
@@ -142,7 +144,7 @@ class TestRulesEngineIntegration:
         assert len(solution_w_price) > 0
 
     @patch('ros.rules.rules_engine.EC2_INSTANCE_TYPES')
-    @patch('ros.rules.rules_engine.Ec2LinuxPrices')
+    @patch('ros.rules.rules_engine.ec2_price_catalog')
     def test_complete_workflow_oversized_system(self, mock_pricing, mock_instances,
                                                 mock_rhel_release, mock_cloud_instance_aws_larger,
                                                 mock_ec2_instance_types, mock_ec2_pricing):
@@ -154,7 +156,8 @@ class TestRulesEngineIntegration:
 
         pricing_instance = Mock()
         # Higher price for larger instance
-        pricing_instance.get.return_value = mock_ec2_pricing["m5.xlarge"]
+        pricing_instance.price.side_effect = \
+            lambda instance_type, region, default=None: mock_ec2_pricing["m5.xlarge"].get(region, default)
         mock_pricing.return_value = pricing_instance
 
         # Mock performance data for oversized system
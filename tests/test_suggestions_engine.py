@@ -1,10 +1,18 @@
 import unittest
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, Mock
 import json
 
+from confluent_kafka import KafkaException, TopicPartition
+
 from ros.processor.suggestions_engine import SuggestionsEngine
+from ros.lib.archive_download import DownloadError
+from ros.processor.metrics import suggestions_engine_events_skipped
 from ros.processor.report_processor_event_producer import _build_base_payload
+from tests.helpers.kafka_helper import kafka_message, committed
 
 
 class TestSuggestionsEngine(unittest.TestCase):
@@ -36,14 +44,10 @@ class TestDownloadAndExtract(unittest.TestCase):
     def setUp(self):
         self.engine = SuggestionsEngine()
 
-    @patch("ros.processor.suggestions_engine.extract")
-    @patch("ros.processor.suggestions_engine.NamedTemporaryFile")
-    @patch("ros.processor.suggestions_engine.requests.get")
-    def test_download_and_extract_successful(self, mock_get, mock_tempfile, mock_extract):
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.content = b"dummy data"
-
-        mock_tempfile.return_value.__enter__.return_value.name = "tempfile.tar.gz"
+    @patch("ros.processor.suggestions_engine.extract_archive")
+    @patch("ros.processor.suggestions_engine.download_archive")
+    def test_download_and_extract_successful(self, mock_download, mock_extract):
+        mock_download.return_value.__enter__.return_value = "tempfile.tar.gz"
 
         mock_extract.return_value.__enter__.return_value.tmp_dir = "extracted_dir"
 
@@ -54,17 +58,13 @@ class TestDownloadAndExtract(unittest.TestCase):
         ) as extract_dir:
             self.assertEqual(extract_dir.tmp_dir, "extracted_dir")
 
-        mock_get.assert_called_once_with("http://example.com/archive.tar.gz", timeout=10)
-        mock_tempfile.return_value.__enter__.assert_called_once()
-        mock_extract.assert_called_once()
-
-    @patch('ros.processor.suggestions_engine.extract')
-    @patch('ros.processor.suggestions_engine.requests.get')
-    def test_download_and_extract_failure(self, mock_get, mock_extract):
-        mock_get.return_value.status_code = 404
-        mock_get.return_value.reason = "Not Found"
+        mock_download.assert_called_once_with("http://example.com/archive.tar.gz")
+        mock_extract.assert_called_once_with("tempfile.tar.gz")
 
-        mock_extract.return_value.__enter__.return_value.tmp_dir = "extracted_dir"
+    @patch('ros.processor.suggestions_engine.extract_archive')
+    @patch('ros.processor.suggestions_engine.download_archive')
+    def test_download_and_extract_failure(self, mock_download, mock_extract):
+        mock_download.return_value.__enter__.side_effect = DownloadError("404 Not Found")
 
         with self.engine.download_and_extract(
                 archive_URL="http://example.com/archive.tar.gz",
@@ -73,34 +73,219 @@ class TestDownloadAndExtract(unittest.TestCase):
         ) as extract_dir:
             self.assertIsNone(extract_dir)
 
-        mock_get.assert_called_once_with("http://example.com/archive.tar.gz", timeout=10)
+        mock_download.assert_called_once_with("http://example.com/archive.tar.gz")
+        mock_extract.assert_not_called()
 
 
-class TestFindRootDirectory(unittest.TestCase):
+class TestRun(unittest.TestCase):
     def setUp(self):
         self.engine = SuggestionsEngine()
+        self.engine.consumer = Mock()
+        self.engine.workers = 2
+        self.engine.max_in_flight = 2
+
+    def run_engine(self, messages):
+        for message in messages:
+            message.error.return_value = None
+        # The engine stops on an unexpected consumer error
+        self.engine.consumer.poll.side_effect = messages + [None, RuntimeError("stop")]
+        self.engine.run()
+        return [committed(call.kwargs['offsets']) for call in self.engine.consumer.commit.call_args_list]
+
+    def test_run_commits_offsets_in_order(self):
+        slow_started = threading.Event()
+        fast_done = threading.Event()
+        messages = [kafka_message(offset) for offset in (1, 2)]
+
+        def process_message(message):
+            if message is messages[0]:
+                slow_started.set()
+                # Finish the first message only after the second one
+                fast_done.wait(timeout=5)
+            else:
+                slow_started.wait(timeout=5)
+                fast_done.set()
+
+        with patch.object(self.engine, 'process_message', side_effect=process_message):
+            commits = self.run_engine(messages)
+
+        self.assertTrue(fast_done.is_set())
+        self.assertEqual(commits, [{('platform.inventory.events', 0): 3}])
+        self.engine.consumer.close.assert_called_once()
+
+    def test_run_commits_failed_messages(self):
+        messages = [kafka_message(offset) for offset in (1, 2, 3)]
+
+        with patch.object(self.engine, 'process_message', side_effect=ValueError("bad message")):
+            commits = self.run_engine(messages)
+
+        self.assertEqual(commits[-1], {('platform.inventory.events', 0): 4})
+
+    def test_run_processes_events_of_a_host_in_order(self):
+        messages = [archive_event(offset, 'host-a', f'request-{offset}') for offset in (1, 2, 3)]
+        processed = []
+        processing = threading.Lock()
+
+        def process_message(message):
+            self.assertTrue(processing.acquire(blocking=False), "events of a host processed concurrently")
+            time.sleep(0.05)
+            processed.append(message)
+            processing.release()
+
+        with patch.object(self.engine, 'process_message', side_effect=process_message):
+            commits = self.run_engine(messages)
+
+        self.assertEqual(processed, messages)
+        self.assertEqual(commits[-1], {('platform.inventory.events', 0): 4})
+
+    def test_run_pauses_consumption_when_busy(self):
+        self.engine.max_in_flight = 1
+        started = threading.Event()
+        release = threading.Event()
+
+        def process_message(message):
+            started.set()
+            release.wait(timeout=5)
+
+        def poll(timeout):
+            if not polls:
+                return None
+            message = polls.pop(0)
+            if message == 'release':
+                started.wait(timeout=5)
+                release.set()
+                deadline = time.monotonic() + 5
+                while self.engine.in_flight() and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                return None
+            if isinstance(message, Exception):
+                raise message
+            return message
+
+        message = kafka_message(1)
+        message.error.return_value = None
+        polls = [message, None, 'release', None, RuntimeError("stop")]
+        self.engine.consumer.poll.side_effect = poll
+        with patch.object(self.engine, 'process_message', side_effect=process_message):
+            self.engine.run()
+
+        self.engine.consumer.pause.assert_called_with(self.engine.consumer.assignment())
+        self.engine.consumer.resume.assert_called_with(self.engine.consumer.assignment())
+        self.assertEqual(self.engine.consumer.poll.call_count, 5)
+
+    def test_failed_commit_retried(self):
+        self.engine.consumer.commit.side_effect = [KafkaException("commit failed"), None]
+        message = kafka_message(1)
+        self.engine.offsets.add(message)
+        self.engine.offsets.done(message)
+
+        self.engine.commit_offsets()
+        self.assertEqual(len(self.engine.offsets), 1)
+        self.engine.commit_offsets()
+
+        commits = [committed(call.kwargs['offsets']) for call in self.engine.consumer.commit.call_args_list]
+        self.assertEqual(commits, [{('platform.inventory.events', 0): 2}] * 2)
+        self.assertEqual(len(self.engine.offsets), 0)
+
+    def test_revoke_waits_for_partition_and_drops_queued_messages(self):
+        executor = ThreadPoolExecutor(max_workers=2)
+        started = threading.Event()
+        release = threading.Event()
+        processed = []
+        running = archive_event(1, 'host-a', 'request-1')
+        queued = archive_event(2, 'host-a', 'request-2')
+        other = archive_event(5, 'host-b', 'request-5')
+        other.partition.return_value = 1
+
+        def process_message(message):
+            if message is running:
+                started.set()
+                release.wait(timeout=5)
+            processed.append(message)
+
+        with patch.object(self.engine, 'process_message', side_effect=process_message):
+            for message in (running, queued, other):
+                self.engine.offsets.add(message)
+                self.engine.submit(executor, message)
+            started.wait(timeout=5)
+            threading.Timer(0.1, release.set).start()
+            self.engine.on_revoke(self.engine.consumer, [TopicPartition('platform.inventory.events', 0)])
+            executor.shutdown(wait=True)
+
+        self.assertNotIn(queued, processed)
+        self.assertEqual(
+            committed(self.engine.consumer.commit.call_args.kwargs['offsets'])[('platform.inventory.events', 0)], 2
+        )
+        # The dropped message is not committed, the revoked partition is no longer tracked
+        self.assertEqual(len(self.engine.offsets), 0)
+        self.assertEqual(self.engine.host_messages, {})
 
-    @patch('ros.processor.suggestions_engine.os.walk')
-    def test_file_found_in_root_directory(self, mock_walk):
-        mock_walk.return_value = [
-            ("/root", ["subdir1", "subdir2"], ["other_file.txt"]),
-            ("/root/subdir1", [], ["insights_archive.txt"]),
-            ("/root/subdir2", [], ["file2.txt"]),
-        ]
 
-        result = self.engine.find_root_directory("/root", "insights_archive.txt")
-        self.assertEqual(result, "/root/subdir1")
+def archive_event(offset, host_id, request_id, event_type='updated'):
+    message = kafka_message(offset)
+    message.value.return_value = json.dumps({
+        "type": event_type,
+        "host": {"id": host_id, "org_id": "123"},
+        "platform_metadata": {"url": f"http://example.com/{request_id}", "request_id": request_id},
+    }).encode()
+    message.headers.return_value = [('producer', b'ingress')]
+    return message
 
-    @patch('ros.processor.suggestions_engine.os.walk')
-    def test_file_not_found(self, mock_walk):
-        mock_walk.return_value = [
-            ("/root", ["subdir1", "subdir2"], ["other_file.txt"]),
-            ("/root/subdir1", [], ["file1.txt"]),
-            ("/root/subdir2", [], ["file2.txt"]),
-        ]
 
-        result = self.engine.find_root_directory("/root", "insights_archive.txt")
-        self.assertIsNone(result)
+class TestDeduplicationWindow(unittest.TestCase):
+    def setUp(self):
+        self.engine = SuggestionsEngine()
+        self.engine.dedup_window = 10
+
+    def skipped(self, reason):
+        return suggestions_engine_events_skipped.labels(reason)._value.get()
+
+    def test_newest_event_of_a_host_released(self):
+        messages = [
+            archive_event(1, 'host-a', 'request-1'),
+            archive_event(2, 'host-a', 'request-2'),
+            archive_event(3, 'host-b', 'request-3', event_type='created'),
+            archive_event(4, 'host-a', 'request-2'),
+        ]
+        superseded, duplicate = self.skipped('superseded'), self.skipped('duplicate')
+        for message in messages:
+            self.engine.offsets.add(message)
+            self.assertTrue(self.engine.hold(message))
+
+        self.assertEqual(self.engine.release(), [])
+        with patch('ros.processor.suggestions_engine.time.monotonic', return_value=time.monotonic() + 11):
+            self.assertEqual(self.engine.release(), [messages[3], messages[2]])
+        self.assertEqual(self.skipped('superseded'), superseded + 1)
+        self.assertEqual(self.skipped('duplicate'), duplicate + 1)
+        self.assertEqual(committed(self.engine.offsets.committable()), {('platform.inventory.events', 0): 3})
+
+    def test_events_without_archive_not_held(self):
+        api_event = archive_event(1, 'host-a', 'request-1')
+        api_event.headers.return_value = [('producer', b'host-inventory-service')]
+        delete = kafka_message(2)
+        delete.value.return_value = json.dumps({"type": "delete", "id": "host-a"}).encode()
+
+        self.assertFalse(self.engine.hold(api_event))
+        self.assertFalse(self.engine.hold(delete))
+        self.engine.dedup_window = 0
+        self.assertFalse(self.engine.hold(archive_event(3, 'host-a', 'request-1')))
+        self.assertEqual(self.engine.held, {})
+
+    def test_other_event_of_a_host_releases_held_event_first(self):
+        executor = ThreadPoolExecutor(max_workers=2)
+        held = archive_event(1, 'host-a', 'request-1')
+        api_event = archive_event(2, 'host-a', 'request-1')
+        api_event.headers.return_value = [('producer', b'host-inventory-service')]
+        processed = []
+
+        with patch.object(self.engine, 'process_message', side_effect=processed.append):
+            self.assertTrue(self.engine.hold(held))
+            self.assertFalse(self.engine.hold(api_event))
+            self.engine.submit(executor, api_event)
+            executor.shutdown(wait=True)
+
+        self.assertEqual(processed, [held, api_event])
+        self.assertEqual(self.engine.held, {})
 
 
 class TestGetIndexFilePath(unittest.TestCase):
@@ -109,8 +294,7 @@ class TestGetIndexFilePath(unittest.TestCase):
 
     @patch("ros.processor.suggestions_engine.os.listdir")
     @patch("ros.processor.suggestions_engine.os.path.join")
-    @patch("ros.processor.suggestions_engine.SuggestionsEngine.find_root_directory")
-    def test_get_index_file_path(self, mock_find_root_directory, mock_join, mock_listdir):
+    def test_get_index_file_path(self, mock_join, mock_listdir):
 
         mock_listdir.return_value = ["YYYYMMDD.index"]
         mock_join.return_value = "/var/tmp/extracted/data/var/log/pcp/pmlogger/YYYYMMDD.index"
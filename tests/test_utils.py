@@ -1,5 +1,10 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
 from ros.lib.app import app
 from ros.lib import utils
+from ros.lib.models import db, PerformanceProfile, PerformanceProfileHistory, System
 from unittest import mock
 from http.server import HTTPServer
 import requests
@@ -96,3 +101,88 @@ def test_monitoring_handler_with_dead_thread():
                 response = requests.get('http://127.0.0.1:8005')
                 assert response.status_code == 500
                 assert response.text == "ERROR: Processor thread exited"
+
+
+def test_insert_performance_profiles_upserts(db_create_system, db_create_performance_profile):
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    fields = {
+        "system_id": 1,
+        "performance_record": {"hinv.ncpu": 4.0},
+        "report_date": datetime(2026, 1, 2, tzinfo=timezone.utc),
+        "state": "Undersized",
+        "number_of_recommendations": 2,
+        "top_candidate": "t2.large",
+        "top_candidate_price": 0.0928,
+    }
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", count_statement)
+        try:
+            utils.insert_performance_profiles(db.session, 1, fields)
+            db.session.commit()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count_statement)
+
+        profiles = db.session.scalars(db.select(PerformanceProfile).filter_by(system_id=1)).all()
+        history = db.session.scalars(
+            db.select(PerformanceProfileHistory).filter_by(system_id=1, report_date=fields["report_date"])
+        ).all()
+
+    assert len([statement for statement in statements if statement.startswith("INSERT")]) == 2
+    assert not [statement for statement in statements if statement.startswith(("SELECT", "DELETE"))]
+    assert len(profiles) == 1
+    assert profiles[0].state == "Undersized"
+    assert profiles[0].top_candidate == "t2.large"
+    assert profiles[0].performance_record == {"hinv.ncpu": 4.0}
+    # The old row is replaced, not merged
+    assert profiles[0].rule_hit_details is None
+    assert len(history) == 1
+    assert history[0].number_of_recommendations == 2
+
+
+def test_bulk_insert_applies_defaults_of_missing_fields(db_create_system):
+    dated = {
+        "system_id": 1,
+        "report_date": datetime(2026, 1, 2, tzinfo=timezone.utc),
+        "state": "Undersized",
+    }
+    undated = {"system_id": 1, "number_of_recommendations": 1}
+    with app.app_context():
+        utils.bulk_insert_performance_profiles(db.session, [dated, undated])
+        db.session.commit()
+
+        profile = db.session.scalars(db.select(PerformanceProfile).filter_by(system_id=1)).one()
+        history = db.session.scalars(
+            db.select(PerformanceProfileHistory).filter_by(system_id=1).order_by(PerformanceProfileHistory.report_date)
+        ).all()
+
+    assert profile.report_date is not None
+    assert profile.state is None
+    assert [row.state for row in history] == ["Undersized", None]
+    assert history[0].report_date == dated["report_date"]
+    assert history[1].report_date > dated["report_date"]
+
+
+def test_sort_key_columns_follow_upserts(db_create_system, db_create_performance_profile):
+    fields = {
+        "system_id": 1,
+        "performance_utilization": {"cpu": 42, "memory": "n/a", "max_io": 0.5, "io": {}},
+        "report_date": datetime(2026, 1, 2, tzinfo=timezone.utc),
+    }
+    with app.app_context():
+        utils.insert_performance_profiles(db.session, 1, fields)
+        utils.bulk_upsert_systems(db.session, [{
+            "inventory_id": "ee0b9978-fe1b-4191-8408-cbadbd47f7a3",
+            "operating_system": {"name": "RHEL", "major": 9, "minor": 2},
+            "groups": [{"id": "group-a", "name": "Group A"}],
+        }])
+        db.session.commit()
+
+        profile = db.session.scalars(db.select(PerformanceProfile).filter_by(system_id=1)).one()
+        system = db.session.scalars(db.select(System).filter_by(id=1)).one()
+
+    assert (profile.cpu_utilization, profile.memory_utilization, profile.max_io_utilization) == (42.0, None, 0.5)
+    assert (system.os_name, system.os_major, system.os_minor, system.group_name) == ("RHEL", 9, 2, "Group A")